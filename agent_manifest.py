@@ -0,0 +1,162 @@
+"""
+Local manifest of provisioned extraction agents, keyed by schema fingerprint.
+
+create_agent.py fingerprints the schema it provisions and records the agent
+it created or updated here, so an agent is only created or updated when the
+schema actually changes. The app, worker and scripts resolve their agent from
+the manifest through agent_registry without any API calls; the stored agent
+definition is enough to rebuild the SDK's ExtractionAgent locally.
+
+If the schema (sample_data/sample_schema.py, or the schema file the agent
+was provisioned from) changes and create_agent.py has not been re-run, the
+manifest entry no longer matches and is ignored: the agent is looked up by
+name instead, and the app warns that it is stale.
+
+Reading the manifest does not import the SDK; only rebuilding or
+provisioning an agent does.
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from sample_data.sample_schema import Invoice
+from fingerprints import schema_fingerprint
+
+DEFAULT_PATH = os.getenv("INVOICE_AGENTS_PATH", ".cache/agents.json")
+
+_lock = threading.Lock()
+
+# Manifest contents by path, reloaded when the file's mtime changes
+_loaded = {}
+
+
+def load_schema(path=None):
+    """Return the JSON schema to provision: a schema file if given, else the Invoice model's"""
+    if path is None:
+        return Invoice.model_json_schema()
+    with open(path) as f:
+        return json.load(f)
+
+
+def _key(agent_name, project_id):
+    return f"{project_id}/{agent_name}"
+
+
+def _read(path):
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    with _lock:
+        cached = _loaded.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        with open(path) as f:
+            entries = json.load(f)
+        _loaded[path] = (mtime, entries)
+        return entries
+
+
+def lookup(agent_name, project_id, path=DEFAULT_PATH):
+    """Return the manifest entry for an agent, or None"""
+    return _read(path).get(_key(agent_name, project_id))
+
+
+def is_stale(agent_name, project_id, path=DEFAULT_PATH):
+    """Return True if the agent's schema source has changed since it was provisioned"""
+    entry = lookup(agent_name, project_id, path)
+    if entry is None:
+        return False
+    try:
+        return entry['fingerprint'] != schema_fingerprint(load_schema(entry.get('schema_path')))
+    except (OSError, ValueError):
+        return True
+
+
+def record(agent, project_id, organization_id, fingerprint, schema_path=None, path=DEFAULT_PATH):
+    """Store a provisioned agent's definition under its schema fingerprint"""
+    entries = dict(_read(path))
+    entries[_key(agent.name, project_id)] = {
+        'agent_id': agent.id,
+        'agent_name': agent.name,
+        'project_id': project_id,
+        'organization_id': organization_id,
+        'fingerprint': fingerprint,
+        'schema_path': schema_path,
+        'provisioned_at': datetime.now().isoformat(timespec='seconds'),
+        # The SDK's own serialization, so the agent can be rebuilt without a lookup
+        'agent': json.loads(agent._agent.json()),
+    }
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Write-then-rename, so a concurrent reader never sees a half-written manifest
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, 'w') as f:
+        json.dump(entries, f, indent=2, sort_keys=True)
+    os.replace(temporary, path)
+
+
+def load_agent(client, agent_name, project_id, organization_id, path=DEFAULT_PATH):
+    """Rebuild an ExtractionAgent from the manifest without API calls, or return None.
+
+    Returns None when the agent is not in the manifest or was provisioned from
+    a different schema than the current one.
+    """
+    entry = lookup(agent_name, project_id, path)
+    if entry is None or is_stale(agent_name, project_id, path):
+        return None
+    from llama_cloud.types import ExtractAgent
+    from llama_cloud_services.extract.extract import ExtractionAgent
+    return ExtractionAgent(
+        client=client._async_client,
+        agent=ExtractAgent.parse_obj(entry['agent']),
+        project_id=project_id,
+        organization_id=organization_id,
+        check_interval=client.check_interval,
+        max_timeout=client.max_timeout,
+        num_workers=client.num_workers,
+        show_progress=client.show_progress,
+        verify=client.verify,
+        httpx_timeout=client.httpx_timeout,
+    )
+
+
+def provision(client, agent_name, project_id, organization_id, schema_path=None, force=False,
+              path=DEFAULT_PATH):
+    """Make sure agent_name uses the current schema, touching the API only when it changed.
+
+    The schema is the Invoice model's, or the JSON schema file at schema_path.
+
+    Returns (agent ID, action), where action is 'unchanged' (the manifest
+    already has this schema, no API calls), 'recorded' (the remote agent
+    already had this schema), 'updated' or 'created'.
+    """
+    schema = load_schema(schema_path)
+    fingerprint = schema_fingerprint(schema)
+    entry = lookup(agent_name, project_id, path)
+    if (not force and entry is not None and entry['fingerprint'] == fingerprint
+            and entry.get('schema_path') == schema_path):
+        return entry['agent_id'], 'unchanged'
+
+    from llama_cloud.core.api_error import ApiError
+    try:
+        agent = client.get_agent(name=agent_name)
+    except ApiError as e:
+        if e.status_code != 404:
+            raise
+        agent = None
+
+    if agent is None:
+        agent = client.create_agent(name=agent_name, data_schema=schema)
+        action = 'created'
+    elif schema_fingerprint(agent.data_schema) == fingerprint:
+        action = 'recorded'
+    else:
+        agent.data_schema = schema
+        agent.save()
+        action = 'updated'
+
+    record(agent, project_id, organization_id, fingerprint, schema_path, path)
+    return agent.id, action
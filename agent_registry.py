@@ -0,0 +1,105 @@
+"""
+Process-wide registry of LlamaExtract clients and extraction agents.
+
+Streamlit re-executes app.py on every interaction, but imported modules stay
+loaded for the lifetime of the server process. Keeping clients and agents here
+means a rerun reuses the same LlamaExtract instance (and the pooled HTTP
+connections it owns) instead of reconnecting and looking the agent up again.
+
+Agents provisioned by create_agent.py are rebuilt from the local agent
+manifest, so resolving them makes no API calls at all; agents missing from
+the manifest are looked up by name.
+
+The LlamaExtract SDK (about a second to import) is imported when the first
+client is created, not when this module is, so the app starts without it.
+"""
+
+import threading
+import time
+import agent_manifest
+
+# How long a looked-up agent is trusted before it is fetched again (seconds)
+DEFAULT_AGENT_TTL = 15 * 60
+
+# Polling interval handed to LlamaExtract for blocking extract() calls
+CHECK_INTERVAL = 5
+
+_lock = threading.Lock()
+_key_locks = {}
+_clients = {}
+_agents = {}  # (project_id, organization_id, agent_name) -> (agent, expires_at)
+
+
+def _key_lock(key):
+    """Return the lock guarding construction of a single registry entry"""
+    with _lock:
+        return _key_locks.setdefault(key, threading.Lock())
+
+
+def get_client(project_id, organization_id):
+    """Return the shared LlamaExtract client for a project/organization"""
+    key = (project_id, organization_id)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    with _key_lock(key):
+        client = _clients.get(key)
+        if client is None:
+            from llama_cloud_services import LlamaExtract
+            client = LlamaExtract(
+                show_progress=False,
+                check_interval=CHECK_INTERVAL,
+                project_id=project_id,
+                organization_id=organization_id
+            )
+            _clients[key] = client
+        return client
+
+
+def get_agent(agent_name, project_id, organization_id, ttl=DEFAULT_AGENT_TTL):
+    """Return a cached extraction agent, fetching it when missing or expired"""
+    key = (project_id, organization_id, agent_name)
+    entry = _agents.get(key)
+    if entry is not None and entry[1] > time.monotonic():
+        return entry[0]
+
+    # Only one thread per key talks to the API; the others wait and reuse it
+    with _key_lock(key):
+        entry = _agents.get(key)
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+
+        client = get_client(project_id, organization_id)
+        agent = agent_manifest.load_agent(client, agent_name, project_id, organization_id)
+        if agent is None:
+            agent = client.get_agent(name=agent_name)
+        _agents[key] = (agent, time.monotonic() + ttl)
+        return agent
+
+
+def is_loaded(agent_name, project_id, organization_id):
+    """Return True if the agent is cached and has not expired"""
+    entry = _agents.get((project_id, organization_id, agent_name))
+    return entry is not None and entry[1] > time.monotonic()
+
+
+def invalidate(agent_name=None, project_id=None, organization_id=None):
+    """Drop cached agents matching the given fields (all agents if none given)"""
+    with _lock:
+        for key in list(_agents):
+            key_project, key_org, key_name = key
+            if agent_name is not None and key_name != agent_name:
+                continue
+            if project_id is not None and key_project != project_id:
+                continue
+            if organization_id is not None and key_org != organization_id:
+                continue
+            del _agents[key]
+
+
+def clear():
+    """Drop every cached agent and client"""
+    with _lock:
+        _agents.clear()
+        _clients.clear()
@@ -0,0 +1,229 @@
+"""
+Cross-invoice analytics: spend by vendor, VAT by rate, monthly totals and
+top line items.
+
+Aggregates live in tables of their own inside the invoice store's SQLite
+database and are updated in the same transaction that stores each invoice,
+so dashboard queries read a few hundred precomputed rows instead of scanning
+every payload. Updates are computed column-wise: a batch of invoices is
+flattened into NumPy arrays, grouped with np.unique/np.bincount and merged
+into the tables with one UPSERT per group. Amounts come from the invoices'
+normalized form (see normalize.py) and are kept as integer cents, so totals
+over any number of invoices are exact.
+
+Invoices flagged as duplicates of an earlier one are left out, so spend is
+not counted twice. Stores created before analytics existed are backfilled
+the first time they are opened.
+"""
+
+import re
+import numpy as np
+import normalize
+
+# Bump to recreate and rebuild every store's aggregates on next open
+SCHEMA_VERSION = 3
+
+# Invoices aggregated per step when backfilling an existing store
+REBUILD_BATCH_SIZE = 5000
+
+UNKNOWN_VENDOR = "Unknown"
+
+# table -> (key column, counter column, summed columns)
+TABLES = {
+    'analytics_vendors': ('vendor', 'invoices', ('net', 'vat', 'gross')),
+    'analytics_months': ('month', 'invoices', ('net', 'vat', 'gross')),
+    'analytics_vat_rates': ('rate', 'entries', ('net', 'vat', 'gross')),
+    'analytics_items': ('item_key', 'occurrences', ('quantity', 'gross')),
+}
+
+# Summed columns that are not amounts in cents
+FLOAT_COLUMNS = ('quantity',)
+
+
+def _value(value):
+    return value if value is not None else np.nan
+
+
+def _description_key(description):
+    return re.sub(r"\s+", " ", str(description or "")).strip().lower()
+
+
+def _group(keys, columns):
+    """Return (distinct keys, row count per key, {column: sum per key}); NaNs count as zero"""
+    unique, inverse = np.unique(np.asarray(keys, dtype=object), return_inverse=True)
+    counts = np.bincount(inverse, minlength=len(unique))
+    sums = {
+        name: np.bincount(inverse, weights=np.nan_to_num(np.asarray(values, dtype=float)), minlength=len(unique))
+        for name, values in columns.items()
+    }
+    return unique, counts, sums
+
+
+def aggregate(invoices):
+    """Group (summary row, normalized invoice) pairs into per-table rows of (key, count, *sums)"""
+    vendors, months, invoice_totals = [], [], []
+    rates, rate_totals = [], []
+    items, item_values, descriptions = [], [], {}
+    for summary, data in invoices:
+        if summary.get('duplicate_of'):
+            continue
+        data = normalize.ensure_normalized(data)
+        vendors.append(summary.get('vendor') or UNKNOWN_VENDOR)
+        invoice_totals.append((
+            _value(data['total_net_worth']), _value(data['total_vat']), _value(data['total_gross_worth'])
+        ))
+        months.append((summary.get('issue_date') or "")[:7])
+        for entry in data['vat_summary']:
+            rates.append(entry['vat_label'])
+            rate_totals.append((_value(entry['net_worth']), _value(entry['vat']), _value(entry['gross_worth'])))
+        for item in data['items']:
+            key = _description_key(item['description'])
+            if not key:
+                continue
+            descriptions.setdefault(key, " ".join(item['description'].split()))
+            items.append(key)
+            item_values.append((_value(item['quantity']), _value(item['gross_worth'])))
+
+    grouped = {}
+    invoice_totals = np.asarray(invoice_totals, dtype=float).reshape(-1, 3)
+    columns = {'net': invoice_totals[:, 0], 'vat': invoice_totals[:, 1], 'gross': invoice_totals[:, 2]}
+    grouped['analytics_vendors'] = _group(vendors, columns)
+    # Invoices without a readable issue date have no month
+    dated = np.asarray([bool(month) for month in months], dtype=bool)
+    grouped['analytics_months'] = _group(
+        [month for month in months if month], {name: values[dated] for name, values in columns.items()}
+    )
+    rate_totals = np.asarray(rate_totals, dtype=float).reshape(-1, 3)
+    grouped['analytics_vat_rates'] = _group(
+        rates, {'net': rate_totals[:, 0], 'vat': rate_totals[:, 1], 'gross': rate_totals[:, 2]}
+    )
+    item_values = np.asarray(item_values, dtype=float).reshape(-1, 2)
+    grouped['analytics_items'] = _group(items, {'quantity': item_values[:, 0], 'gross': item_values[:, 1]})
+
+    rows = {}
+    for table, (unique, counts, sums) in grouped.items():
+        _, _, summed = TABLES[table]
+        rows[table] = [
+            (key, int(count), *(
+                float(sums[name][position]) if name in FLOAT_COLUMNS else int(round(sums[name][position]))
+                for name in summed
+            ))
+            for position, (key, count) in enumerate(zip(unique, counts))
+        ]
+    rows['descriptions'] = descriptions
+    return rows
+
+
+def apply(conn, invoices):
+    """Add (summary row, normalized invoice) pairs to the aggregates on an open connection"""
+    rows = aggregate(invoices)
+    for table, (key, counter, summed) in TABLES.items():
+        if not rows[table]:
+            continue
+        columns = (key, counter) + summed
+        updates = ', '.join(f"{column} = {column} + excluded.{column}" for column in columns[1:])
+        conn.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)}) "
+            f"ON CONFLICT ({key}) DO UPDATE SET {updates}",
+            rows[table]
+        )
+    # First spelling seen is the one displayed
+    conn.executemany(
+        "UPDATE analytics_items SET description = ? WHERE item_key = ? AND description IS NULL",
+        [(description, key) for key, description in rows['descriptions'].items()]
+    )
+
+
+def rebuild(conn, batch_size=REBUILD_BATCH_SIZE):
+    """Recompute every aggregate from the stored invoices"""
+    for table in TABLES:
+        conn.execute(f"DELETE FROM {table}")
+    last = 0
+    while True:
+        rows = conn.execute(
+            "SELECT i.rowid, i.vendor, i.issue_date, i.duplicate_of, p.normalized FROM invoices i "
+            "JOIN invoice_payloads p ON p.id = i.id WHERE i.rowid > ? ORDER BY i.rowid LIMIT ?",
+            (last, batch_size)
+        ).fetchall()
+        if not rows:
+            break
+        apply(conn, [
+            ({'vendor': row[1], 'issue_date': row[2], 'duplicate_of': row[3]}, normalize.loads(row[4]))
+            for row in rows
+        ])
+        last = rows[-1][0]
+    conn.execute(
+        "INSERT OR REPLACE INTO analytics_meta (key, value) VALUES ('schema_version', ?)", (str(SCHEMA_VERSION),)
+    )
+
+
+def ensure_schema(conn):
+    """Create the aggregate tables, recreating and backfilling them if they are new or outdated"""
+    conn.execute("CREATE TABLE IF NOT EXISTS analytics_meta (key TEXT PRIMARY KEY, value TEXT)")
+    row = conn.execute("SELECT value FROM analytics_meta WHERE key = 'schema_version'").fetchone()
+    if row is not None and row[0] != str(SCHEMA_VERSION):
+        # Column types may have changed (v1 stored float amounts)
+        for table in TABLES:
+            conn.execute(f"DROP TABLE IF EXISTS {table}")
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS analytics_vendors (
+            vendor TEXT PRIMARY KEY, invoices INTEGER NOT NULL, net INTEGER NOT NULL, vat INTEGER NOT NULL,
+            gross INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS analytics_months (
+            month TEXT PRIMARY KEY, invoices INTEGER NOT NULL, net INTEGER NOT NULL, vat INTEGER NOT NULL,
+            gross INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS analytics_vat_rates (
+            rate TEXT PRIMARY KEY, entries INTEGER NOT NULL, net INTEGER NOT NULL, vat INTEGER NOT NULL,
+            gross INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS analytics_items (
+            item_key TEXT PRIMARY KEY, description TEXT, occurrences INTEGER NOT NULL,
+            quantity REAL NOT NULL, gross INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS analytics_vendors_gross ON analytics_vendors (gross);
+        CREATE INDEX IF NOT EXISTS analytics_items_gross ON analytics_items (gross);
+        CREATE INDEX IF NOT EXISTS analytics_items_occurrences ON analytics_items (occurrences);
+    """)
+    if row is None or row[0] != str(SCHEMA_VERSION):
+        rebuild(conn)
+
+
+def totals(store):
+    """Return invoice count and net/VAT/gross totals (in cents) over every non-duplicate invoice"""
+    return store.query(
+        "SELECT COALESCE(SUM(invoices), 0) AS invoices, COALESCE(SUM(net), 0) AS net, "
+        "COALESCE(SUM(vat), 0) AS vat, COALESCE(SUM(gross), 0) AS gross FROM analytics_vendors"
+    )[0]
+
+
+def spend_by_vendor(store, limit=20):
+    """Return the vendors with the highest gross spend; amounts are in cents"""
+    return store.query(
+        "SELECT vendor, invoices, net, vat, gross FROM analytics_vendors ORDER BY gross DESC LIMIT ?", (limit,)
+    )
+
+
+def vat_by_rate(store):
+    """Return net, VAT and gross amounts per VAT rate, from the invoices' VAT summaries, lowest rate first"""
+    # Rates are stored as labels; exempt ones ("zw", "np") sort after the numeric ones
+    return store.query(
+        "SELECT rate, entries, net, vat, gross FROM analytics_vat_rates "
+        "ORDER BY CAST(rate AS REAL) = 0 AND rate NOT GLOB '*[0-9]*', CAST(rate AS REAL), rate"
+    )
+
+
+def monthly_totals(store):
+    """Return invoice count and totals per issue month (YYYY-MM), oldest first"""
+    return store.query("SELECT month, invoices, net, vat, gross FROM analytics_months ORDER BY month")
+
+
+def top_line_items(store, limit=20, by='gross'):
+    """Return the line item descriptions with the highest gross spend (or 'occurrences')"""
+    if by not in ('gross', 'occurrences'):
+        raise ValueError(f"Cannot rank line items by {by!r}")
+    return store.query(
+        f"SELECT description, occurrences, quantity, gross FROM analytics_items ORDER BY {by} DESC LIMIT ?",
+        (limit,)
+    )
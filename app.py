@@ -1,458 +1,805 @@
 import streamlit as st
 import os
-from dotenv import load_dotenv
-from llama_cloud_services import LlamaExtract
-from llama_cloud.core.api_error import ApiError
-import tempfile
+# Loads .env before the modules below read their settings from the environment
+import config
+import agent_registry
+import agent_manifest
+from resilient_client import CircuitOpenError, get_circuit_breaker
+from result_cache import get_default_cache
+from extraction import extract_events, DEFAULT_MAX_WORKERS, STARTED, FINISHED
+import preprocess
+import documents
+from invoice_store import get_default_store
+import dedup
+from validation import validate_invoice, STATUS_NEEDS_REVIEW
+from normalize import ensure_normalized, cents_to_float
+import processing
+import work_queue
+import telemetry
+import export_invoices
+import analytics
+import search_index
+from fingerprints import content_hash
 import json
+import re
+import io
+import time
+import tempfile
+import zipfile
+from collections import OrderedDict
 from datetime import datetime
-import uuid
-
-# Load environment variables
-load_dotenv()
-
-# Configuration
-project_id = "2fef999e-1073-40e6-aeb3-1f3c0e64d99b"
-organization_id = "43b88c8f-e488-46f6-9013-698e3d2e374a"
-
-# Initialize session state for storing results
-if 'processed_invoices' not in st.session_state:
-    st.session_state.processed_invoices = []
-
-# Custom CSS for styling
-st.markdown("""
-<style>
-    /* Main styling */
-    .main-header {
-        background: linear-gradient(90deg, #1f77b4 0%, #2e8bc0 100%);
-        padding: 1rem 2rem;
-        border-radius: 10px;
-        margin-bottom: 2rem;
-        color: white;
-    }
-    
-    .main-header h1 {
-        color: white !important;
-        margin: 0;
-        font-size: 2.5rem;
-        font-weight: 700;
-    }
-    
-    .main-header p {
-        color: rgba(255, 255, 255, 0.9) !important;
-        margin: 0.5rem 0 0 0;
-        font-size: 1.1rem;
-    }
-    
-    /* Card styling */
-    .stCard {
-        background: white;
-        border: 1px solid #e0e0e0;
-        border-radius: 12px;
-        padding: 1.5rem;
-        margin-bottom: 1.5rem;
-        box-shadow: 0 2px 8px rgba(0, 0, 0, 0.1);
-    }
-    
-    /* Status badges */
-    .status-badge {
-        padding: 0.25rem 0.75rem;
-        border-radius: 20px;
-        font-size: 0.8rem;
-        font-weight: 600;
-        text-align: center;
-        display: inline-block;
-    }
-    
-    .status-success {
-        background-color: #d4edda;
-        color: #155724;
-        border: 1px solid #c3e6cb;
-    }
-    
-    .status-warning {
-        background-color: #fff3cd;
-        color: #856404;
-        border: 1px solid #ffeaa7;
-    }
-    
-    .status-error {
-        background-color: #f8d7da;
-        color: #721c24;
-        border: 1px solid #f5c6cb;
-    }
-    
-    .status-info {
-        background-color: #d1ecf1;
-        color: #0c5460;
-        border: 1px solid #bee5eb;
-    }
-    
-    /* Button styling */
-    .stButton > button {
-        border-radius: 8px;
-        font-weight: 600;
-        padding: 0.5rem 1.5rem;
-        border: none;
-        transition: all 0.3s ease;
-    }
-    
-    .stButton > button:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 4px 12px rgba(0, 0, 0, 0.15);
-    }
-    
-    /* File uploader styling */
-    .stFileUploader > div {
-        border: 2px dashed #1f77b4;
-        border-radius: 12px;
-        padding: 2rem;
-        text-align: center;
-        background: #f8f9fa;
-    }
-    
-    /* Results section */
-    .results-section {
-        background: #f8f9fa;
-        border-radius: 12px;
-        padding: 1.5rem;
-        margin: 1rem 0;
-    }
-    
-    /* Key-value pairs */
-    .kv-pair {
-        display: flex;
-        justify-content: space-between;
-        padding: 0.5rem 0;
-        border-bottom: 1px solid #e9ecef;
-    }
-    
-    .kv-pair:last-child {
-        border-bottom: none;
-    }
-    
-    .kv-key {
-        font-weight: 600;
-        color: #495057;
-    }
-    
-    .kv-value {
-        color: #212529;
-        text-align: right;
-    }
-    
-    /* Invoice sections */
-    .invoice-section {
-        background: white;
-        border: 1px solid #e0e0e0;
-        border-radius: 8px;
-        padding: 1rem;
-        margin-bottom: 1rem;
-    }
-    
-    .invoice-section h3 {
-        color: #1f77b4;
-        border-bottom: 2px solid #e9ecef;
-        padding-bottom: 0.5rem;
-        margin-bottom: 1rem;
-    }
-    
-    /* Table styling */
-    .invoice-table {
-        width: 100%;
-        border-collapse: collapse;
-        margin: 1rem 0;
-    }
-    
-    .invoice-table th {
-        background-color: #f8f9fa;
-        padding: 0.75rem;
-        text-align: left;
-        border-bottom: 2px solid #dee2e6;
-        font-weight: 600;
-        color: #495057;
-    }
-    
-    .invoice-table td {
-        padding: 0.75rem;
-        border-bottom: 1px solid #e9ecef;
-        color: #212529;
-    }
-    
-    .invoice-table tr:hover {
-        background-color: #f8f9fa;
-    }
-    
-    /* Amount styling */
-    .amount {
-        font-weight: 600;
-        color: #28a745;
-    }
-    
-    .total-amount {
-        font-weight: 700;
-        font-size: 1.1rem;
-        color: #1f77b4;
-    }
-    
-    /* Sidebar styling */
-    .css-1d391kg {
-        background-color: #f8f9fa;
-    }
-    
-    /* Progress bar */
-    .stProgress > div > div > div {
-        background-color: #1f77b4;
-    }
-    
-    /* Hide default Streamlit elements */
-    #MainMenu {visibility: hidden;}
-    footer {visibility: hidden;}
-    header {visibility: hidden;}
-</style>
-""", unsafe_allow_html=True)
+
+# Configuration, read once per process (the agent itself is resolved from the manifest written by create_agent.py)
+project_id = config.PROJECT_ID
+organization_id = config.ORGANIZATION_ID
+agent_name = config.AGENT_NAME
+
+UPLOAD_TYPES = ['jpg', 'jpeg', 'png', 'bmp', 'tif', 'tiff', 'pdf']
+
+# Batch results are validated and stored in groups of this size
+VALIDATION_CHUNK_SIZE = 50
+
+# Minimum seconds between redraws of the latest invoice during a batch
+LIVE_RENDER_INTERVAL = 0.5
+
+# Rows shown in the analytics top-N tables
+ANALYTICS_TOP_N = 20
+
+# Invoices each session remembers as "processed in this session" (least recently used dropped first)
+SESSION_RECENT_INVOICES = 50
+
+# Serve /metrics and /metrics.json for dashboards when a port is configured
+if config.METRICS_PORT:
+    telemetry.start_http_server(config.METRICS_PORT)
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+
+HEADER_HTML = """
+<div class="main-header">
+    <h1>📄 Finvoice Guard</h1>
+    <p>AI-powered invoice data extraction and analysis</p>
+</div>
+"""
+
+@st.cache_resource(show_spinner=False)
+def page_styles():
+    """Read and minify the stylesheet once per process, ready to emit on each rerun"""
+    with open(os.path.join(ASSETS_DIR, "styles.css")) as f:
+        css = f.read()
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s*([{};])\s*", r"\1", re.sub(r"\s+", " ", css))
+    return f"<style>{css.strip()}</style>"
+
 
 def initialize_extract_agent():
-    """Initialize the LlamaExtract agent"""
+    """Get the LlamaExtract agent from the process-wide registry.
+
+    Called when an extraction starts rather than on every rerun, so the SDK
+    is only imported once someone actually extracts an invoice.
+    """
     try:
-        extract = LlamaExtract(
-            show_progress=False, 
-            check_interval=5,
-            project_id=project_id,
-            organization_id=organization_id
-        )
-        return extract.get_agent(name="kaggle_invoice_agent")
+        with telemetry.timer('agent_init'):
+            return agent_registry.get_agent(agent_name, project_id, organization_id)
     except Exception as e:
         st.error(f"Error initializing extraction agent: {str(e)}")
+        st.error("Failed to initialize extraction agent. Please check your configuration.")
         return None
 
-def extract_from_image(agent, image_file):
-    """Extract data from uploaded image"""
-    try:
-        # Save uploaded file to temporary location
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp_file:
-            tmp_file.write(image_file.getvalue())
-            tmp_path = tmp_file.name
-        
-        # Run extraction
-        with st.spinner("Extracting data from image..."):
-            result = agent.extract(tmp_path)
-        
-        # Clean up temporary file
-        os.unlink(tmp_path)
-        
-        return result
-    except Exception as e:
-        st.error(f"Error during extraction: {str(e)}")
-        return None
+def extraction_options():
+    """Render the cache/preprocessing toggles and return extraction keyword arguments"""
+    col1, col2 = st.columns(2)
+    with col1:
+        bypass_cache = st.checkbox("Bypass result cache", help="Always run a fresh remote extraction")
+    with col2:
+        optimize = st.checkbox(
+            "Optimize images before upload",
+            value=preprocess.is_available(),
+            disabled=not preprocess.is_available(),
+            help="Downscale, grayscale, deskew and re-encode scans to shrink uploads (requires Pillow)"
+        )
+    return {
+        'use_cache': not bypass_cache,
+        'preprocess': preprocess.PreprocessOptions() if optimize else None,
+    }
+
+def extract_from_image(agent, image_file, use_cache=True, preprocess=None):
+    """Extract data from uploaded image, showing each step as it happens.
+
+    Cached results for repeat uploads are returned straight away.
+    """
+    status = st.status("⏳ Queued for extraction...")
+    # Default concurrency, so the pages of a long PDF or TIFF are still extracted in parallel
+    events = extract_events(
+        agent, [(image_file.name, image_file.getvalue())],
+        use_cache=use_cache, preprocess=preprocess, wait_if_open=False
+    )
+    for event in events:
+        if event.kind == STARTED:
+            status.update(label="🔄 Extracting on LlamaCloud...")
+        elif event.kind == FINISHED:
+            if event.error is None:
+                status.update(label="✅ Extraction finished", state="complete")
+                return event.data
+            status.update(label="❌ Extraction failed", state="error")
+            if isinstance(event.error, CircuitOpenError):
+                st.warning(f"⏳ {event.error}. Your invoice was not sent.")
+            else:
+                st.error(f"Error during extraction: {str(event.error)}")
+    return None
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def image_fingerprint(file_bytes):
+    """Perceptual hash of an upload, cached across reruns"""
+    return dedup.perceptual_hash(file_bytes)
+
+def find_duplicate_upload(image_hash):
+    """Return the summary of a stored invoice this upload looks like a rescan of, or None"""
+    match = dedup.get_default_index().find_image(image_hash)
+    return get_default_store().get_summary(match[0]) if match else None
+
+def skip_duplicate_uploads(files, hashes):
+    """Split (name, bytes) uploads into new ones, their hashes and (name, duplicate description) pairs"""
+    new_files, new_hashes, skipped, seen = [], [], [], []
+    for (name, file_bytes), image_hash in zip(files, hashes):
+        stored = find_duplicate_upload(image_hash)
+        in_batch = dedup.closest([seen_hash for _, seen_hash in seen], image_hash)
+        if stored is not None:
+            skipped.append((name, f"INV-{stored['id']} ({stored['filename']})"))
+        elif in_batch is not None:
+            skipped.append((name, seen[in_batch[0]][0]))
+        else:
+            new_files.append((name, file_bytes))
+            new_hashes.append(image_hash)
+            if image_hash is not None:
+                seen.append((name, image_hash))
+    return new_files, new_hashes, skipped
+
+def extract_batch_from_images(agent, image_files, max_workers, use_cache=True, preprocess=None,
+                              skip_duplicates=False):
+    """Extract a batch of uploaded images concurrently, recording each as it finishes"""
+    files = [(image_file.name, image_file.getvalue()) for image_file in image_files]
+    with st.spinner("Checking for duplicates..."):
+        hashes = [image_fingerprint(file_bytes) for _, file_bytes in files]
+    skipped = []
+    if skip_duplicates:
+        files, hashes, skipped = skip_duplicate_uploads(files, hashes)
+    if not files:
+        return 0, [], skipped
+    
+    progress = st.progress(0.0, text=f"Extracting 0 of {len(files)} invoices...")
+    status_log = st.empty()
+    # The latest finished invoice is drawn while the rest of the batch is still extracting
+    latest = st.empty()
+    completed, running, failed, pending = 0, set(), [], []
+    last_render = 0.0
+    
+    events = extract_events(agent, files, max_workers=max_workers, use_cache=use_cache, preprocess=preprocess)
+    for event in events:
+        if event.kind == STARTED:
+            running.add(event.name)
+        elif event.kind == FINISHED:
+            completed += 1
+            running.discard(event.name)
+            if event.data is not None:
+                # By position, since two uploads can share a filename
+                pending.append((event.data, event.name, hashes[event.index]))
+                if len(pending) >= VALIDATION_CHUNK_SIZE:
+                    add_batch_to_processed_invoices(pending)
+                    pending = []
+                if time.monotonic() - last_render >= LIVE_RENDER_INTERVAL:
+                    with latest.container():
+                        st.markdown(f"#### 🧾 Latest: {event.name}")
+                        for section in INVOICE_SECTIONS:
+                            display_invoice_section(section, event.data)
+                    last_render = time.monotonic()
+            else:
+                failed.append((event.name, event.error))
+            progress.progress(
+                completed / len(files),
+                text=f"Extracting {completed} of {len(files)} invoices... (latest: {event.name})"
+            )
+        status_log.caption(
+            f"🔄 {len(running)} extracting · ✅ {completed - len(failed)} succeeded · ❌ {len(failed)} failed"
+        )
+    
+    add_batch_to_processed_invoices(pending)
+    progress.empty()
+    return completed - len(failed), failed, skipped
+
+def queue_batch_uploads(image_files, skip_duplicates=False, use_cache=True, preprocess=None):
+    """Queue a batch of uploads for the background worker, returning (queued, failed, skipped)"""
+    files = [(image_file.name, image_file.getvalue()) for image_file in image_files]
+    with st.spinner("Checking for duplicates..."):
+        hashes = [image_fingerprint(file_bytes) for _, file_bytes in files]
+    skipped = []
+    if skip_duplicates:
+        files, hashes, skipped = skip_duplicate_uploads(files, hashes)
+    task_ids = enqueue_uploads(files, hashes, use_cache, preprocess)
+    return len(task_ids), [], skipped
+
+NUMBER_PATTERN = re.compile(r"\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?\s*")
+
+def format_currency_column(amounts):
+    """Format a column of amounts as currency in one pass; non-numeric values are shown as-is"""
+    return [
+        f"${amount:,.2f}" if isinstance(amount, (int, float))
+        else "N/A" if amount is None
+        else f"${float(amount):,.2f}" if isinstance(amount, str) and NUMBER_PATTERN.fullmatch(amount)
+        else str(amount)
+        for amount in amounts
+    ]
 
 def format_currency(amount):
     """Format amount as currency"""
-    if amount is None:
-        return "N/A"
-    try:
-        return f"${float(amount):,.2f}"
-    except:
-        return str(amount)
+    return format_currency_column([amount])[0]
+
+def format_cents_column(cents):
+    """Format a column of integer cents (normalized amounts) as currency"""
+    return format_currency_column([cents_to_float(value) for value in cents])
 
 def get_status_color(status):
     """Get status badge color based on status"""
     if status == "Completed":
         return "status-success"
-    elif status == "Processing":
+    elif status in ("Processing", STATUS_NEEDS_REVIEW):
         return "status-warning"
     elif status == "Failed":
         return "status-error"
     else:
         return "status-info"
 
-def add_to_processed_invoices(invoice_data, filename):
-    """Add processed invoice to storage"""
-    invoice_record = {
-        'id': str(uuid.uuid4())[:8],
-        'invoice_number': invoice_data.get('invoice_number', 'N/A'),
-        'vendor': invoice_data.get('seller', {}).get('name', 'N/A'),
-        'amount': format_currency(invoice_data.get('summary', {}).get('total_gross_worth', 0)),
-        'status': 'Completed',
-        'date': datetime.now().strftime('%Y-%m-%d'),
-        'filename': filename,
-        'data': invoice_data
+def remember_invoices(records):
+    """Remember summary records as processed in this session, keeping only the most recent.
+
+    Sessions hold the compact summary records only; payloads stay in the
+    store's shared pool.
+    """
+    recent = st.session_state.setdefault('recent_invoices', OrderedDict())
+    for record in records:
+        recent[record['id']] = record
+        recent.move_to_end(record['id'])
+    while len(recent) > SESSION_RECENT_INVOICES:
+        recent.popitem(last=False)
+
+def add_to_processed_invoices(invoice_data, filename, status=None, image_hash=None):
+    """Add processed invoice to the shared invoice store, validating its arithmetic first"""
+    record = processing.store_invoice(invoice_data, filename, status=status, image_hash=image_hash)
+    remember_invoices([record])
+    return record
+
+def add_batch_to_processed_invoices(results):
+    """Validate (invoice_data, filename, image_hash) tuples in one vectorized pass and store them"""
+    records = processing.store_invoices(results)
+    remember_invoices(records)
+    return records
+
+def background_option():
+    """Render the background worker toggle; returns True to queue uploads for worker.py"""
+    workers = work_queue.get_default_queue().live_workers()
+    return st.checkbox(
+        "Process in background worker",
+        value=bool(workers),
+        disabled=not workers,
+        help="Queue the upload for worker.py and keep using the app while it is extracted"
+             if workers else "No worker is running. Start one with: python worker.py"
+    )
+
+def enqueue_uploads(files, hashes, use_cache=True, preprocess=None):
+    """Queue (name, bytes) uploads for the background worker, returning their task IDs"""
+    queue = work_queue.get_default_queue()
+    options = {
+        'use_cache': use_cache,
+        'preprocess': preprocess.model_dump() if preprocess is not None else None,
+    }
+    return [
+        queue.enqueue(name, file_bytes, agent_name, project_id, organization_id,
+                      options=options, image_hash=image_hash)
+        for (name, file_bytes), image_hash in zip(files, hashes)
+    ]
+
+def _column(rows, key, default='N/A'):
+    return [row.get(key, default) for row in rows]
+
+def _amount_column(rows, raw_rows, key):
+    """Format normalized amounts, showing the extracted text where it could not be parsed"""
+    return format_currency_column([
+        cents_to_float(row[key]) if row[key] is not None else raw.get(key)
+        for row, raw in zip(rows, raw_rows)
+    ])
+
+@st.cache_data(max_entries=128, show_spinner=False)
+def invoice_view(invoice_key, _data, _normalized=None):
+    """Build the formatted tables and totals for an invoice, memoized by invoice_key.
+
+    _data and _normalized are not hashed by Streamlit; invoice_key (a stored
+    invoice ID or a content hash) identifies them, so reruns reuse the
+    formatted view. Invoices not yet in the store are normalized here.
+    """
+    normalized = _normalized if _normalized is not None else ensure_normalized(_data)
+    items = normalized['items']
+    vat_summary = normalized['vat_summary']
+    raw_items = _data.get('items') or []
+    summary = _data.get('summary') or {}
+    raw_vat_summary = summary.get('vat_summary') or []
+    # Columnar dicts are passed straight to st.dataframe
+    line_items = {
+        'Item #': _column(raw_items, 'item_number'),
+        'Description': _column(raw_items, 'description'),
+        'Qty': _column(raw_items, 'quantity'),
+        'Unit': _column(raw_items, 'unit_of_measure'),
+        'Net Price': _amount_column(items, raw_items, 'net_price'),
+        'Net Worth': _amount_column(items, raw_items, 'net_worth'),
+        'VAT %': _column(raw_items, 'vat_percentage'),
+        'Gross Worth': _amount_column(items, raw_items, 'gross_worth'),
+    }
+    vat = {
+        'VAT %': _column(raw_vat_summary, 'vat_percentage'),
+        'Net Worth': _amount_column(vat_summary, raw_vat_summary, 'net_worth'),
+        'VAT Amount': _amount_column(vat_summary, raw_vat_summary, 'vat'),
+        'Gross Worth': _amount_column(vat_summary, raw_vat_summary, 'gross_worth'),
+    }
+    totals = [
+        _amount_column([normalized], [summary], key)[0]
+        for key in ('total_net_worth', 'total_vat', 'total_gross_worth')
+    ]
+    return {
+        'line_items': line_items if items else None,
+        'vat': vat if vat_summary else None,
+        'totals': totals,
+        'validation': validate_invoice(normalized),
     }
-    st.session_state.processed_invoices.insert(0, invoice_record)  # Add to beginning
 
-def display_invoice_data(data):
+def display_invoice_data(data, invoice_key=None, normalized=None):
     """Display structured invoice data in a professional format"""
+    with telemetry.timer('render'):
+        _display_invoice_data(data, invoice_key, normalized)
+
+# Invoice sections in display order, each rendered by display_invoice_section()
+INVOICE_SECTIONS = ('overview', 'parties', 'items', 'summary')
+
+def _display_invoice_data(data, invoice_key=None, normalized=None):
     if not data:
         st.error("No data extracted from the invoice.")
         return
     
-    # Display invoice header
-    st.markdown('<div class="invoice-section">', unsafe_allow_html=True)
-    st.markdown("### 📄 Invoice Overview")
+    if invoice_key is None:
+        invoice_key = content_hash(json.dumps(data, sort_keys=True).encode("utf-8"))
+    for section in INVOICE_SECTIONS:
+        display_invoice_section(section, data, invoice_key, normalized)
     
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        st.markdown(f"**Invoice Number:** {data.get('invoice_number', 'N/A')}")
-    with col2:
-        st.markdown(f"**Issue Date:** {data.get('issue_date', 'N/A')}")
-    with col3:
-        st.markdown(f"**Status:** <span class='status-badge status-success'>Extracted</span>", unsafe_allow_html=True)
-    
-    st.markdown('</div>', unsafe_allow_html=True)
-    
-    # Seller and Client Information
-    col1, col2 = st.columns(2)
+    # Raw JSON view (collapsible)
+    with st.expander("🔍 View Raw JSON Data"):
+        st.json(data)
+
+def display_invoice_section(section, data, invoice_key=None, normalized=None):
+    """Render one section of an invoice; sections can be drawn into separate placeholders"""
+    if invoice_key is None:
+        invoice_key = content_hash(json.dumps(data, sort_keys=True).encode("utf-8"))
+    view = invoice_view(invoice_key, data, normalized)
     
-    with col1:
+    if section == 'overview':
+        # Display invoice header
         st.markdown('<div class="invoice-section">', unsafe_allow_html=True)
-        st.markdown("### 🏢 Seller Information")
-        seller = data.get('seller', {})
-        st.markdown(f"**Name:** {seller.get('name', 'N/A')}")
-        st.markdown(f"**Address:** {seller.get('address', 'N/A')}")
-        st.markdown(f"**Tax ID:** {seller.get('tax_id', 'N/A')}")
-        st.markdown(f"**IBAN:** {seller.get('iban', 'N/A')}")
+        st.markdown("### 📄 Invoice Overview")
+        
+        validation = view['validation']
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.markdown(f"**Invoice Number:** {data.get('invoice_number', 'N/A')}")
+        with col2:
+            st.markdown(f"**Issue Date:** {data.get('issue_date', 'N/A')}")
+        with col3:
+            st.markdown(
+                f"**Status:** <span class='status-badge {get_status_color(validation.status)}'>{validation.status}</span>",
+                unsafe_allow_html=True
+            )
+        
+        if validation.issues:
+            with st.expander(f"⚠️ {len(validation.issues)} arithmetic issue(s) found", expanded=True):
+                for issue in validation.issues:
+                    st.markdown(f"- {issue}")
+        
         st.markdown('</div>', unsafe_allow_html=True)
     
-    with col2:
+    elif section == 'parties':
+        # Seller and Client Information
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.markdown('<div class="invoice-section">', unsafe_allow_html=True)
+            st.markdown("### 🏢 Seller Information")
+            seller = data.get('seller', {})
+            st.markdown(f"**Name:** {seller.get('name', 'N/A')}")
+            st.markdown(f"**Address:** {seller.get('address', 'N/A')}")
+            st.markdown(f"**Tax ID:** {seller.get('tax_id', 'N/A')}")
+            st.markdown(f"**IBAN:** {seller.get('iban', 'N/A')}")
+            st.markdown('</div>', unsafe_allow_html=True)
+        
+        with col2:
+            st.markdown('<div class="invoice-section">', unsafe_allow_html=True)
+            st.markdown("### 👤 Client Information")
+            client = data.get('client', {})
+            st.markdown(f"**Name:** {client.get('name', 'N/A')}")
+            st.markdown(f"**Address:** {client.get('address', 'N/A')}")
+            st.markdown(f"**Tax ID:** {client.get('tax_id', 'N/A')}")
+            st.markdown('</div>', unsafe_allow_html=True)
+    
+    elif section == 'items':
+        # Line Items
         st.markdown('<div class="invoice-section">', unsafe_allow_html=True)
-        st.markdown("### 👤 Client Information")
-        client = data.get('client', {})
-        st.markdown(f"**Name:** {client.get('name', 'N/A')}")
-        st.markdown(f"**Address:** {client.get('address', 'N/A')}")
-        st.markdown(f"**Tax ID:** {client.get('tax_id', 'N/A')}")
+        st.markdown("### 📋 Line Items")
+        
+        if view['line_items']:
+            st.dataframe(
+                view['line_items'],
+                use_container_width=True,
+                hide_index=True,
+                column_config={
+                    "Net Price": st.column_config.TextColumn("Net Price", width="medium"),
+                    "Net Worth": st.column_config.TextColumn("Net Worth", width="medium"),
+                    "Gross Worth": st.column_config.TextColumn("Gross Worth", width="medium")
+                }
+            )
+        else:
+            st.info("No line items found in the invoice.")
+        
         st.markdown('</div>', unsafe_allow_html=True)
     
-    # Line Items
-    st.markdown('<div class="invoice-section">', unsafe_allow_html=True)
-    st.markdown("### 📋 Line Items")
-    
-    items = data.get('items', [])
-    if items:
-        # Prepare data for Streamlit dataframe
-        line_items_data = []
-        for item in items:
-            line_items_data.append({
-                'Item #': item.get('item_number', 'N/A'),
-                'Description': item.get('description', 'N/A'),
-                'Qty': item.get('quantity', 'N/A'),
-                'Unit': item.get('unit_of_measure', 'N/A'),
-                'Net Price': format_currency(item.get('net_price')),
-                'Net Worth': format_currency(item.get('net_worth')),
-                'VAT %': item.get('vat_percentage', 'N/A'),
-                'Gross Worth': format_currency(item.get('gross_worth'))
-            })
+    elif section == 'summary':
+        # Summary Section
+        st.markdown('<div class="invoice-section">', unsafe_allow_html=True)
+        st.markdown("### 💰 Invoice Summary")
         
-        # Display as Streamlit dataframe
-        st.dataframe(
-            line_items_data,
-            use_container_width=True,
-            hide_index=True,
-            column_config={
-                "Net Price": st.column_config.TextColumn("Net Price", width="medium"),
-                "Net Worth": st.column_config.TextColumn("Net Worth", width="medium"),
-                "Gross Worth": st.column_config.TextColumn("Gross Worth", width="medium")
-            }
-        )
-    else:
-        st.info("No line items found in the invoice.")
-    
-    st.markdown('</div>', unsafe_allow_html=True)
-    
-    # Summary Section
-    st.markdown('<div class="invoice-section">', unsafe_allow_html=True)
-    st.markdown("### 💰 Invoice Summary")
-    
-    summary = data.get('summary', {})
-    
-    # VAT Summary
-    vat_summary = summary.get('vat_summary', [])
-    if vat_summary:
-        st.markdown("**VAT Breakdown:**")
+        # VAT Summary
+        if view['vat']:
+            st.markdown("**VAT Breakdown:**")
+            st.dataframe(
+                view['vat'],
+                use_container_width=True,
+                hide_index=True,
+                column_config={
+                    "Net Worth": st.column_config.TextColumn("Net Worth", width="medium"),
+                    "VAT Amount": st.column_config.TextColumn("VAT Amount", width="medium"),
+                    "Gross Worth": st.column_config.TextColumn("Gross Worth", width="medium")
+                }
+            )
         
-        # Prepare VAT data for Streamlit dataframe
-        vat_data = []
-        for vat_item in vat_summary:
-            vat_data.append({
-                'VAT %': vat_item.get('vat_percentage', 'N/A'),
-                'Net Worth': format_currency(vat_item.get('net_worth')),
-                'VAT Amount': format_currency(vat_item.get('vat')),
-                'Gross Worth': format_currency(vat_item.get('gross_worth'))
-            })
+        # Totals
+        total_net, total_vat, total_gross = view['totals']
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.markdown(f"**Total Net Worth:** <span class='total-amount'>{total_net}</span>", unsafe_allow_html=True)
+        with col2:
+            st.markdown(f"**Total VAT:** <span class='total-amount'>{total_vat}</span>", unsafe_allow_html=True)
+        with col3:
+            st.markdown(f"**Total Gross Worth:** <span class='total-amount'>{total_gross}</span>", unsafe_allow_html=True)
         
-        # Display as Streamlit dataframe
-        st.dataframe(
-            vat_data,
-            use_container_width=True,
-            hide_index=True,
-            column_config={
-                "Net Worth": st.column_config.TextColumn("Net Worth", width="medium"),
-                "VAT Amount": st.column_config.TextColumn("VAT Amount", width="medium"),
-                "Gross Worth": st.column_config.TextColumn("Gross Worth", width="medium")
-            }
-        )
+        st.markdown('</div>', unsafe_allow_html=True)
+
+SORT_OPTIONS = {
+    # Relevance when searching, newest first otherwise
+    "Best match": (None, True),
+    "Processed (newest)": ('processed_at', True),
+    "Processed (oldest)": ('processed_at', False),
+    "Issue date (newest)": ('issue_date', True),
+    "Issue date (oldest)": ('issue_date', False),
+    "Amount (highest)": ('amount', True),
+    "Amount (lowest)": ('amount', False),
+    "Vendor (A-Z)": ('vendor', False),
+}
+
+def display_processed_invoices():
+    """Display a filtered, sorted and paginated table of processed invoices"""
+    with telemetry.timer('render_table'):
+        _display_processed_invoices()
+
+def _display_processed_invoices():
+    store = get_default_store()
+    if store.count() == 0:
+        st.info("No invoices have been processed yet. Upload an invoice to get started!")
+        return
+    
+    st.markdown("### 📊 Processed Invoices")
     
-    # Totals
-    col1, col2, col3 = st.columns(3)
+    text = st.text_input(
+        "🔎 Search", placeholder="Invoice number, tax ID, seller, client or line item",
+        help="Every word must match the start of a word in the invoice"
+    )
+    
+    # Filters and sorting
+    col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.markdown(f"**Total Net Worth:** <span class='total-amount'>{format_currency(summary.get('total_net_worth'))}</span>", unsafe_allow_html=True)
+        vendor = st.selectbox("Vendor", ["All vendors"] + store.list_vendors())
+        vat_rate = st.selectbox("VAT rate", ["All rates"] + search_index.list_vat_rates(store))
     with col2:
-        st.markdown(f"**Total VAT:** <span class='total-amount'>{format_currency(summary.get('total_vat'))}</span>", unsafe_allow_html=True)
+        date_range = st.date_input("Issue date range", value=())
     with col3:
-        st.markdown(f"**Total Gross Worth:** <span class='total-amount'>{format_currency(summary.get('total_gross_worth'))}</span>", unsafe_allow_html=True)
+        min_amount = st.number_input("Min amount", min_value=0.0, value=0.0, step=100.0)
+        max_amount = st.number_input("Max amount (0 = no limit)", min_value=0.0, value=0.0, step=100.0)
+    with col4:
+        sort_label = st.selectbox("Sort by", list(SORT_OPTIONS))
+        page_size = st.selectbox("Rows per page", [25, 50, 100, 250], index=1)
     
-    st.markdown('</div>', unsafe_allow_html=True)
+    sort_by, descending = SORT_OPTIONS[sort_label]
+    date_from = date_range[0].isoformat() if len(date_range) > 0 else None
+    date_to = date_range[1].isoformat() if len(date_range) > 1 else None
+    filters = {
+        'vendor': None if vendor == "All vendors" else vendor,
+        'date_from': date_from,
+        'date_to': date_to,
+        'min_amount': min_amount or None,
+        'max_amount': max_amount or None,
+        'vat_rate': None if vat_rate == "All rates" else vat_rate,
+    }
     
-    # Raw JSON view (collapsible)
-    with st.expander("🔍 View Raw JSON Data"):
-        st.json(data)
-
-def display_processed_invoices():
-    """Display table of processed invoices"""
-    if not st.session_state.processed_invoices:
-        st.info("No invoices have been processed yet. Upload an invoice to get started!")
+    # Only the requested page is read from the store; facets are counted once per query
+    matches = search_index.search(store, text, limit=0, **filters)
+    page_count = max(1, -(-matches.total // page_size))
+    # Clamp rather than cap the widget, so narrowing the filters never leaves a stale page out of range
+    page = min(int(st.number_input(f"Page (of {page_count})", min_value=1, value=1, step=1)), page_count)
+    results = search_index.search(
+        store, text, sort_by=sort_by, descending=descending, limit=page_size, offset=(page - 1) * page_size,
+        facets=False, **filters
+    )
+    invoices = results.invoices
+    duplicates = sum(1 for invoice in invoices if invoice['duplicate_of'])
+    st.caption(f"Showing {len(invoices)} of {matches.total} matching invoices"
+               f" · {(matches.seconds + results.seconds) * 1000:.1f} ms"
+               + (f" · ♻️ {duplicates} flagged as duplicates" if duplicates else ""))
+    _display_search_facets(matches.facets)
+    if not invoices:
         return
     
-    st.markdown("### 📊 Processed Invoices")
-    
     # Prepare data for dataframe
+    amounts = format_currency_column([invoice['amount'] for invoice in invoices])
     table_data = []
-    for invoice in st.session_state.processed_invoices:
+    for invoice, amount in zip(invoices, amounts):
         table_data.append({
             'Invoice ID': f"INV-{invoice['id']}",
-            'Vendor': invoice['vendor'],
-            'Amount': invoice['amount'],
+            'Invoice #': invoice['invoice_number'] or 'N/A',
+            'Vendor': invoice['vendor'] or 'N/A',
+            'Amount': amount,
             'Status': invoice['status'],
-            'Date': invoice['date'],
-            'Filename': invoice['filename']
+            'Issue Date': invoice['issue_date'],
+            'Date': invoice['processed_at'][:10],
+            'Filename': invoice['filename'],
+            'Duplicate Of': f"INV-{invoice['duplicate_of']}" if invoice['duplicate_of'] else None
         })
+    if any(results.snippets):
+        for row, snippet in zip(table_data, results.snippets):
+            row['Match'] = " ".join((snippet or "").replace("**", "").split())
     
     # Display as interactive dataframe
-    df = st.dataframe(
+    st.dataframe(
         table_data,
         use_container_width=True,
         hide_index=True,
         column_config={
             "Invoice ID": st.column_config.TextColumn("Invoice ID", width="medium"),
+            "Invoice #": st.column_config.TextColumn("Invoice #", width="medium"),
             "Vendor": st.column_config.TextColumn("Vendor", width="large"),
             "Amount": st.column_config.TextColumn("Amount", width="medium"),
             "Status": st.column_config.SelectboxColumn(
                 "Status",
                 width="medium",
-                options=["Completed", "Processing", "Failed"],
+                options=["Completed", "Processing", STATUS_NEEDS_REVIEW, "Failed"],
                 default="Completed"
             ),
-            "Date": st.column_config.DateColumn("Date", width="medium"),
-            "Filename": st.column_config.TextColumn("Filename", width="medium")
+            "Issue Date": st.column_config.DateColumn("Issue Date", width="medium"),
+            "Date": st.column_config.DateColumn("Processed", width="medium"),
+            "Filename": st.column_config.TextColumn("Filename", width="medium"),
+            "Duplicate Of": st.column_config.TextColumn(
+                "Duplicate Of", width="medium", help="Earlier invoice with the same number, seller and total, or the same scan"
+            ),
+            "Match": st.column_config.TextColumn("Match", width="large", help="Where the search words were found")
         }
     )
     
-    # Add view details functionality
-    if st.button("View Selected Invoice Details"):
-        # For now, show the most recent invoice details
-        if st.session_state.processed_invoices:
-            latest_invoice = st.session_state.processed_invoices[0]
-            st.markdown("### 📄 Latest Invoice Details")
-            display_invoice_data(latest_invoice['data'])
+    # Per-row details are loaded from the store only when requested
+    labels = {
+        f"INV-{invoice['id']} · {invoice['vendor'] or 'N/A'} · {amount}": invoice['id']
+        for invoice, amount in zip(invoices, amounts)
+    }
+    # Invoices processed in this session can be opened from any page, most recent first
+    recent = st.session_state.get('recent_invoices', {})
+    on_page = set(labels.values())
+    recent_invoices = [invoice for invoice in reversed(recent.values()) if invoice['id'] not in on_page]
+    recent_amounts = format_currency_column([invoice['amount'] for invoice in recent_invoices])
+    for invoice, amount in zip(recent_invoices, recent_amounts):
+        labels[f"INV-{invoice['id']} · {invoice['vendor'] or 'N/A'} · {amount} (this session)"] = invoice['id']
+    selected = st.selectbox("Invoice details", list(labels))
+    if st.button("View Invoice Details"):
+        invoice_id = labels[selected]
+        if invoice_id in recent:
+            recent.move_to_end(invoice_id)
+        st.markdown(f"### 📄 Invoice Details ({selected.split(' · ')[0]})")
+        data, normalized = store.get_payload(invoice_id)
+        display_invoice_data(data, invoice_key=invoice_id, normalized=normalized)
+
+def _display_search_facets(facets):
+    """Display how the matches split by vendor, VAT rate, amount and issue month"""
+    months = facets['month'][-search_index.RECENT_MONTHS:]
+    with st.expander("🧭 Refine"):
+        for title, values in (("Vendors", facets['vendor']), ("VAT rates", facets['vat_rate']),
+                              ("Amounts", facets['amount']), ("Latest issue months", months)):
+            if values:
+                st.caption(f"**{title}:** " + " · ".join(f"{value or 'Unknown'} ({count})" for value, count in values))
+
+def format_seconds(seconds):
+    """Format a duration for the telemetry panel"""
+    if seconds is None:
+        return "–"
+    return f"{seconds * 1000:.0f} ms" if seconds < 1 else f"{seconds:.2f} s"
+
+def display_telemetry():
+    """Display live latency percentiles, errors and metric exports"""
+    snapshot = telemetry.snapshot()
+    with st.expander("⏱️ Pipeline Latency"):
+        if not snapshot['stages']:
+            st.caption("No measurements yet.")
+        else:
+            st.dataframe(
+                [
+                    {
+                        'Stage': stage,
+                        'Count': stats['count'],
+                        'p50': format_seconds(stats['p50']),
+                        'p95': format_seconds(stats['p95']),
+                        'p99': format_seconds(stats['p99']),
+                    }
+                    for stage, stats in snapshot['stages'].items()
+                ],
+                use_container_width=True,
+                hide_index=True
+            )
+        
+        if snapshot['errors']:
+            st.markdown("**Errors**")
+            st.dataframe(snapshot['errors'], use_container_width=True, hide_index=True)
+        
+        st.download_button("⬇️ Metrics (JSON)", telemetry.to_json(), file_name="metrics.json", mime="application/json")
+        st.download_button("⬇️ Metrics (Prometheus)", telemetry.to_prometheus(), file_name="metrics.prom", mime="text/plain")
+
+def _display_background_jobs():
+    queue = work_queue.get_default_queue()
+    counts = queue.counts()
+    st.caption(" · ".join(f"{counts.get(status, 0)} {status.lower()}" for status in (
+        work_queue.STATUS_QUEUED, work_queue.STATUS_PROCESSING,
+        work_queue.STATUS_COMPLETED, work_queue.STATUS_FAILED
+    )))
+    st.dataframe(
+        [
+            {
+                'Task': task['id'],
+                'Filename': task['filename'],
+                'Status': task['status'],
+                'Invoice': f"INV-{task['invoice_id']}" if task['invoice_id'] else None,
+                'Error': task['error'],
+                'Updated': datetime.fromtimestamp(task['updated_at']).strftime('%H:%M:%S'),
+            }
+            for task in queue.recent()
+        ],
+        use_container_width=True,
+        hide_index=True
+    )
+
+# Refresh the jobs panel on its own timer without rerunning the whole script
+_fragment = getattr(st, "fragment", None)
+if _fragment is not None:
+    _display_background_jobs = _fragment(run_every=2)(_display_background_jobs)
+
+def display_background_jobs():
+    """Display the status of uploads queued for the background worker"""
+    if not work_queue.get_default_queue().counts():
+        return
+    with st.expander("👷 Background Jobs", expanded=True):
+        if _fragment is None and st.button("🔄 Refresh"):
+            st.rerun()
+        _display_background_jobs()
+
+def display_analytics():
+    """Display spend by vendor, VAT by rate, monthly totals and top line items"""
+    with telemetry.timer('render_analytics'):
+        _display_analytics()
+
+def _display_analytics():
+    store = get_default_store()
+    overall = analytics.totals(store)
+    if not overall['invoices']:
+        st.info("No invoices have been processed yet. Upload an invoice to get started!")
+        return
+    
+    st.markdown("### 📈 Analytics")
+    st.caption("Invoices flagged as duplicates are not counted.")
+    
+    col1, col2, col3, col4 = st.columns(4)
+    net, vat, gross = format_cents_column([overall['net'], overall['vat'], overall['gross']])
+    col1.metric("Invoices", overall['invoices'])
+    col2.metric("Net Spend", net)
+    col3.metric("VAT", vat)
+    col4.metric("Gross Spend", gross)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("#### 🏢 Spend by Vendor")
+        vendors = analytics.spend_by_vendor(store, limit=ANALYTICS_TOP_N)
+        st.bar_chart(
+            {'Vendor': _column(vendors, 'vendor'), 'Gross': [cents_to_float(gross) for gross in _column(vendors, 'gross')]},
+            x='Vendor', y='Gross'
+        )
+        st.dataframe(
+            {
+                'Vendor': _column(vendors, 'vendor'),
+                'Invoices': _column(vendors, 'invoices'),
+                'Net': format_cents_column(_column(vendors, 'net')),
+                'Gross': format_cents_column(_column(vendors, 'gross')),
+            },
+            use_container_width=True,
+            hide_index=True
+        )
+    with col2:
+        st.markdown("#### 🧾 VAT by Rate")
+        rates = analytics.vat_by_rate(store)
+        st.dataframe(
+            {
+                'VAT %': _column(rates, 'rate'),
+                'Entries': _column(rates, 'entries'),
+                'Net': format_cents_column(_column(rates, 'net')),
+                'VAT': format_cents_column(_column(rates, 'vat')),
+                'Gross': format_cents_column(_column(rates, 'gross')),
+            },
+            use_container_width=True,
+            hide_index=True
+        )
+    
+    st.markdown("#### 📅 Monthly Totals")
+    months = analytics.monthly_totals(store)
+    if months:
+        st.bar_chart(
+            {'Month': _column(months, 'month'), 'Gross': [cents_to_float(gross) for gross in _column(months, 'gross')]},
+            x='Month', y='Gross'
+        )
+    else:
+        st.caption("No invoices with a readable issue date.")
+    
+    st.markdown("#### 📋 Top Line Items")
+    by = st.radio("Rank by", ["Gross spend", "Occurrences"], horizontal=True)
+    items = analytics.top_line_items(store, limit=ANALYTICS_TOP_N, by='gross' if by == "Gross spend" else 'occurrences')
+    st.dataframe(
+        {
+            'Description': _column(items, 'description'),
+            'Occurrences': _column(items, 'occurrences'),
+            'Quantity': _column(items, 'quantity'),
+            'Gross': format_cents_column(_column(items, 'gross')),
+        },
+        use_container_width=True,
+        hide_index=True
+    )
+
+def build_export_archive(output_format):
+    """Export the invoice store to normalized tables and return them as zip bytes"""
+    with tempfile.TemporaryDirectory() as directory:
+        tables = export_invoices.export_store(directory, output_format)
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for path, _ in tables.values():
+                archive.write(path, os.path.basename(path))
+    return buffer.getvalue(), {table: rows for table, (_, rows) in tables.items()}
+
+def display_export():
+    """Offer the processed invoices as a zip of invoice, line item and VAT tables"""
+    with st.expander("📦 Export Tables"):
+        st.caption("Invoices, line items and VAT summaries as separate tables linked by invoice_id.")
+        formats = list(export_invoices.FORMATS) if export_invoices.is_arrow_available() else ['csv']
+        output_format = st.selectbox("Format", formats)
+        if st.button("Prepare export"):
+            with st.spinner("Exporting invoices..."):
+                archive, counts = build_export_archive(output_format)
+            st.caption(" · ".join(f"{rows} {table.replace('_', ' ')}" for table, rows in counts.items()))
+            st.download_button(
+                "⬇️ Download export", archive,
+                file_name=f"invoices-{output_format}.zip", mime="application/zip"
+            )
 
 def main():
     st.set_page_config(
@@ -462,23 +809,12 @@ def main():
         initial_sidebar_state="expanded"
     )
     
-    # Header with logo and branding
-    st.markdown("""
-    <div class="main-header">
-        <h1>📄 Finvoice Guard</h1>
-        <p>AI-powered invoice data extraction and analysis</p>
-    </div>
-    """, unsafe_allow_html=True)
-    
-    # Initialize the agent
-    agent = initialize_extract_agent()
-    
-    if agent is None:
-        st.error("Failed to initialize extraction agent. Please check your configuration.")
-        return
+    # Styles and header are built once per process; only the finished HTML is sent each rerun
+    st.markdown(page_styles(), unsafe_allow_html=True)
+    st.markdown(HEADER_HTML, unsafe_allow_html=True)
     
     # Create tabs for different sections
-    tab1, tab2 = st.tabs(["📤 Upload & Extract", "📊 Processed Invoices"])
+    tab1, tab2, tab3 = st.tabs(["📤 Upload & Extract", "📊 Processed Invoices", "📈 Analytics"])
     
     with tab1:
         # Main content area
@@ -489,30 +825,95 @@ def main():
             st.header("📤 Upload Invoice")
             st.markdown("Upload an invoice image to extract structured data using our AI-powered extraction agent.")
             
-            uploaded_file = st.file_uploader(
-                "Choose an invoice image file",
-                type=['jpg', 'jpeg', 'png', 'bmp', 'tiff'],
-                help="Supported formats: JPG, JPEG, PNG, BMP, TIFF"
-            )
+            mode = st.radio("Mode", ["Single invoice", "Batch"], horizontal=True)
             
-            if uploaded_file is not None:
-                st.markdown("### 📷 Preview")
-                st.image(uploaded_file, caption="Uploaded Invoice", use_column_width=True)
+            if mode == "Single invoice":
+                uploaded_file = st.file_uploader(
+                    "Choose an invoice image file",
+                    type=UPLOAD_TYPES,
+                    help="Supported formats: JPG, JPEG, PNG, BMP, TIFF, PDF (multi-page TIFF and PDF supported)"
+                )
                 
-                if st.button("🔍 Extract Data", type="primary", use_container_width=True):
-                    result = extract_from_image(agent, uploaded_file)
+                if uploaded_file is not None:
+                    st.markdown("### 📷 Preview")
+                    pages = documents.page_count(uploaded_file.getvalue(), uploaded_file.name)
+                    if uploaded_file.name.lower().endswith('.pdf'):
+                        st.caption(f"📑 PDF document · {pages or 'unknown number of'} page(s)")
+                    else:
+                        st.image(uploaded_file, caption="Uploaded Invoice", use_column_width=True)
+                    if pages and pages >= documents.SPLIT_MIN_PAGES:
+                        st.caption("Pages will be extracted in parallel and merged into one invoice.")
                     
-                    if result is not None and hasattr(result, 'data'):
-                        st.success("✅ Extraction completed successfully!")
-                        
-                        # Add to processed invoices
-                        add_to_processed_invoices(result.data, uploaded_file.name)
+                    # Flag likely rescans of stored invoices before paying for an extraction
+                    image_hash = image_fingerprint(uploaded_file.getvalue())
+                    duplicate = find_duplicate_upload(image_hash)
+                    if duplicate is not None:
+                        st.warning(
+                            f"♻️ This looks like INV-{duplicate['id']} ({duplicate['filename']}), "
+                            f"processed {duplicate['processed_at'][:10]}."
+                        )
+                    
+                    options = extraction_options()
+                    in_background = background_option()
+                    
+                    if st.button("🔍 Extract Data", type="primary", use_container_width=True):
+                        if in_background:
+                            enqueue_uploads([(uploaded_file.name, uploaded_file.getvalue())], [image_hash], **options)
+                            st.success("📥 Queued for the background worker. Progress is shown under Background Jobs.")
+                        else:
+                            agent = initialize_extract_agent()
+                            data = extract_from_image(agent, uploaded_file, **options) if agent is not None else None
+                            
+                            if data is not None:
+                                st.success("✅ Extraction completed successfully!")
+                                
+                                # Add to processed invoices
+                                record = add_to_processed_invoices(data, uploaded_file.name, image_hash=image_hash)
+                                
+                                # Display the extracted data, sharing the stored invoice's cached view
+                                display_invoice_data(data, invoice_key=record['id'])
+                            elif agent is not None:
+                                st.error("❌ Extraction failed or no data returned. Please try again.")
+            else:
+                uploaded_files = st.file_uploader(
+                    "Choose invoice image files",
+                    type=UPLOAD_TYPES,
+                    accept_multiple_files=True,
+                    help="Supported formats: JPG, JPEG, PNG, BMP, TIFF, PDF (multi-page TIFF and PDF supported)"
+                )
+                
+                if uploaded_files:
+                    max_workers = st.slider(
+                        "Concurrent extractions", min_value=1, max_value=32, value=DEFAULT_MAX_WORKERS,
+                        help="Maximum number of invoices extracted at the same time"
+                    )
+                    options = extraction_options()
+                    skip_duplicates = st.checkbox(
+                        "Skip likely duplicates", value=False,
+                        help="Don't extract images that look like a stored invoice or another file in this batch"
+                    )
+                    in_background = background_option()
+                    
+                    if st.button(f"🔍 Extract {len(uploaded_files)} Invoices", type="primary", use_container_width=True):
+                        if in_background:
+                            succeeded, failed, skipped = queue_batch_uploads(uploaded_files, skip_duplicates, **options)
+                            st.success(f"📥 Queued {succeeded} invoices for the background worker.")
+                        else:
+                            agent = initialize_extract_agent()
+                            succeeded, failed, skipped = extract_batch_from_images(
+                                agent, uploaded_files, max_workers, skip_duplicates=skip_duplicates, **options
+                            ) if agent is not None else (0, [], [])
                         
-                        # Display the extracted data
-                        display_invoice_data(result.data)
-                    else:
-                        st.error("❌ Extraction failed or no data returned. Please try again.")
+                        if succeeded and not in_background:
+                            st.success(f"✅ Extracted {succeeded} invoices. See the Processed Invoices tab.")
+                        if skipped:
+                            st.info(f"♻️ Skipped {len(skipped)} likely duplicates: "
+                                    + ", ".join(f"{name} (matches {original})" for name, original in skipped))
+                        for filename, error in failed:
+                            reason = str(error) if error is not None else "no data returned"
+                            st.error(f"❌ {filename}: {reason}")
             
+            display_background_jobs()
             st.markdown('</div>', unsafe_allow_html=True)
         
         with col2:
@@ -522,6 +923,7 @@ def main():
             st.markdown("""
             **Supported Formats:**
             - JPG, JPEG, PNG, BMP, TIFF
+            - Multi-page PDF and TIFF
             
             **Features:**
             - AI-powered extraction
@@ -538,15 +940,32 @@ def main():
             st.markdown(f"""
             **Project ID:** `{project_id[:8]}...`
             **Organization:** `{organization_id[:8]}...`
-            **Agent:** `kaggle_invoice_agent`
+            **Agent:** `{agent_name}`
             """)
             
+            if agent_manifest.is_stale(agent_name, project_id):
+                st.warning("⚠️ The invoice schema changed since this agent was provisioned. "
+                           "Run `python create_agent.py` to update it.")
+            elif agent_manifest.lookup(agent_name, project_id) is None:
+                st.caption("Agent not in the local manifest; it is looked up by name. "
+                           "Run `python create_agent.py` for faster startup.")
+            
+            if st.button("🔄 Reload Agent", use_container_width=True):
+                agent_registry.invalidate(agent_name, project_id, organization_id)
+                st.rerun()
+            
             st.markdown('</div>', unsafe_allow_html=True)
     
     with tab2:
         # Display processed invoices table
         st.markdown('<div class="stCard">', unsafe_allow_html=True)
         display_processed_invoices()
+        display_export()
+        st.markdown('</div>', unsafe_allow_html=True)
+    
+    with tab3:
+        st.markdown('<div class="stCard">', unsafe_allow_html=True)
+        display_analytics()
         st.markdown('</div>', unsafe_allow_html=True)
     
     # Sidebar with additional info
@@ -554,12 +973,21 @@ def main():
         st.header("🔧 System Status")
         
         # Status indicators
-        st.markdown("""
+        api_status = {
+            'closed': ("status-info", "🔵 API Connected"),
+            'half_open': ("status-warning", "🟡 API Recovering"),
+            'open': ("status-error", "🔴 API Degraded"),
+        }[get_circuit_breaker().state]
+        agent_status = (
+            ("status-success", "🟢 Agent Ready") if agent_registry.is_loaded(agent_name, project_id, organization_id)
+            else ("status-info", "🔵 Agent Loads on First Extraction")
+        )
+        st.markdown(f"""
         <div style="margin-bottom: 1rem;">
-            <span class="status-badge status-success">🟢 Agent Ready</span>
+            <span class="status-badge {agent_status[0]}">{agent_status[1]}</span>
         </div>
         <div style="margin-bottom: 1rem;">
-            <span class="status-badge status-info">🔵 API Connected</span>
+            <span class="status-badge {api_status[0]}">{api_status[1]}</span>
         </div>
         <div style="margin-bottom: 1rem;">
             <span class="status-badge status-success">🟢 System Online</span>
@@ -569,12 +997,26 @@ def main():
         st.header("📈 Usage Stats")
         
         # Real usage statistics
-        total_processed = len(st.session_state.processed_invoices)
-        success_rate = 100 if total_processed == 0 else 100  # Assuming all successful for now
+        total_processed = get_default_store().count(since=datetime.now().strftime('%Y-%m-%d'))
+        succeeded = telemetry.counter('extractions_succeeded')
+        attempted = succeeded + telemetry.counter('extractions_failed')
+        extraction = telemetry.stage_stats('extraction')
         
         st.metric("Processed Today", total_processed)
-        st.metric("Success Rate", f"{success_rate}%")
-        st.metric("Avg. Processing Time", "2.3s")
+        st.metric("Total Spend", format_cents_column([analytics.totals(get_default_store())['gross']])[0])
+        st.metric("Success Rate", f"{succeeded / attempted:.0%}" if attempted else "N/A")
+        st.metric("Avg. Processing Time", f"{extraction['mean']:.1f}s" if extraction['mean'] is not None else "N/A")
+        
+        cache_stats = get_default_cache().stats()
+        st.metric("Cache Hit Rate", f"{cache_stats['hit_rate']:.0%}")
+        st.caption(f"{cache_stats['hits']} hits / {cache_stats['misses']} misses · {cache_stats['entries']} cached results")
+        
+        workers = work_queue.get_default_queue().live_workers()
+        st.metric("Background Workers", len(workers))
+        if workers:
+            st.caption(f"{sum(concurrency for _, concurrency in workers)} extraction slots")
+        
+        display_telemetry()
         
         st.header("💡 Tips")
         st.markdown("""
@@ -0,0 +1,171 @@
+"""
+Offline throughput and latency benchmark for the extraction pipeline.
+
+Runs the app's real extraction code (job queue, uploads, telemetry) against
+the MockExtractionAgent stand-in, so no LlamaCloud credentials or network
+access are needed. For each concurrency level it reports invoices/sec,
+p50/p95/p99 end-to-end latency and peak Python memory. Optionally it also
+times the blocking sample.py-style agent.extract() loop and Streamlit reruns
+of app.py (when Streamlit is installed).
+
+Thresholds make it usable as a CI regression gate:
+    python benchmarks/extraction_benchmark.py --min-throughput 5 --max-p95 4.0
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Keep benchmark data away from the real caches and invoice store
+_scratch = tempfile.mkdtemp(prefix="invoice-bench-")
+os.environ.setdefault("INVOICE_CACHE_PATH", os.path.join(_scratch, "extractions.sqlite3"))
+os.environ.setdefault("INVOICE_STORE_PATH", os.path.join(_scratch, "invoices.sqlite3"))
+os.environ.setdefault("INVOICE_DEDUP_PATH", os.path.join(_scratch, "dedup.sqlite3"))
+os.environ.setdefault("INVOICE_QUEUE_PATH", os.path.join(_scratch, "work_queue.sqlite3"))
+
+import telemetry  # noqa: E402
+from extraction import extract_batch  # noqa: E402
+from benchmarks.mock_extract import MockBackend, MockExtractionAgent  # noqa: E402
+
+SAMPLE_IMAGE = os.path.join(ROOT, "sample_data", "batch1-0274.jpg")
+
+
+def bench_batch(agent, image_bytes, invoices, concurrency):
+    """Run one batch through extract_batch and return its measurements"""
+    telemetry.reset()
+    tracemalloc.start()
+    start = time.perf_counter()
+    failures = 0
+    files = ((f"invoice-{i}.jpg", image_bytes) for i in range(invoices))
+    for _, data, _ in extract_batch(agent, files, max_workers=concurrency, use_cache=False):
+        failures += data is None
+    wall = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latency = telemetry.stage_stats('extraction')
+    return {
+        'concurrency': concurrency,
+        'invoices': invoices,
+        'failures': failures,
+        'wall_seconds': wall,
+        'throughput': invoices / wall,
+        'p50': latency['p50'],
+        'p95': latency['p95'],
+        'p99': latency['p99'],
+        'peak_memory_mb': peak / 1_000_000,
+    }
+
+
+def bench_blocking(agent, image_path, invoices):
+    """Time the sample.py approach: one blocking agent.extract() after another"""
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(invoices):
+        call_start = time.perf_counter()
+        try:
+            agent.extract(image_path)
+        except RuntimeError:
+            pass
+        latencies.append(time.perf_counter() - call_start)
+    wall = time.perf_counter() - start
+    return {'invoices': invoices, 'throughput': invoices / wall, 'p50': statistics.median(latencies)}
+
+
+def bench_reruns(agent, reruns):
+    """Time Streamlit reruns of app.py with the mock agent, or None without Streamlit"""
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        return None
+    import agent_registry
+
+    agent_registry.get_agent = lambda *args, **kwargs: agent
+    app = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=60)
+    timings = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        app.run()
+        timings.append(time.perf_counter() - start)
+        if app.exception:
+            raise RuntimeError(f"app.py raised during rerun: {app.exception[0].message}")
+    return {'cold': timings[0], 'warm_median': statistics.median(timings[1:]) if reruns > 1 else None}
+
+
+def main():
+    """Run the offline benchmark suite."""
+    parser = argparse.ArgumentParser(description="Offline extraction benchmark against a mock LlamaExtract.")
+    parser.add_argument("--invoices", type=int, default=200)
+    parser.add_argument("--concurrency", default="1,4,16,64", help="Comma-separated concurrency levels")
+    parser.add_argument("--median-latency", type=float, default=1.0, help="Median mock job time (s)")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Log-normal spread of job times")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--upload-mbps", type=float, default=50.0)
+    parser.add_argument("--image", default=SAMPLE_IMAGE)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--blocking", type=int, default=0,
+                        help="Also time N sequential blocking extract() calls (5s check interval)")
+    parser.add_argument("--reruns", type=int, default=0, help="Also time N Streamlit reruns of app.py")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    parser.add_argument("--min-throughput", type=float, help="Fail if the best throughput is lower")
+    parser.add_argument("--max-p95", type=float, help="Fail if any p95 latency (s) is higher")
+    args = parser.parse_args()
+
+    with open(args.image, 'rb') as f:
+        image_bytes = f.read()
+    backend = MockBackend(
+        median_latency=args.median_latency, latency_sigma=args.latency_sigma,
+        failure_rate=args.failure_rate, upload_mbps=args.upload_mbps, seed=args.seed
+    )
+    agent = MockExtractionAgent(backend)
+
+    results = {'batches': []}
+    print(f"{'concurrency':>11} {'inv/s':>8} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7} {'failed':>7} {'peak MB':>8}")
+    for concurrency in [int(level) for level in args.concurrency.split(",")]:
+        batch = bench_batch(agent, image_bytes, args.invoices, concurrency)
+        results['batches'].append(batch)
+        print(f"{concurrency:>11} {batch['throughput']:>8.2f} {batch['p50'] or 0:>7.2f} "
+              f"{batch['p95'] or 0:>7.2f} {batch['p99'] or 0:>7.2f} {batch['failures']:>7} "
+              f"{batch['peak_memory_mb']:>8.1f}")
+
+    if args.blocking:
+        results['blocking'] = bench_blocking(agent, args.image, args.blocking)
+        print(f"\n🐢 Blocking extract(): {results['blocking']['throughput']:.2f} inv/s, "
+              f"p50 {results['blocking']['p50']:.2f}s")
+
+    if args.reruns:
+        results['reruns'] = bench_reruns(agent, args.reruns)
+        if results['reruns'] is None:
+            print("\n⚠️  Streamlit is not installed; skipping rerun benchmark")
+        else:
+            warm = results['reruns']['warm_median']
+            print(f"\n🔁 app.py rerun: cold {results['reruns']['cold'] * 1000:.0f} ms"
+                  + (f", warm median {warm * 1000:.0f} ms" if warm is not None else ""))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Results saved to: {args.json}")
+
+    failed = False
+    best = max(batch['throughput'] for batch in results['batches'])
+    if args.min_throughput is not None and best < args.min_throughput:
+        print(f"❌ Best throughput {best:.2f} inv/s is below {args.min_throughput}")
+        failed = True
+    worst_p95 = max(batch['p95'] or 0 for batch in results['batches'])
+    if args.max_p95 is not None and worst_p95 > args.max_p95:
+        print(f"❌ Worst p95 latency {worst_p95:.2f}s is above {args.max_p95}s")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Local stand-in for LlamaExtract, for benchmarks and offline development.
+
+MockExtractionAgent implements the parts of the ExtractionAgent interface the
+app and scripts use (name, extract, queue_extraction, get_extraction_job and
+get_extraction_run_for_job). Jobs "run" on a simulated backend with
+configurable upload bandwidth, a log-normal processing-time distribution and
+a failure rate. Every result is an Invoice-shaped payload generated from the
+Pydantic models in sample_data/sample_schema.py and validated against them.
+
+The stand-in replaces the SDK's agent object rather than the HTTP API, so the
+app's own code (cache, job queue, uploads, telemetry, rendering) runs
+unchanged on top of it.
+"""
+
+import asyncio
+import math
+import os
+import random
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+
+from sample_data.sample_schema import Invoice
+
+VENDORS = [
+    "Acme Office Supplies", "Globex Logistics", "Initech Software", "Umbrella Medical",
+    "Stark Industrial", "Wayne Hardware", "Hooli Cloud Services", "Soylent Foods",
+]
+PRODUCTS = [
+    "Toner cartridge", "A4 copy paper", "Office chair", "USB-C dock", "Desk lamp",
+    "Shipping pallet", "Cloud storage (monthly)", "Safety gloves", "Coffee beans", "Label printer",
+]
+VAT_RATES = ["0%", "5%", "10%", "23%"]
+
+
+def _resolve(schema, definitions):
+    if "$ref" in schema:
+        return definitions[schema["$ref"].split("/")[-1]]
+    return schema
+
+
+def _generate(schema, definitions, rng, field=""):
+    """Generate a value for a JSON schema node"""
+    schema = _resolve(schema, definitions)
+    kind = schema.get("type")
+    if kind == "object" or "properties" in schema:
+        return {
+            name: _generate(child, definitions, rng, name)
+            for name, child in schema["properties"].items()
+        }
+    if kind == "array":
+        return [_generate(schema["items"], definitions, rng, field) for _ in range(rng.randint(1, 8))]
+    if kind == "number":
+        return round(rng.uniform(1, 500), 2)
+    if kind == "integer":
+        return rng.randint(1, 100)
+    return f"{field}-{rng.randint(1000, 9999)}"
+
+
+def fake_invoice(rng=None):
+    """Return a realistic, arithmetically consistent Invoice payload"""
+    rng = rng or random.Random()
+    schema = Invoice.model_json_schema()
+    data = _generate(schema, schema.get("$defs", {}), rng)
+
+    # Replace generic filler with plausible values and make the numbers add up
+    data["invoice_number"] = str(rng.randint(10000000, 99999999))
+    data["issue_date"] = f"{rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}/{rng.randint(2015, 2024)}"
+    data["seller"]["name"] = rng.choice(VENDORS)
+    data["seller"]["tax_id"] = f"{rng.randint(100, 999)}-{rng.randint(10, 99)}-{rng.randint(1000, 9999)}"
+    data["client"]["name"] = f"Client {rng.randint(1, 500)}"
+
+    buckets = {}
+    for number, item in enumerate(data["items"], start=1):
+        rate = rng.choice(VAT_RATES)
+        item["item_number"] = str(number)
+        item["description"] = rng.choice(PRODUCTS)
+        item["quantity"] = float(rng.randint(1, 20))
+        item["unit_of_measure"] = "each"
+        item["net_price"] = round(rng.uniform(1, 300), 2)
+        item["net_worth"] = round(item["quantity"] * item["net_price"], 2)
+        item["vat_percentage"] = rate
+        item["gross_worth"] = round(item["net_worth"] * (1 + float(rate.rstrip("%")) / 100), 2)
+        bucket = buckets.setdefault(rate, [0.0, 0.0])
+        bucket[0] += item["net_worth"]
+        bucket[1] += item["gross_worth"]
+
+    data["summary"]["vat_summary"] = [
+        {
+            "vat_percentage": rate,
+            "net_worth": round(net, 2),
+            "vat": round(gross - net, 2),
+            "gross_worth": round(gross, 2),
+        }
+        for rate, (net, gross) in sorted(buckets.items())
+    ]
+    summary = data["summary"]
+    summary["total_net_worth"] = round(sum(entry["net_worth"] for entry in summary["vat_summary"]), 2)
+    summary["total_vat"] = round(sum(entry["vat"] for entry in summary["vat_summary"]), 2)
+    summary["total_gross_worth"] = round(sum(entry["gross_worth"] for entry in summary["vat_summary"]), 2)
+
+    return Invoice.model_validate(data).model_dump()
+
+
+class MockBackend:
+    """Simulated extraction service shared by any number of mock agents"""
+
+    def __init__(self, median_latency=2.0, latency_sigma=0.5, failure_rate=0.0,
+                 upload_mbps=50.0, seed=None):
+        self.median_latency = median_latency
+        self.latency_sigma = latency_sigma
+        self.failure_rate = failure_rate
+        self.upload_bytes_per_second = upload_mbps * 1_000_000 / 8
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._jobs = {}
+
+    def _sample_latency(self):
+        return self.median_latency * math.exp(self._rng.gauss(0, self.latency_sigma))
+
+    def upload_seconds(self, file_input):
+        """Return how long uploading a file takes at the configured bandwidth"""
+        if isinstance(file_input, (str, os.PathLike)):
+            size = os.path.getsize(file_input)
+        else:
+            payload = getattr(file_input, "file", file_input)
+            size = len(payload) if isinstance(payload, (bytes, bytearray)) else len(payload.read())
+        return size / self.upload_bytes_per_second
+
+    def create_job(self):
+        """Start a job and return its ID"""
+        with self._lock:
+            job_id = uuid.uuid4().hex
+            fails = self._rng.random() < self.failure_rate
+            payload = None if fails else fake_invoice(random.Random(self._rng.random()))
+            self._jobs[job_id] = (time.monotonic() + self._sample_latency(), fails, payload)
+        return job_id
+
+    def job(self, job_id):
+        """Return (status, error, payload) for a job"""
+        ready_at, fails, payload = self._jobs[job_id]
+        if time.monotonic() < ready_at:
+            return "PENDING", None, None
+        if fails:
+            return "ERROR", "Simulated extraction failure", None
+        return "SUCCESS", None, payload
+
+
+class MockExtractionAgent:
+    """Drop-in replacement for llama_cloud_services' ExtractionAgent"""
+
+    def __init__(self, backend=None, name="mock_invoice_agent", check_interval=5):
+        self.backend = backend or MockBackend()
+        self.name = name
+        self.check_interval = check_interval
+        self.id = f"mock-{name}"
+
+    async def queue_extraction(self, files):
+        single = not isinstance(files, list)
+        jobs = []
+        for file_input in ([files] if single else files):
+            await asyncio.sleep(self.backend.upload_seconds(file_input))
+            jobs.append(SimpleNamespace(id=self.backend.create_job(), status="PENDING"))
+        return jobs[0] if single else jobs
+
+    def get_extraction_job(self, job_id):
+        status, error, _ = self.backend.job(job_id)
+        return SimpleNamespace(id=job_id, status=status, error=error)
+
+    def get_extraction_run_for_job(self, job_id):
+        status, error, payload = self.backend.job(job_id)
+        return SimpleNamespace(job_id=job_id, status=status, error=error, data=payload)
+
+    def extract(self, files):
+        """Blocking extraction that polls on a fixed check_interval, like the SDK"""
+        single = not isinstance(files, list)
+        results = []
+        for file_input in ([files] if single else files):
+            time.sleep(self.backend.upload_seconds(file_input))
+            job_id = self.backend.create_job()
+            while True:
+                status, error, payload = self.backend.job(job_id)
+                if status != "PENDING":
+                    break
+                time.sleep(self.check_interval)
+            if error:
+                raise RuntimeError(error)
+            results.append(SimpleNamespace(job_id=job_id, data=payload))
+        return results[0] if single else results
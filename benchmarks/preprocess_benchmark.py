@@ -0,0 +1,102 @@
+"""
+Benchmark the image preprocessing stage.
+
+Reports how many bytes preprocessing saves on each image, how long it takes,
+and the upload time saved at a given link speed. With --live it also runs
+real extractions with and without preprocessing (bypassing the result cache)
+to measure the end-to-end latency change.
+
+Usage:
+    python benchmarks/preprocess_benchmark.py
+    python benchmarks/preprocess_benchmark.py scans/*.jpg --uplink-mbps 20 --live
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from preprocess import PreprocessOptions, preprocess_image, is_available  # noqa: E402
+
+SAMPLE_IMAGE = os.path.join(ROOT, "sample_data", "batch1-0274.jpg")
+
+
+def bench_file(path, options, repeat):
+    """Return (original_bytes, processed_bytes, median_seconds) for one image"""
+    with open(path, 'rb') as f:
+        original = f.read()
+    timings, pages = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        pages = preprocess_image(original, os.path.basename(path), options)
+        timings.append(time.perf_counter() - start)
+    processed = sum(len(page) for _, page in pages)
+    return len(original), processed, statistics.median(timings)
+
+
+def bench_live(paths, options, runs):
+    """Return median extraction latency without and with preprocessing"""
+    # Loads .env before the modules below read their settings from the environment
+    import config
+    import agent_registry
+    from extraction import extract_bytes
+
+    agent = agent_registry.get_agent(config.AGENT_NAME, config.PROJECT_ID, config.ORGANIZATION_ID)
+    latencies = {'original': [], 'preprocessed': []}
+    for path in paths:
+        with open(path, 'rb') as f:
+            file_bytes = f.read()
+        for _ in range(runs):
+            for label, preprocess in (('original', None), ('preprocessed', options)):
+                start = time.perf_counter()
+                extract_bytes(agent, file_bytes, filename=os.path.basename(path),
+                              use_cache=False, preprocess=preprocess)
+                latencies[label].append(time.perf_counter() - start)
+    return {label: statistics.median(values) for label, values in latencies.items()}
+
+
+def main():
+    """Run the preprocessing benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark image preprocessing.")
+    parser.add_argument("images", nargs="*", default=[SAMPLE_IMAGE])
+    parser.add_argument("--target-dpi", type=int, default=PreprocessOptions().target_dpi)
+    parser.add_argument("--repeat", type=int, default=5, help="Preprocessing runs per image")
+    parser.add_argument("--uplink-mbps", type=float, default=10.0, help="Assumed upload bandwidth")
+    parser.add_argument("--live", action="store_true", help="Also time real extractions (uses credits)")
+    parser.add_argument("--live-runs", type=int, default=3)
+    args = parser.parse_args()
+
+    if not is_available():
+        print("❌ Pillow is not installed: pip install Pillow")
+        sys.exit(1)
+
+    options = PreprocessOptions(target_dpi=args.target_dpi, keep_original_if_smaller=False)
+    bytes_per_second = args.uplink_mbps * 1_000_000 / 8
+
+    print(f"{'image':<32} {'original':>10} {'processed':>10} {'saved':>7} {'prep ms':>8} {'upload Δ ms':>12}")
+    total_original, total_processed = 0, 0
+    for path in args.images:
+        original, processed, seconds = bench_file(path, options, args.repeat)
+        total_original += original
+        total_processed += processed
+        upload_delta = (processed - original) / bytes_per_second
+        print(f"{os.path.basename(path)[:32]:<32} {original:>10,} {processed:>10,} "
+              f"{1 - processed / original:>7.1%} {seconds * 1000:>8.1f} {upload_delta * 1000:>12.1f}")
+
+    if total_original:
+        print(f"\n📉 Total: {total_original:,} → {total_processed:,} bytes "
+              f"({1 - total_processed / total_original:.1%} saved)")
+
+    if args.live:
+        medians = bench_live(args.images, options, args.live_runs)
+        change = medians['preprocessed'] - medians['original']
+        print(f"\n⏱️  End-to-end median: original {medians['original']:.2f}s, "
+              f"preprocessed {medians['preprocessed']:.2f}s ({change:+.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Startup and per-interaction overhead benchmark for the Streamlit app.
+
+Measures three things, all offline:
+
+- cold import: a fresh interpreter importing app.py (median of several
+  processes), and whether that pulled in the LlamaCloud SDK, which should
+  only be imported once the first extraction starts;
+- first run: the first AppTest run of app.py in a process (caches empty);
+- reruns: warm reruns with no input, and reruns triggered by a widget
+  interaction on the Processed Invoices and Analytics tabs, against a store
+  seeded with mock invoices.
+
+Thresholds make it usable as a CI regression gate:
+    python benchmarks/startup_benchmark.py --max-import 1.5 --max-rerun 0.15
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Keep benchmark data away from the real caches and invoice store
+_scratch = tempfile.mkdtemp(prefix="invoice-startup-bench-")
+for name, filename in (('CACHE', 'extractions'), ('STORE', 'invoices'), ('DEDUP', 'dedup'), ('QUEUE', 'work_queue')):
+    os.environ.setdefault(f"INVOICE_{name}_PATH", os.path.join(_scratch, f"{filename}.sqlite3"))
+
+SDK_MODULES = ('llama_cloud', 'llama_cloud_services', 'llama_index')
+
+IMPORT_SNIPPET = """
+import json, sys, time
+start = time.perf_counter()
+import app
+seconds = time.perf_counter() - start
+print(json.dumps({'seconds': seconds, 'sdk': sorted(m for m in sys.modules if m.split('.')[0] in %r)}))
+""" % (SDK_MODULES,)
+
+
+def bench_import(runs):
+    """Import app.py in fresh interpreters; return median seconds and any SDK modules loaded"""
+    timings, sdk = [], []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", IMPORT_SNIPPET], cwd=ROOT, capture_output=True, text=True, check=True
+        )
+        measurement = json.loads(result.stdout.strip().splitlines()[-1])
+        timings.append(measurement['seconds'])
+        sdk = measurement['sdk']
+    return {'median': statistics.median(timings), 'min': min(timings), 'sdk_modules': len(sdk)}
+
+
+def seed_store(invoices, seed):
+    """Store mock invoices so the table and analytics tabs have something to render"""
+    import processing
+    from benchmarks.mock_extract import fake_invoice
+
+    rng = random.Random(seed)
+    processing.store_invoices([(fake_invoice(rng), f"seed-{i}.jpg", None) for i in range(invoices)])
+
+
+def _timed_run(app):
+    start = time.perf_counter()
+    app.run()
+    if app.exception:
+        raise RuntimeError(f"app.py raised during rerun: {app.exception[0].message}")
+    return time.perf_counter() - start
+
+
+def bench_reruns(reruns):
+    """Time the first run, idle reruns and widget-triggered reruns of app.py, or None without Streamlit"""
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        return None
+
+    app = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=60)
+    first = _timed_run(app)
+    idle = [_timed_run(app) for _ in range(reruns)]
+
+    interaction = []
+    page_sizes = [25, 50]
+    rank_by = ["Occurrences", "Gross spend"]
+    for i in range(reruns):
+        [box for box in app.selectbox if box.label == "Rows per page"][0].set_value(page_sizes[i % 2])
+        [radio for radio in app.radio if radio.label == "Rank by"][0].set_value(rank_by[i % 2])
+        interaction.append(_timed_run(app))
+    return {
+        'first': first,
+        'idle_median': statistics.median(idle),
+        'interaction_median': statistics.median(interaction),
+        'sdk_modules': len([m for m in sys.modules if m.split('.')[0] in SDK_MODULES]),
+    }
+
+
+def main():
+    """Run the startup benchmark."""
+    parser = argparse.ArgumentParser(description="Measure app.py import time and Streamlit rerun overhead.")
+    parser.add_argument("--imports", type=int, default=5, help="Fresh interpreters to time the import in")
+    parser.add_argument("--reruns", type=int, default=10, help="Reruns to time per scenario")
+    parser.add_argument("--invoices", type=int, default=500, help="Mock invoices to seed the store with")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="Write results to this JSON file")
+    parser.add_argument("--max-import", type=float, help="Fail if the median cold import (s) is higher")
+    parser.add_argument("--max-rerun", type=float, help="Fail if a median rerun (s) is higher")
+    args = parser.parse_args()
+
+    results = {}
+    results['import'] = bench_import(args.imports)
+    print(f"🚀 Cold import of app.py: median {results['import']['median'] * 1000:.0f} ms "
+          f"(min {results['import']['min'] * 1000:.0f} ms), "
+          f"{results['import']['sdk_modules']} LlamaCloud SDK modules loaded")
+
+    seed_store(args.invoices, args.seed)
+    results['reruns'] = bench_reruns(args.reruns)
+    if results['reruns'] is None:
+        print("⚠️  Streamlit is not installed; skipping rerun benchmark")
+    else:
+        reruns = results['reruns']
+        print(f"🔁 app.py first run {reruns['first'] * 1000:.0f} ms, "
+              f"idle rerun median {reruns['idle_median'] * 1000:.0f} ms, "
+              f"interaction rerun median {reruns['interaction_median'] * 1000:.0f} ms "
+              f"({args.invoices} invoices stored, {reruns['sdk_modules']} SDK modules loaded)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Results saved to: {args.json}")
+
+    failed = False
+    if args.max_import is not None and results['import']['median'] > args.max_import:
+        print(f"❌ Cold import {results['import']['median']:.2f}s is above {args.max_import}s")
+        failed = True
+    if args.max_rerun is not None and results['reruns'] is not None:
+        worst = max(results['reruns']['idle_median'], results['reruns']['interaction_median'])
+        if worst > args.max_rerun:
+            print(f"❌ Median rerun {worst:.3f}s is above {args.max_rerun}s")
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
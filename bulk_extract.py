@@ -0,0 +1,236 @@
+"""
+Headless bulk invoice extraction using LlamaCloud.
+
+Walks a directory (or glob) of invoice images and PDFs, extracts them with
+bounded concurrency and streams results to a JSONL or Parquet file as they
+finish.
+Every finished file is recorded in a manifest, so an interrupted run can be
+restarted with the same arguments and picks up where it left off.
+
+Usage:
+    python bulk_extract.py invoices/ --output results.jsonl
+    python bulk_extract.py "scans/**/*.jpg" --output results.parquet --format parquet
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+from datetime import datetime
+# Loads .env before the modules below read their settings from the environment
+import config
+import agent_registry
+from extraction import extract_batch, DEFAULT_MAX_WORKERS
+from preprocess import PreprocessOptions
+from normalize import cents_to_float, normalize_invoice
+from validation import validate_invoice
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif', '.pdf')
+
+# Number of records buffered per Parquet row group
+PARQUET_ROW_GROUP_SIZE = 500
+
+
+def find_invoices(source, recursive=True):
+    """Yield invoice image paths under a directory or matching a glob"""
+    if os.path.isdir(source):
+        pattern = os.path.join(source, '**', '*') if recursive else os.path.join(source, '*')
+    else:
+        pattern = source
+    for path in sorted(glob.iglob(pattern, recursive=recursive)):
+        if os.path.isfile(path) and path.lower().endswith(IMAGE_EXTENSIONS):
+            yield path
+
+
+def load_manifest(manifest_path):
+    """Return the set of paths the manifest records as done"""
+    done = set()
+    if not os.path.exists(manifest_path):
+        return done
+    with open(manifest_path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # A crash can leave a truncated last line; that file is simply redone
+                continue
+            if entry.get('status') == 'done':
+                done.add(entry['path'])
+    return done
+
+
+class JsonlWriter:
+    """Append one JSON record per line, flushing after every record"""
+
+    def __init__(self, path):
+        self._file = open(path, 'a')
+
+    def write(self, record):
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter:
+    """Stream records into Parquet row groups.
+
+    Parquet files cannot be appended to, so a resumed run writes a new part
+    file next to the requested output instead of overwriting earlier results.
+    """
+
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet output requires pyarrow: pip install pyarrow")
+        self._pa = pa
+        self._pq = pq
+        self.path = self._free_path(path)
+        self._schema = pa.schema([
+            ('source', pa.string()),
+            ('extracted_at', pa.string()),
+            ('invoice_number', pa.string()),
+            ('issue_date', pa.date32()),
+            ('seller_name', pa.string()),
+            ('client_name', pa.string()),
+            ('total_gross_worth', pa.float64()),
+            ('status', pa.string()),
+            ('issues', pa.list_(pa.string())),
+            ('data', pa.string()),
+        ])
+        self._writer = pq.ParquetWriter(self.path, self._schema)
+        self._rows = []
+
+    @staticmethod
+    def _free_path(path):
+        stem, ext = os.path.splitext(path)
+        candidate, part = path, 1
+        while os.path.exists(candidate):
+            candidate = f"{stem}.part{part}{ext}"
+            part += 1
+        return candidate
+
+    def write(self, record):
+        data = record['data']
+        # Typed the same way as the invoice store and export_invoices.py, whatever the invoice printed
+        normalized = normalize_invoice(data)
+        self._rows.append({
+            'source': record['source'],
+            'extracted_at': record['extracted_at'],
+            'invoice_number': normalized['invoice_number'],
+            'issue_date': normalized['issue_date'],
+            'seller_name': normalized['seller']['name'],
+            'client_name': normalized['client']['name'],
+            'total_gross_worth': cents_to_float(normalized['total_gross_worth']),
+            'status': record['status'],
+            'issues': record['issues'],
+            'data': json.dumps(data),
+        })
+        if len(self._rows) >= PARQUET_ROW_GROUP_SIZE:
+            self._flush()
+
+    def _flush(self):
+        if self._rows:
+            table = self._pa.Table.from_pylist(self._rows, schema=self._schema)
+            self._writer.write_table(table)
+            self._rows = []
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+
+def run(source, output, output_format, manifest_path, concurrency, use_cache, recursive, preprocess=None):
+    """Extract every pending invoice under source, returning (succeeded, failed)"""
+    done = load_manifest(manifest_path)
+    pending = [path for path in find_invoices(source, recursive) if path not in done]
+    print(f"📂 {len(done)} invoices already done, {len(pending)} to extract")
+    if not pending:
+        return 0, 0
+
+    # The same agent as the app and worker.py
+    agent = agent_registry.get_agent(config.AGENT_NAME, config.PROJECT_ID, config.ORGANIZATION_ID)
+    print(f"✅ Successfully connected to agent: {config.AGENT_NAME}")
+
+    writer = ParquetWriter(output) if output_format == 'parquet' else JsonlWriter(output)
+    succeeded, failed = 0, 0
+    try:
+        with open(manifest_path, 'a') as manifest:
+            results = extract_batch(
+                agent, ((path, path) for path in pending),
+                max_workers=concurrency, use_cache=use_cache, preprocess=preprocess
+            )
+            for path, data, error in results:
+                if data is not None:
+                    # Results are written before the manifest entry, so a crash
+                    # in between re-extracts the file rather than losing it
+                    validation = validate_invoice(data)
+                    writer.write({
+                        'source': path,
+                        'extracted_at': datetime.now().isoformat(timespec='seconds'),
+                        'status': validation.status,
+                        'issues': validation.issues,
+                        'data': data,
+                    })
+                    entry = {'path': path, 'status': 'done'}
+                    succeeded += 1
+                else:
+                    reason = str(error) if error is not None else "no data returned"
+                    entry = {'path': path, 'status': 'failed', 'error': reason}
+                    failed += 1
+                    print(f"❌ {path}: {reason}")
+                manifest.write(json.dumps(entry) + "\n")
+                manifest.flush()
+
+                finished = succeeded + failed
+                if finished % 100 == 0 or finished == len(pending):
+                    print(f"📄 {finished}/{len(pending)} processed ({failed} failed)")
+    finally:
+        writer.close()
+
+    return succeeded, failed
+
+
+def main():
+    """Parse arguments and run the bulk extraction."""
+    parser = argparse.ArgumentParser(description="Bulk-extract a directory of invoice images.")
+    parser.add_argument("source", help="Directory or glob pattern of invoice images")
+    parser.add_argument("--output", "-o", default="bulk_output.jsonl", help="Results file")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], default="jsonl", dest="output_format")
+    parser.add_argument("--manifest", help="Progress manifest (default: <output>.manifest.jsonl)")
+    parser.add_argument("--concurrency", "-c", type=int, default=DEFAULT_MAX_WORKERS,
+                        help="Maximum extractions in flight")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the local result cache")
+    parser.add_argument("--no-recursive", action="store_true", help="Do not descend into subdirectories")
+    parser.add_argument("--preprocess", action="store_true",
+                        help="Downscale and re-encode images before upload (requires Pillow)")
+    parser.add_argument("--target-dpi", type=int, default=PreprocessOptions().target_dpi,
+                        help="DPI to downscale to when --preprocess is set")
+    args = parser.parse_args()
+
+    manifest_path = args.manifest or f"{args.output}.manifest.jsonl"
+    try:
+        succeeded, failed = run(
+            args.source, args.output, args.output_format, manifest_path,
+            args.concurrency, not args.no_cache, not args.no_recursive,
+            preprocess=PreprocessOptions(target_dpi=args.target_dpi) if args.preprocess else None
+        )
+    except KeyboardInterrupt:
+        print("\n⏸️  Interrupted. Re-run the same command to resume.")
+        sys.exit(130)
+    except Exception as e:
+        print(f"❌ Unexpected error: {e}")
+        sys.exit(1)
+
+    print(f"\n🎉 Done: {succeeded} extracted, {failed} failed")
+    print(f"💾 Results: {args.output}")
+    print(f"📋 Manifest: {manifest_path}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+"""
+Configuration for the Streamlit app and CLIs, loaded once per process.
+
+Streamlit re-executes app.py on every interaction, but imported modules stay
+loaded, so .env is read and the environment parsed here only on first
+import. Import this module before the ones that read INVOICE_* settings at
+import time, so values from .env reach them too.
+"""
+
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PROJECT_ID = os.getenv("LLAMA_CLOUD_PROJECT_ID", "2fef999e-1073-40e6-aeb3-1f3c0e64d99b")
+ORGANIZATION_ID = os.getenv("LLAMA_CLOUD_ORGANIZATION_ID", "43b88c8f-e488-46f6-9013-698e3d2e374a")
+AGENT_NAME = os.getenv("LLAMA_CLOUD_AGENT_NAME", "kaggle_invoice_agent")
+
+# Port for the /metrics endpoint, or None to disable it
+METRICS_PORT = int(os.getenv("METRICS_PORT")) if os.getenv("METRICS_PORT") else None
@@ -3,19 +3,29 @@ Create LlamaCloud extraction agent for invoice processing.
 
 Run this script to automatically create an extraction agent with the invoice schema
 before testing with sample.py or building your Streamlit app.
+
+The schema is fingerprinted and the provisioned agent is recorded in the local
+agent manifest (see agent_manifest.py). Re-running the script is free until
+the schema changes; then the existing agent is updated in place.
+
+Usage:
+    python create_agent.py
+    python create_agent.py --schema sample_data/sample_schema.json
+    python create_agent.py --force
 """
 
+import argparse
 import os
 import sys
 from dotenv import load_dotenv
 from llama_cloud_services import LlamaExtract
-from llama_cloud.core.api_error import ApiError
-from sample_data.sample_schema import Invoice
+import agent_manifest
+from fingerprints import schema_fingerprint
 
 # Load environment variables
 load_dotenv()
 
-def create_invoice_agent():
+def create_invoice_agent(schema_path=None, force=False):
     """Create or update the invoice extraction agent."""
     
     # Get configuration
@@ -49,33 +59,27 @@ def create_invoice_agent():
         print(f"📋 Project ID: {project_id}")
         print(f"🏢 Organization ID: {organization_id}")
         print(f"🤖 Agent name: {agent_name}")
+        print(f"📊 Using invoice schema from {schema_path or 'sample_data/sample_schema.py'}")
+        print(f"🔑 Schema fingerprint: {schema_fingerprint(agent_manifest.load_schema(schema_path))}")
         
-        # Check if agent already exists
-        try:
-            existing_agent = extract.get_agent(name=agent_name)
-            if existing_agent:
-                print(f"✅ Agent '{agent_name}' already exists!")
-                print(f"🤖 Agent ID: {existing_agent.id}")
-                print("📝 You can use this existing agent for extraction.")
-                return True
-        except ApiError as e:
-            if e.status_code == 404:
-                print(f"📝 Agent '{agent_name}' does not exist, creating new one...")
-            else:
-                raise
-        
-        # Create new agent with invoice schema
-        print("🔧 Creating new extraction agent...")
-        print("📊 Using invoice schema from sample_data/sample_schema.py")
-        
-        agent = extract.create_agent(
-            name=agent_name, 
-            data_schema=Invoice
+        # Only talks to the API when the schema differs from the last provisioned one
+        agent_id, action = agent_manifest.provision(
+            extract, agent_name, project_id, organization_id, schema_path=schema_path, force=force
         )
         
-        print("🎉 Success! Extraction agent created successfully!")
-        print(f"🤖 Agent ID: {agent.id}")
-        print(f"📝 Agent Name: {agent.name}")
+        if action == 'unchanged':
+            print(f"✅ Agent '{agent_name}' is up to date with this schema (no API calls made).")
+        elif action == 'recorded':
+            print(f"✅ Agent '{agent_name}' already exists with this schema!")
+        elif action == 'updated':
+            print(f"🔧 Schema changed; updated agent '{agent_name}' in place.")
+        else:
+            print("🎉 Success! Extraction agent created successfully!")
+        print(f"🤖 Agent ID: {agent_id}")
+        print(f"💾 Recorded in {agent_manifest.DEFAULT_PATH}")
+        
+        if action in ('unchanged', 'recorded'):
+            return True
         
         print("\n📋 Schema Summary:")
         print("  • Invoice metadata (number, date)")
@@ -101,6 +105,11 @@ def create_invoice_agent():
 
 def main():
     """Main function."""
+    parser = argparse.ArgumentParser(description="Create or update the invoice extraction agent.")
+    parser.add_argument("--schema", help="JSON schema file to use instead of sample_data/sample_schema.py")
+    parser.add_argument("--force", action="store_true", help="Check the remote agent even if the schema is unchanged")
+    args = parser.parse_args()
+    
     print("🔨 LlamaCloud Invoice Extraction Agent Setup")
     print("=" * 50)
     
@@ -115,7 +124,7 @@ def main():
         sys.exit(1)
     
     # Create agent
-    success = create_invoice_agent()
+    success = create_invoice_agent(args.schema, args.force)
     
     if success:
         sys.exit(0)
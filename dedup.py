@@ -0,0 +1,186 @@
+"""
+Near-duplicate invoice detection.
+
+Two signals identify an invoice that has been seen before:
+
+- a perceptual hash of the uploaded image (a 256-bit difference hash of the
+  trimmed, grayscale page), which stays close for rescans and re-encoded
+  forwards of the same document and is checked before paying for extraction;
+- a data key built from the extracted invoice_number, seller tax ID and
+  gross total, which catches duplicates the images alone cannot.
+
+Invoices printed from the same template hash close together too, so image
+similarity only flags a likely rescan. A stored invoice is confirmed as a
+duplicate by its data key, and by its image only when the extraction has no
+usable key.
+
+Both are persisted in a small SQLite index. Image hashes are mirrored into a
+NumPy matrix, so a nearest-neighbour search by Hamming distance is a single
+vectorized XOR/popcount over every stored hash; data keys are an indexed
+exact lookup. Perceptual hashing requires Pillow; without it only data keys
+are used.
+"""
+
+import io
+import os
+import re
+import sqlite3
+import threading
+import numpy as np
+from normalize import ensure_normalized
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+DEFAULT_PATH = os.getenv("INVOICE_DEDUP_PATH", ".cache/dedup.sqlite3")
+
+# Side of the hash grid; the hash has HASH_SIZE * HASH_SIZE bits
+HASH_SIZE = 16
+
+# Maximum Hamming distance (out of 256 bits) for two images to count as the same invoice.
+# A re-encode of the same scan moves about 1 bit; a different invoice on the
+# same vendor template can be as close as 6.
+MAX_DISTANCE = 4
+
+
+def perceptual_hash(file_bytes):
+    """Return the image's difference hash as bytes, or None if it cannot be hashed"""
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(file_bytes)) as image:
+            page = ImageOps.exif_transpose(image).convert("L")
+    except Exception:
+        return None
+    # Trim the scanner margin so shifted rescans line up, then compare neighbouring cells
+    page = ImageOps.autocontrast(page)
+    box = ImageOps.invert(page).point(lambda value: 255 if value > 32 else 0).getbbox()
+    if box:
+        page = page.crop(box)
+    cells = np.asarray(page.resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS), dtype=np.int16)
+    return np.packbits(cells[:, 1:] > cells[:, :-1]).tobytes()
+
+
+def hamming_distances(hashes, image_hash):
+    """Return the Hamming distance from image_hash to each row of an (N, 32) uint8 matrix"""
+    target = np.frombuffer(image_hash, dtype=np.uint8)
+    return np.unpackbits(np.bitwise_xor(hashes, target), axis=1).sum(axis=1)
+
+
+def _closest(hashes, image_hash, max_distance):
+    distances = hamming_distances(hashes, image_hash)
+    best = int(np.argmin(distances))
+    return (best, int(distances[best])) if distances[best] <= max_distance else None
+
+
+def closest(image_hashes, image_hash, max_distance=MAX_DISTANCE):
+    """Return (position, distance) of the nearest hash in a list within range, or None"""
+    if image_hash is None or not image_hashes:
+        return None
+    return _closest(np.frombuffer(b"".join(image_hashes), dtype=np.uint8).reshape(len(image_hashes), -1),
+                    image_hash, max_distance)
+
+
+def data_key(invoice_data):
+    """Return the normalized (invoice number, seller tax ID, gross total) key, or None if it is not usable"""
+    invoice_data = ensure_normalized(invoice_data)
+    number = re.sub(r"[^0-9A-Z]", "", (invoice_data['invoice_number'] or "").upper())
+    tax_id = re.sub(r"[^0-9A-Z]", "", (invoice_data['seller']['tax_id'] or "").upper())
+    cents = invoice_data['total_gross_worth']
+    total = f"{cents / 100:.2f}" if cents is not None else ""
+    # An invoice number alone is shared by unrelated vendors
+    if not number or not (tax_id or total):
+        return None
+    return f"{number}|{tax_id}|{total}"
+
+
+class DuplicateIndex:
+    """Persistent index of image hashes and data keys of stored invoices"""
+
+    def __init__(self, path=DEFAULT_PATH, max_distance=MAX_DISTANCE):
+        self.path = path
+        self.max_distance = max_distance
+        self._lock = threading.Lock()
+        self._ids = []
+        self._hashes = np.zeros((0, HASH_SIZE * HASH_SIZE // 8), dtype=np.uint8)
+        self._loaded_rowid = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS image_hashes (
+                    invoice_id TEXT NOT NULL,
+                    hash BLOB NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS data_keys (
+                    key TEXT NOT NULL,
+                    invoice_id TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS data_keys_key ON data_keys (key);
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _refresh(self):
+        # Pick up hashes added since the last lookup, including by other processes
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT rowid, invoice_id, hash FROM image_hashes WHERE rowid > ? ORDER BY rowid",
+                (self._loaded_rowid,)
+            ).fetchall()
+        if rows:
+            self._ids.extend(row[1] for row in rows)
+            added = np.frombuffer(b"".join(row[2] for row in rows), dtype=np.uint8)
+            self._hashes = np.vstack([self._hashes, added.reshape(len(rows), -1)])
+            self._loaded_rowid = rows[-1][0]
+
+    def find_image(self, image_hash):
+        """Return (invoice_id, distance) of the closest stored image within range, or None"""
+        if image_hash is None:
+            return None
+        with self._lock:
+            self._refresh()
+            if not self._ids:
+                return None
+            match = _closest(self._hashes, image_hash, self.max_distance)
+        return (self._ids[match[0]], match[1]) if match else None
+
+    def find_data(self, invoice_data):
+        """Return the ID of a stored invoice with the same data key, or None"""
+        key = data_key(invoice_data)
+        if key is None:
+            return None
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT invoice_id FROM data_keys WHERE key = ? ORDER BY rowid LIMIT 1", (key,)
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def add(self, invoice_id, image_hash=None, invoice_data=None):
+        """Index a stored invoice by its image hash and/or extracted data"""
+        key = data_key(invoice_data) if invoice_data else None
+        with self._connect() as conn:
+            if image_hash is not None:
+                conn.execute(
+                    "INSERT INTO image_hashes (invoice_id, hash) VALUES (?, ?)", (invoice_id, image_hash)
+                )
+            if key is not None:
+                conn.execute("INSERT INTO data_keys (key, invoice_id) VALUES (?, ?)", (key, invoice_id))
+
+
+_default_index = None
+_default_lock = threading.Lock()
+
+
+def get_default_index():
+    """Return the process-wide duplicate index"""
+    global _default_index
+    with _default_lock:
+        if _default_index is None:
+            _default_index = DuplicateIndex()
+        return _default_index
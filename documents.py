@@ -0,0 +1,159 @@
+"""
+Multi-page PDF and TIFF invoices.
+
+Short documents are sent to LlamaExtract whole: one job sees every page and
+returns one Invoice. Longer documents are split into single-page files that
+are extracted in parallel, and the per-page results are merged back into one
+Invoice: header fields come from the first page that has them, line items
+are concatenated in page order and the summary is reconciled against the
+merged items.
+
+Pages are produced one at a time by iter_pages(), so splitting a large
+document never holds more than the source and one page in memory.
+
+PDF splitting requires pypdf and TIFF splitting requires Pillow; without
+them documents are always sent whole.
+"""
+
+import io
+import os
+from normalize import parse_cents, rate_label
+from validation import ABS_TOLERANCE, REL_TOLERANCE
+
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:
+    PdfReader = None
+
+try:
+    from PIL import Image, ImageSequence
+except ImportError:
+    Image = None
+
+PDF_EXTENSIONS = ('.pdf',)
+TIFF_EXTENSIONS = ('.tif', '.tiff')
+
+# Documents with at least this many pages are split and extracted page by page
+SPLIT_MIN_PAGES = 4
+
+def is_multipage_type(filename):
+    """Return True for formats that can hold more than one page"""
+    return os.path.splitext(filename or "")[1].lower() in PDF_EXTENSIONS + TIFF_EXTENSIONS
+
+
+def _open(source):
+    return io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else open(source, 'rb')
+
+
+def page_count(source, filename):
+    """Return the number of pages, or None if it cannot be determined"""
+    extension = os.path.splitext(filename or "")[1].lower()
+    try:
+        with _open(source) as f:
+            if extension in PDF_EXTENSIONS and PdfReader is not None:
+                return len(PdfReader(f).pages)
+            if extension in TIFF_EXTENSIONS and Image is not None:
+                with Image.open(f) as image:
+                    return getattr(image, "n_frames", 1)
+    except Exception:
+        return None
+    return None
+
+
+def should_split(source, filename, min_pages=SPLIT_MIN_PAGES):
+    """Return the page count if the document should be extracted page by page, else None"""
+    if not is_multipage_type(filename):
+        return None
+    pages = page_count(source, filename)
+    return pages if pages is not None and pages >= min_pages else None
+
+
+def iter_pages(source, filename):
+    """Yield (page filename, page bytes) for each page of a PDF or TIFF, one at a time"""
+    stem, extension = os.path.splitext(os.path.basename(filename))
+    extension = extension.lower()
+    with _open(source) as f:
+        if extension in PDF_EXTENSIONS:
+            reader = PdfReader(f)
+            for number, page in enumerate(reader.pages, start=1):
+                writer = PdfWriter()
+                writer.add_page(page)
+                out = io.BytesIO()
+                writer.write(out)
+                yield f"{stem}-p{number}.pdf", out.getvalue()
+        else:
+            with Image.open(f) as image:
+                for number, frame in enumerate(ImageSequence.Iterator(image), start=1):
+                    out = io.BytesIO()
+                    frame.save(out, format="TIFF", compression="tiff_lzw")
+                    yield f"{stem}-p{number}.tiff", out.getvalue()
+
+
+def _amount(cents):
+    return cents / 100
+
+
+def _summary_from_items(items):
+    """Compute the VAT breakdown and totals from line items, summing in integer cents"""
+    buckets = {}
+    for item in items:
+        # Amounts are parsed as printed ("1.234,56", "€1,234.56")
+        net, gross = parse_cents(item.get('net_worth')) or 0, parse_cents(item.get('gross_worth')) or 0
+        # "23%" and "23" are the same rate; the first spelling is kept
+        bucket = buckets.setdefault(rate_label(item.get('vat_percentage')), [item.get('vat_percentage') or "", 0, 0])
+        bucket[1] += net
+        bucket[2] += gross
+    vat_summary = [
+        {'vat_percentage': rate, 'net_worth': _amount(net), 'vat': _amount(gross - net), 'gross_worth': _amount(gross)}
+        for rate, net, gross in buckets.values()
+    ]
+    return {
+        'vat_summary': vat_summary,
+        'total_net_worth': _amount(sum(net for _, net, _ in buckets.values())),
+        'total_vat': _amount(sum(gross - net for _, net, gross in buckets.values())),
+        'total_gross_worth': _amount(sum(gross for _, _, gross in buckets.values())),
+    }
+
+
+def _agrees(printed_cents, computed_cents):
+    """Same tolerance as validation.py: absolute or relative to the computed total, whichever is larger"""
+    limit = max(ABS_TOLERANCE * 100, REL_TOLERANCE * abs(computed_cents))
+    return abs(printed_cents - computed_cents) <= limit
+
+
+def merge_pages(pages):
+    """Merge per-page invoice dicts (in page order) into one invoice dict"""
+    pages = [page for page in pages if page]
+    if not pages:
+        return None
+    merged = {}
+    # Header fields: first page that has a non-empty value wins, field by field
+    for key in ('invoice_number', 'issue_date'):
+        merged[key] = next((page[key] for page in pages if page.get(key)), pages[0].get(key))
+    for party in ('seller', 'client'):
+        fields = {}
+        for page in pages:
+            for field, value in (page.get(party) or {}).items():
+                if value and not fields.get(field):
+                    fields[field] = value
+        merged[party] = fields
+
+    merged['items'] = [item for page in pages for item in page.get('items') or []]
+
+    # Prefer a printed summary (usually on the last page) that agrees with the merged items
+    computed = _summary_from_items(merged['items'])
+    computed_cents = parse_cents(computed['total_gross_worth'])
+    printed = [
+        page['summary'] for page in pages
+        if parse_cents((page.get('summary') or {}).get('total_gross_worth'))
+    ]
+    matching = [
+        summary for summary in printed if _agrees(parse_cents(summary['total_gross_worth']), computed_cents)
+    ]
+    if matching:
+        merged['summary'] = matching[-1]
+    elif printed:
+        merged['summary'] = printed[-1]
+    else:
+        merged['summary'] = computed
+    return merged
@@ -0,0 +1,290 @@
+"""
+Export processed invoices as normalized columnar tables.
+
+The nested Invoice JSON is flattened into three tables linked by invoice_id:
+
+- invoices:    one row per invoice (header, seller, client and totals)
+- line_items:  one row per Item
+- vat_summary: one row per VatSummaryEntry
+
+Values come from each invoice's normalized form (see normalize.py): amounts
+and VAT rates are numeric and issue dates are real dates, whatever format
+the invoice printed them in.
+
+Tables are written as Parquet or Arrow IPC files (requires pyarrow) in
+chunks, so memory use stays flat however many invoices are exported. CSV is
+used when pyarrow is not installed.
+
+Usage:
+    python export_invoices.py --output exports/
+    python export_invoices.py --from-jsonl results.jsonl --output exports/ --format csv
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+# Loads .env before the modules below read their settings from the environment
+import config  # noqa: F401
+from invoice_store import get_default_store
+from normalize import ensure_normalized, cents_to_float
+
+# Rows buffered per table before a chunk is written
+CHUNK_SIZE = 10_000
+
+FORMATS = ('parquet', 'arrow', 'csv')
+
+TABLES = {
+    'invoices': [
+        ('invoice_id', 'string'),
+        ('invoice_number', 'string'),
+        ('issue_date', 'date32'),
+        ('seller_name', 'string'),
+        ('seller_address', 'string'),
+        ('seller_tax_id', 'string'),
+        ('seller_iban', 'string'),
+        ('client_name', 'string'),
+        ('client_address', 'string'),
+        ('client_tax_id', 'string'),
+        ('total_net_worth', 'float64'),
+        ('total_vat', 'float64'),
+        ('total_gross_worth', 'float64'),
+        ('status', 'string'),
+        ('duplicate_of', 'string'),
+        ('filename', 'string'),
+        ('processed_at', 'string'),
+    ],
+    'line_items': [
+        ('invoice_id', 'string'),
+        ('item_number', 'string'),
+        ('description', 'string'),
+        ('quantity', 'float64'),
+        ('unit_of_measure', 'string'),
+        ('net_price', 'float64'),
+        ('net_worth', 'float64'),
+        ('vat_percentage', 'string'),
+        ('vat_rate', 'float64'),
+        ('gross_worth', 'float64'),
+    ],
+    'vat_summary': [
+        ('invoice_id', 'string'),
+        ('vat_percentage', 'string'),
+        ('vat_rate', 'float64'),
+        ('net_worth', 'float64'),
+        ('vat', 'float64'),
+        ('gross_worth', 'float64'),
+    ],
+}
+
+
+def is_arrow_available():
+    """Return True if pyarrow is installed"""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _rate(rate):
+    return float(rate) if rate is not None else None
+
+
+def flatten_invoice(invoice_id, data, summary=None):
+    """Return (header row, line item rows, VAT summary rows) for one invoice, raw or normalized"""
+    data = ensure_normalized(data)
+    summary = summary or {}
+    seller = data['seller']
+    client = data['client']
+    header = {
+        'invoice_id': invoice_id,
+        'invoice_number': data['invoice_number'],
+        'issue_date': data['issue_date'],
+        'seller_name': seller['name'],
+        'seller_address': seller['address'],
+        'seller_tax_id': seller['tax_id'],
+        'seller_iban': seller['iban'],
+        'client_name': client['name'],
+        'client_address': client['address'],
+        'client_tax_id': client['tax_id'],
+        'total_net_worth': cents_to_float(data['total_net_worth']),
+        'total_vat': cents_to_float(data['total_vat']),
+        'total_gross_worth': cents_to_float(data['total_gross_worth']),
+        'status': summary.get('status'),
+        'duplicate_of': summary.get('duplicate_of'),
+        'filename': summary.get('filename'),
+        'processed_at': summary.get('processed_at'),
+    }
+    items = [
+        {
+            'invoice_id': invoice_id,
+            'item_number': item['item_number'],
+            'description': item['description'],
+            'quantity': item['quantity'],
+            'unit_of_measure': item['unit_of_measure'],
+            'net_price': cents_to_float(item['net_price']),
+            'net_worth': cents_to_float(item['net_worth']),
+            'vat_percentage': item['vat_label'] or None,
+            'vat_rate': _rate(item['vat_rate']),
+            'gross_worth': cents_to_float(item['gross_worth']),
+        }
+        for item in data['items']
+    ]
+    vat = [
+        {
+            'invoice_id': invoice_id,
+            'vat_percentage': entry['vat_label'] or None,
+            'vat_rate': _rate(entry['vat_rate']),
+            'net_worth': cents_to_float(entry['net_worth']),
+            'vat': cents_to_float(entry['vat']),
+            'gross_worth': cents_to_float(entry['gross_worth']),
+        }
+        for entry in data['vat_summary']
+    ]
+    return header, items, vat
+
+
+class CsvTableWriter:
+    """Write rows of one table to a CSV file"""
+
+    extension = 'csv'
+
+    def __init__(self, path, columns):
+        self.path = path
+        self._file = open(path, 'w', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=[name for name, _ in columns])
+        self._writer.writeheader()
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._file.close()
+
+
+class ArrowTableWriter:
+    """Write rows of one table to a Parquet or Arrow IPC file, one chunk per call"""
+
+    def __init__(self, path, columns, output_format='parquet'):
+        import pyarrow as pa
+        self._pa = pa
+        self.path = path
+        self._schema = pa.schema([(name, getattr(pa, kind)()) for name, kind in columns])
+        if output_format == 'parquet':
+            import pyarrow.parquet as pq
+            self._writer = pq.ParquetWriter(path, self._schema)
+        else:
+            self._writer = pa.ipc.new_file(path, self._schema)
+
+    def write(self, rows):
+        self._writer.write_table(self._pa.Table.from_pylist(rows, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+class InvoiceExporter:
+    """Flatten invoices into the normalized tables and stream them to disk"""
+
+    def __init__(self, directory, output_format='parquet', chunk_size=CHUNK_SIZE):
+        if output_format not in FORMATS:
+            raise ValueError(f"Unknown export format {output_format!r}")
+        if output_format != 'csv' and not is_arrow_available():
+            raise RuntimeError(f"{output_format} export requires pyarrow: pip install pyarrow")
+        os.makedirs(directory, exist_ok=True)
+        self.chunk_size = chunk_size
+        self.counts = {table: 0 for table in TABLES}
+        self._buffers = {table: [] for table in TABLES}
+        self._writers = {}
+        for table, columns in TABLES.items():
+            path = os.path.join(directory, f"{table}.{output_format}")
+            if output_format == 'csv':
+                self._writers[table] = CsvTableWriter(path, columns)
+            else:
+                self._writers[table] = ArrowTableWriter(path, columns, output_format)
+
+    @property
+    def paths(self):
+        return {table: writer.path for table, writer in self._writers.items()}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, invoice_id, data, summary=None):
+        """Add one invoice to the export"""
+        header, items, vat = flatten_invoice(invoice_id, data, summary)
+        for table, rows in (('invoices', [header]), ('line_items', items), ('vat_summary', vat)):
+            buffer = self._buffers[table]
+            buffer.extend(rows)
+            self.counts[table] += len(rows)
+            if len(buffer) >= self.chunk_size:
+                self._flush(table)
+
+    def _flush(self, table):
+        if self._buffers[table]:
+            self._writers[table].write(self._buffers[table])
+            self._buffers[table] = []
+
+    def close(self):
+        for table, writer in self._writers.items():
+            self._flush(table)
+            writer.close()
+
+
+def export_store(directory, output_format='parquet', store=None, chunk_size=CHUNK_SIZE):
+    """Export every invoice in the invoice store; returns {table: (path, rows)}"""
+    store = store or get_default_store()
+    with InvoiceExporter(directory, output_format, chunk_size) as exporter:
+        for summary, data in store.iter_invoices(normalized=True):
+            exporter.add(summary['id'], data, summary)
+    return {table: (path, exporter.counts[table]) for table, path in exporter.paths.items()}
+
+
+def export_jsonl(source, directory, output_format='parquet', chunk_size=CHUNK_SIZE):
+    """Export a bulk_extract.py JSONL results file; returns {table: (path, rows)}"""
+    with InvoiceExporter(directory, output_format, chunk_size) as exporter, open(source) as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            exporter.add(record.get('source') or str(line_number), record['data'], {
+                'status': record.get('status'),
+                'filename': record.get('source'),
+                'processed_at': record.get('extracted_at'),
+            })
+    return {table: (path, exporter.counts[table]) for table, path in exporter.paths.items()}
+
+
+def main():
+    """Parse arguments and run the export."""
+    parser = argparse.ArgumentParser(description="Export processed invoices as normalized columnar tables.")
+    parser.add_argument("--output", "-o", default="exports", help="Directory to write the tables to")
+    parser.add_argument("--format", choices=FORMATS, default="parquet", dest="output_format")
+    parser.add_argument("--from-jsonl", help="Export a bulk_extract.py JSONL file instead of the invoice store")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows per written chunk")
+    args = parser.parse_args()
+
+    output_format = args.output_format
+    if output_format != 'csv' and not is_arrow_available():
+        print(f"⚠️  pyarrow is not installed; writing CSV instead of {output_format}")
+        output_format = 'csv'
+
+    try:
+        if args.from_jsonl:
+            tables = export_jsonl(args.from_jsonl, args.output, output_format, args.chunk_size)
+        else:
+            tables = export_store(args.output, output_format, chunk_size=args.chunk_size)
+    except Exception as e:
+        print(f"❌ Export failed: {e}")
+        sys.exit(1)
+
+    for table, (path, rows) in tables.items():
+        print(f"💾 {table}: {rows} rows -> {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+UI-independent extraction helpers shared by the Streamlit app and scripts.
+
+Nothing in here touches Streamlit, so these functions are safe to call from
+worker threads and command line tools.
+"""
+
+import time
+from collections import deque, namedtuple
+from documents import iter_pages, merge_pages, should_split
+from result_cache import get_default_cache
+from job_queue import JobQueue
+from resilient_client import ResilientAgent
+from preprocess import preprocess_for_upload
+import telemetry
+
+DEFAULT_MAX_WORKERS = 8
+
+# Lifecycle events yielded by extract_events()
+QUEUED = 'queued'      # accepted into the batch and waiting for an upload slot
+STARTED = 'started'    # uploaded and running on LlamaCloud
+FINISHED = 'finished'  # done; data or error is set
+
+# index is the file's position in the batch, which tells apart files with the same name
+ExtractionEvent = namedtuple('ExtractionEvent', ['kind', 'name', 'data', 'error', 'index'])
+
+
+def _preparer(preprocess):
+    """Return a JobQueue prepare hook for the given PreprocessOptions, if any"""
+    if preprocess is None:
+        return None
+    return lambda file_bytes, filename: preprocess_for_upload(file_bytes, filename, preprocess)
+
+
+def _record_outcome(data, error, elapsed=None):
+    """Update the extraction success/failure counters and end-to-end latency"""
+    if elapsed is not None:
+        telemetry.record('extraction', elapsed)
+    if data:
+        telemetry.increment('extractions_succeeded')
+    else:
+        telemetry.increment('extractions_failed')
+        if error is not None:
+            telemetry.record_error('extraction', error)
+
+
+def extract_bytes(agent, file_bytes, filename=None, use_cache=True, preprocess=None):
+    """Extract invoice data from raw file bytes, returning the data dict or None.
+
+    Pass PreprocessOptions as preprocess to shrink the image before upload.
+    Results are cached by the original bytes, so a cache hit skips
+    preprocessing as well. Raises CircuitOpenError straight away while
+    LlamaCloud is degraded. Long PDFs and TIFFs are extracted page by page
+    in parallel and merged.
+    """
+    if should_split(file_bytes, filename):
+        results = extract_batch(
+            agent, [(filename, file_bytes)], use_cache=use_cache, preprocess=preprocess, wait_if_open=False
+        )
+        _, data, error = next(results)
+        if error is not None:
+            raise error
+        return data
+
+    cache = get_default_cache()
+    cache_key = cache.make_key(file_bytes, agent.name)
+    if use_cache:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            _record_outcome(cached, None)
+            return cached
+
+    # Submit the job and poll it with adaptive backoff until it finishes
+    start = time.perf_counter()
+    with JobQueue(ResilientAgent(agent), max_workers=1, prepare=_preparer(preprocess)) as queue:
+        queue.submit(filename or "upload", file_bytes)
+        result = queue.wait()[0]
+    _record_outcome(result.data, result.error, time.perf_counter() - start)
+
+    if result.error is not None:
+        raise result.error
+    if not result.data:
+        return None
+    cache.put(cache_key, result.data)
+    return result.data
+
+
+def _read_source(source):
+    """Return the bytes of an in-memory upload or a file path"""
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    with open(source, 'rb') as f:
+        return f.read()
+
+
+class _Document:
+    """A multi-page document being extracted page by page"""
+    __slots__ = ('name', 'index', 'cache_key', 'pages', 'split', 'submitted', 'finished', 'results', 'error', 'started',
+                 'announced')
+
+    def __init__(self, name, index, cache_key, file_bytes):
+        self.name = name
+        self.index = index
+        self.cache_key = cache_key
+        self.pages = iter_pages(file_bytes, name)
+        self.split = False  # every page has been submitted
+        self.submitted = 0
+        self.finished = 0
+        self.results = {}
+        self.error = None
+        self.started = time.perf_counter()
+        self.announced = False  # a STARTED event has been emitted for the document
+
+    def next_page(self):
+        """Return the next (filename, bytes) page to submit, or None when splitting is over"""
+        if self.error is None:
+            try:
+                page = next(self.pages, None)
+            except Exception as e:
+                self.error = e
+                page = None
+            if page is not None:
+                self.submitted += 1
+                return page
+        self.split = True
+        return None
+
+    def done(self):
+        return self.split and self.finished == self.submitted
+
+    def outcome(self):
+        """Record and return (name, data, error) for the finished document"""
+        elapsed = time.perf_counter() - self.started
+        if self.error is not None:
+            _record_outcome(None, self.error, elapsed)
+            return self.name, None, self.error
+        data = merge_pages([self.results[number] for number in sorted(self.results)])
+        _record_outcome(data, None, elapsed)
+        return self.name, data, None
+
+
+def extract_batch(agent, files, max_workers=DEFAULT_MAX_WORKERS, use_cache=True, preprocess=None,
+                  wait_if_open=True):
+    """Extract many (name, bytes-or-path) pairs concurrently.
+
+    Yields (name, data, error) tuples in completion order, so callers can show
+    progress and keep partial results while the rest of the batch runs.
+    At most max_workers jobs are in flight, and files are pulled from the
+    iterable lazily, so arbitrarily large batches run in bounded memory.
+    Long PDFs and TIFFs are split and their pages submitted as separate jobs,
+    one page at a time as capacity frees up, then merged into one invoice.
+    While LlamaCloud is degraded, uploads wait for the circuit breaker to
+    close instead of failing the rest of the batch.
+    """
+    events = extract_events(agent, files, max_workers, use_cache, preprocess, wait_if_open)
+    for event in events:
+        if event.kind == FINISHED:
+            yield event.name, event.data, event.error
+
+
+def extract_events(agent, files, max_workers=DEFAULT_MAX_WORKERS, use_cache=True, preprocess=None,
+                   wait_if_open=True):
+    """Extract files like extract_batch(), yielding an ExtractionEvent at each step.
+
+    Every file gets a QUEUED event when it is taken from the iterable, a
+    STARTED event once it is running on LlamaCloud (skipped for cache hits
+    and unreadable files) and a FINISHED event carrying its data or error.
+    Callers can render finished invoices while the rest are still running.
+    """
+    cache = get_default_cache()
+    files = enumerate(files)
+    exhausted = False
+    splitting = deque()  # documents with pages still to submit
+    started = deque()    # (name, context) of jobs that reached LlamaCloud since the last poll
+
+    resilient = ResilientAgent(agent, wait_if_open=wait_if_open)
+    with JobQueue(resilient, max_workers=max_workers, prepare=_preparer(preprocess),
+                  on_started=lambda name, context, job_id: started.append((name, context))) as queue:
+        while True:
+            # Keep the queue topped up; cache hits are answered immediately
+            while queue.in_flight() < max_workers:
+                if splitting:
+                    document = splitting[0]
+                    page = document.next_page()
+                    if page is not None:
+                        queue.submit(page[0], page[1], context=(document, document.submitted, document.index))
+                        continue
+                    splitting.popleft()
+                    if document.done():
+                        yield ExtractionEvent(FINISHED, *document.outcome(), document.index)
+                    continue
+                if exhausted:
+                    break
+                item = next(files, None)
+                if item is None:
+                    exhausted = True
+                    break
+                index, (name, source) = item
+                yield ExtractionEvent(QUEUED, name, None, None, index)
+                try:
+                    file_bytes = _read_source(source)
+                except OSError as e:
+                    _record_outcome(None, e)
+                    yield ExtractionEvent(FINISHED, name, None, e, index)
+                    continue
+                cache_key = cache.make_key(file_bytes, agent.name)
+                cached = cache.get(cache_key) if use_cache else None
+                if cached is not None:
+                    _record_outcome(cached, None)
+                    yield ExtractionEvent(FINISHED, name, cached, None, index)
+                    continue
+                if should_split(file_bytes, name):
+                    splitting.append(_Document(name, index, cache_key, file_bytes))
+                else:
+                    queue.submit(name, file_bytes, context=(None, cache_key, index))
+
+            if exhausted and not splitting and not queue.in_flight():
+                break
+
+            results = queue.poll()
+            while started:
+                # A split document counts as started with its first page
+                name, (document, _, index) = started.popleft()
+                if document is None:
+                    yield ExtractionEvent(STARTED, name, None, None, index)
+                elif not document.announced:
+                    document.announced = True
+                    yield ExtractionEvent(STARTED, document.name, None, None, index)
+
+            for result in results:
+                document, key, index = result.context
+                if document is None:
+                    _record_outcome(result.data, result.error, result.elapsed)
+                    if result.data:
+                        cache.put(key, result.data)
+                        yield ExtractionEvent(FINISHED, result.name, result.data, None, index)
+                    else:
+                        yield ExtractionEvent(FINISHED, result.name, None, result.error, index)
+                    continue
+
+                # One page of a split document; stop submitting its pages after a failure
+                document.finished += 1
+                if result.data:
+                    document.results[key] = result.data
+                elif document.error is None:
+                    document.error = result.error or ValueError(f"No data returned for {result.name}")
+                if document.done():
+                    name, data, error = document.outcome()
+                    if data:
+                        cache.put(document.cache_key, data)
+                    yield ExtractionEvent(FINISHED, name, data, error, index)
+
+            if not results and queue.in_flight():
+                time.sleep(queue.next_due())
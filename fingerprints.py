@@ -0,0 +1,23 @@
+"""
+Stable content hashes shared by the caches.
+
+Extraction results depend on three things: the uploaded bytes, the schema the
+agent extracts into and the agent itself. Hashing them the same way everywhere
+keeps cache keys comparable between the Streamlit app and the scripts.
+"""
+
+import hashlib
+import json
+from sample_data.sample_schema import Invoice
+
+
+def content_hash(data):
+    """Return the SHA-256 hex digest of raw bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def schema_fingerprint(model=Invoice):
+    """Return a short, stable fingerprint of a Pydantic model or a JSON schema dict"""
+    schema = model if isinstance(model, dict) else model.model_json_schema()
+    schema = json.dumps(schema, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(schema.encode("utf-8")).hexdigest()[:16]
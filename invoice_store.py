@@ -0,0 +1,374 @@
+"""
+Durable store for processed invoices.
+
+Invoices are written once to a local SQLite database (WAL mode, so readers in
+other sessions never block the writer) and shared by every browser session
+and across app restarts. Summary columns live in an indexed table of their
+own; the full extracted JSON is kept in a separate payload table and only
+read when a single invoice's details are requested. Next to each payload
+the store keeps its normalized form (see normalize.py), parsed once when the
+invoice is added; the summary columns are derived from it.
+
+Cross-invoice aggregates (see analytics.py) and the full-text search index
+(see search_index.py) are kept in the same database and updated in the same
+transaction as each insert.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+import analytics
+import normalize
+import search_index
+from fingerprints import content_hash
+
+DEFAULT_PATH = os.getenv("INVOICE_STORE_PATH", ".cache/invoices.sqlite3")
+
+SUMMARY_COLUMNS = (
+    'id', 'invoice_number', 'vendor', 'issue_date', 'amount', 'status', 'processed_at', 'filename', 'duplicate_of'
+)
+
+# Columns the summary table may be sorted by (all indexed)
+SORTABLE_COLUMNS = ('processed_at', 'issue_date', 'amount', 'vendor', 'invoice_number')
+
+
+# Payloads normalized per step when backfilling a store created before normalization
+BACKFILL_BATCH_SIZE = 5000
+
+# Parsed payloads kept in memory, shared by every session
+PAYLOAD_POOL_SIZE = int(os.getenv("INVOICE_PAYLOAD_POOL_SIZE", "256"))
+
+
+class InvoiceSummary:
+    """Compact summary row; supports row['column'] and row.get() like the dicts it replaces"""
+
+    __slots__ = SUMMARY_COLUMNS
+
+    def __init__(self, **values):
+        for column in SUMMARY_COLUMNS:
+            setattr(self, column, values.get(column))
+
+    @classmethod
+    def from_row(cls, row):
+        summary = cls.__new__(cls)
+        for column in SUMMARY_COLUMNS:
+            setattr(summary, column, row[column])
+        return summary
+
+    def __getitem__(self, column):
+        if column not in SUMMARY_COLUMNS:
+            raise KeyError(column)
+        return getattr(self, column)
+
+    def get(self, column, default=None):
+        return getattr(self, column, default) if column in SUMMARY_COLUMNS else default
+
+    def as_dict(self):
+        return {column: getattr(self, column) for column in SUMMARY_COLUMNS}
+
+    def __eq__(self, other):
+        return isinstance(other, InvoiceSummary) and self.as_dict() == other.as_dict()
+
+    def __repr__(self):
+        return f"InvoiceSummary({self.as_dict()!r})"
+
+
+def payload_hash(invoice_data):
+    """Return the content hash identifying an extracted payload"""
+    return content_hash(json.dumps(invoice_data, sort_keys=True, separators=(",", ":")).encode("utf-8"))
+
+
+class PayloadPool:
+    """Thread-safe LRU of (invoice data, normalized) pairs by payload hash.
+
+    Pooled payloads are shared between callers and must not be mutated.
+    """
+
+    def __init__(self, max_entries=PAYLOAD_POOL_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def intern(self, key, invoice_data, normalized):
+        """Return the pooled pair for key, adding this one if there is none"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = (invoice_data, normalized)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            else:
+                self._entries.move_to_end(key)
+            return entry
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class InvoiceStore:
+    """SQLite-backed invoice store with indexed summary rows"""
+
+    def __init__(self, path=DEFAULT_PATH, pool_size=PAYLOAD_POOL_SIZE):
+        self.path = path
+        self.payloads = PayloadPool(pool_size)
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._init_db()
+
+    def _conn(self):
+        # One connection per thread; sqlite3 connections are not thread-safe
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        with self._conn() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS invoices (
+                    id TEXT PRIMARY KEY,
+                    invoice_number TEXT,
+                    vendor TEXT,
+                    issue_date TEXT,
+                    amount REAL,
+                    status TEXT NOT NULL,
+                    processed_at TEXT NOT NULL,
+                    filename TEXT,
+                    duplicate_of TEXT
+                );
+                CREATE TABLE IF NOT EXISTS invoice_payloads (
+                    id TEXT PRIMARY KEY REFERENCES invoices (id) ON DELETE CASCADE,
+                    data TEXT NOT NULL,
+                    normalized TEXT,
+                    payload_hash TEXT
+                );
+                CREATE INDEX IF NOT EXISTS invoices_number ON invoices (invoice_number);
+                CREATE INDEX IF NOT EXISTS invoices_vendor ON invoices (vendor);
+                CREATE INDEX IF NOT EXISTS invoices_issue_date ON invoices (issue_date);
+                CREATE INDEX IF NOT EXISTS invoices_amount ON invoices (amount);
+                CREATE INDEX IF NOT EXISTS invoices_processed_at ON invoices (processed_at);
+            """)
+            # Stores created before duplicate detection lack the column
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(invoices)")}
+            if 'duplicate_of' not in columns:
+                conn.execute("ALTER TABLE invoices ADD COLUMN duplicate_of TEXT")
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(invoice_payloads)")}
+            added = [column for column in ('normalized', 'payload_hash') if column not in columns]
+            for column in added:
+                conn.execute(f"ALTER TABLE invoice_payloads ADD COLUMN {column} TEXT")
+            # Checked on every open, so a backfill that was interrupted is finished later
+            pending = conn.execute(
+                "SELECT 1 FROM invoice_payloads WHERE normalized IS NULL OR payload_hash IS NULL LIMIT 1"
+            ).fetchone()
+            if pending is not None:
+                self._backfill_payloads(conn)
+            analytics.ensure_schema(conn)
+            search_index.ensure_schema(conn)
+
+    @staticmethod
+    def _backfill_payloads(conn):
+        """Normalize and hash payloads stored before those columns existed"""
+        while True:
+            rows = conn.execute(
+                "SELECT id, data FROM invoice_payloads WHERE normalized IS NULL OR payload_hash IS NULL LIMIT ?",
+                (BACKFILL_BATCH_SIZE,)
+            ).fetchall()
+            if not rows:
+                return
+            updates = []
+            for row in rows:
+                data = json.loads(row['data'])
+                updates.append((normalize.dumps(normalize.normalize_invoice(data)), payload_hash(data), row['id']))
+            conn.executemany("UPDATE invoice_payloads SET normalized = ?, payload_hash = ? WHERE id = ?", updates)
+
+    def add_invoice(self, invoice_data, filename, status='Completed', duplicate_of=None, normalized=None):
+        """Store an extracted invoice and its normalized form, returning its summary row"""
+        if normalized is None:
+            normalized = normalize.normalize_invoice(invoice_data)
+        issue_date = normalized['issue_date']
+        record = InvoiceSummary(
+            id=str(uuid.uuid4())[:8],
+            invoice_number=normalized['invoice_number'],
+            vendor=normalized['seller']['name'],
+            issue_date=issue_date.isoformat() if issue_date is not None else None,
+            amount=normalize.cents_to_float(normalized['total_gross_worth']),
+            status=status,
+            processed_at=datetime.now().isoformat(timespec='seconds'),
+            filename=filename,
+            duplicate_of=duplicate_of,
+        )
+        key = payload_hash(invoice_data)
+        with self._conn() as conn:
+            cursor = conn.execute(
+                f"INSERT INTO invoices ({', '.join(SUMMARY_COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in SUMMARY_COLUMNS)})",
+                [record[column] for column in SUMMARY_COLUMNS]
+            )
+            conn.execute(
+                "INSERT INTO invoice_payloads (id, data, normalized, payload_hash) VALUES (?, ?, ?, ?)",
+                (record.id, json.dumps(invoice_data, separators=(",", ":")), normalize.dumps(normalized), key)
+            )
+            analytics.apply(conn, [(record, normalized)])
+            search_index.apply(conn, cursor.lastrowid, normalized)
+        self.payloads.intern(key, invoice_data, normalized)
+        return record
+
+    def list_summaries(self, limit=None, offset=0):
+        """Return summary rows, newest first, without the invoice payloads"""
+        query = f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM invoices ORDER BY processed_at DESC, rowid DESC"
+        params = []
+        if limit is not None:
+            query += " LIMIT ? OFFSET ?"
+            params = [limit, offset]
+        return [InvoiceSummary.from_row(row) for row in self._conn().execute(query, params)]
+
+    @staticmethod
+    def _where(vendor=None, date_from=None, date_to=None, min_amount=None, max_amount=None):
+        """Build the WHERE clause and parameters for the summary filters"""
+        clauses, params = [], []
+        if vendor:
+            clauses.append("vendor = ?")
+            params.append(vendor)
+        if date_from:
+            clauses.append("issue_date >= ?")
+            params.append(date_from)
+        if date_to:
+            clauses.append("issue_date <= ?")
+            params.append(date_to)
+        if min_amount is not None:
+            clauses.append("amount >= ?")
+            params.append(min_amount)
+        if max_amount is not None:
+            clauses.append("amount <= ?")
+            params.append(max_amount)
+        return (f" WHERE {' AND '.join(clauses)}" if clauses else ""), params
+
+    def count_summaries(self, **filters):
+        """Count the summary rows matching the given filters"""
+        where, params = self._where(**filters)
+        return self._conn().execute(f"SELECT COUNT(*) FROM invoices{where}", params).fetchone()[0]
+
+    def query_summaries(self, sort_by='processed_at', descending=True, limit=50, offset=0, **filters):
+        """Return one page of filtered, sorted summary rows.
+
+        Filtering, sorting and paging all happen in SQLite, so only the rows
+        on the requested page are materialized.
+        """
+        if sort_by not in SORTABLE_COLUMNS:
+            raise ValueError(f"Cannot sort by {sort_by!r}")
+        where, params = self._where(**filters)
+        direction = "DESC" if descending else "ASC"
+        rows = self._conn().execute(
+            f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM invoices{where} "
+            f"ORDER BY {sort_by} {direction}, rowid {direction} LIMIT ? OFFSET ?",
+            params + [limit, offset]
+        )
+        return [InvoiceSummary.from_row(row) for row in rows]
+
+    def list_vendors(self):
+        """Return the distinct vendor names, for filter dropdowns"""
+        rows = self._conn().execute(
+            "SELECT DISTINCT vendor FROM invoices WHERE vendor IS NOT NULL ORDER BY vendor"
+        )
+        return [row[0] for row in rows]
+
+    def query(self, sql, params=()):
+        """Run a read-only query and return the rows as dicts"""
+        return [dict(row) for row in self._conn().execute(sql, params)]
+
+    def get_payload(self, invoice_id):
+        """Return (extracted JSON, normalized form) for one invoice, or (None, None).
+
+        The pair comes from the shared payload pool when it is there, so the
+        result must not be mutated.
+        """
+        conn = self._conn()
+        row = conn.execute("SELECT payload_hash FROM invoice_payloads WHERE id = ?", (invoice_id,)).fetchone()
+        if row is None:
+            return None, None
+        pooled = self.payloads.get(row['payload_hash']) if row['payload_hash'] is not None else None
+        if pooled is not None:
+            return pooled
+        row = conn.execute(
+            "SELECT data, normalized, payload_hash FROM invoice_payloads WHERE id = ?", (invoice_id,)
+        ).fetchone()
+        data = json.loads(row['data'])
+        normalized = normalize.loads(row['normalized'])
+        if normalized is None:
+            normalized = normalize.normalize_invoice(data)
+        return self.payloads.intern(row['payload_hash'] or payload_hash(data), data, normalized)
+
+    def get_invoice_data(self, invoice_id):
+        """Return the full extracted JSON for one invoice, or None"""
+        return self.get_payload(invoice_id)[0]
+
+    def get_normalized(self, invoice_id):
+        """Return the normalized form of one invoice, or None"""
+        return self.get_payload(invoice_id)[1]
+
+    def get_summary(self, invoice_id):
+        """Return the summary row for one invoice, or None"""
+        row = self._conn().execute(
+            f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM invoices WHERE id = ?", (invoice_id,)
+        ).fetchone()
+        return InvoiceSummary.from_row(row) if row is not None else None
+
+    def iter_invoices(self, batch_size=500, normalized=False):
+        """Yield (summary row, invoice data) for every stored invoice, oldest first.
+
+        With normalized=True the normalized form is yielded instead of the raw
+        extracted JSON. Rows are fetched in batches by rowid, so exporting a
+        large store never holds more than one batch of payloads in memory.
+        """
+        columns = ', '.join(f"i.{column}" for column in SUMMARY_COLUMNS)
+        payload, load = ('p.normalized', normalize.loads) if normalized else ('p.data', json.loads)
+        last = 0
+        while True:
+            rows = self._conn().execute(
+                f"SELECT i.rowid AS row_number, {columns}, {payload} AS data FROM invoices i "
+                f"JOIN invoice_payloads p ON p.id = i.id WHERE i.rowid > ? ORDER BY i.rowid LIMIT ?",
+                (last, batch_size)
+            ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield InvoiceSummary.from_row(row), load(row['data'])
+            last = rows[-1]['row_number']
+
+    def count(self, since=None):
+        """Count stored invoices, optionally only those processed since an ISO date"""
+        if since is None:
+            return self._conn().execute("SELECT COUNT(*) FROM invoices").fetchone()[0]
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM invoices WHERE processed_at >= ?", (since,)
+        ).fetchone()[0]
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+
+def get_default_store():
+    """Return the process-wide invoice store"""
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = InvoiceStore()
+        return _default_store
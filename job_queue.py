@@ -0,0 +1,280 @@
+"""
+Submit-and-poll pipeline for LlamaExtract jobs.
+
+agent.extract() blocks until a job is done and only notices completion on its
+fixed check interval. JobQueue instead queues jobs on LlamaCloud, keeps their
+IDs, and polls every in-flight job together: each job is checked quickly at
+first and then less often the longer it runs, so short jobs are picked up
+almost immediately while long ones do not flood the API with status calls.
+
+Finished jobs are handed back from wait()/results(), from the async iterator
+aresults(), or to an on_result callback. An on_started callback hears about
+each job as soon as its upload is done and it is running on LlamaCloud. An optional prepare callable runs on
+the upload threads to transform (bytes, filename) before each upload.
+"""
+
+import asyncio
+import inspect
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from uploads import extract_input
+import telemetry
+
+MIN_POLL_INTERVAL = 0.5
+MAX_POLL_INTERVAL = 5.0
+POLL_BACKOFF = 1.5
+
+# Consecutive failed status checks tolerated before a job is given up on
+MAX_CHECK_ERRORS = 3
+
+SUCCESS_STATUSES = ("SUCCESS", "PARTIAL_SUCCESS")
+FAILURE_STATUSES = ("ERROR", "CANCELLED")
+
+JobResult = namedtuple('JobResult', ['name', 'data', 'error', 'context', 'job_id', 'elapsed'])
+
+
+class ExtractionJobError(Exception):
+    """Raised when LlamaCloud reports a job as failed or cancelled"""
+
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def _run(value):
+    """Resolve an SDK call that may return either a value or an awaitable.
+
+    Awaitables run on one long-lived background event loop, so the SDK's
+    async HTTP client keeps its connections instead of being tied to a
+    short-lived loop per call.
+    """
+    global _loop
+    if not inspect.isawaitable(value):
+        return value
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="extract-loop", daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(value, _loop).result()
+
+
+def _get_job(agent, job_id):
+    """Fetch a job's status through the agent's async client on the shared loop.
+
+    The SDK's synchronous helpers swap the client's HTTP transport for the
+    duration of each call, which is not safe from several threads at once.
+    """
+    client = getattr(agent, '_client', None)
+    if client is not None:
+        return _run(client.llama_extract.get_job(job_id=job_id))
+    return agent.get_extraction_job(job_id)
+
+
+def _can_upload(agent):
+    """Return True if the agent can upload a file and start its job as separate calls"""
+    return getattr(agent, '_client', None) is not None and hasattr(agent, '_upload_file')
+
+
+def _upload(agent, file_input):
+    """Upload a file through the agent's SDK client, returning the uploaded File"""
+    return _run(agent._upload_file(file_input))
+
+
+def _create_job(agent, uploaded):
+    """Start an extraction job for a file uploaded with _upload (what queue_extraction does after uploading)"""
+    from llama_cloud import ExtractJobCreate
+    request = ExtractJobCreate(
+        extraction_agent_id=agent.id,
+        file_id=uploaded.id,
+        data_schema_override=agent.data_schema,
+        config_override=agent.config,
+    )
+    return _run(agent._client.llama_extract.run_job(request=request))
+
+
+def _get_run(agent, job_id):
+    """Fetch a finished job's extraction run (see _get_job)"""
+    client = getattr(agent, '_client', None)
+    if client is not None:
+        return _run(client.llama_extract.get_run_by_job_id(job_id=job_id))
+    return agent.get_extraction_run_for_job(job_id)
+
+
+def _status_name(status):
+    return str(getattr(status, 'value', status)).upper()
+
+
+class _Job:
+    __slots__ = ('name', 'context', 'upload', 'job_id', 'submitted_at', 'queued_at', 'interval',
+                 'next_check', 'check_errors')
+
+    def __init__(self, name, context):
+        self.name = name
+        self.context = context
+        self.upload = None
+        self.job_id = None
+        self.submitted_at = time.monotonic()
+        self.queued_at = None
+        self.interval = MIN_POLL_INTERVAL
+        self.next_check = 0.0
+        self.check_errors = 0
+
+
+class JobQueue:
+    """Tracks many in-flight extraction jobs and polls them with adaptive backoff"""
+
+    def __init__(self, agent, max_workers=8, min_interval=MIN_POLL_INTERVAL,
+                 max_interval=MAX_POLL_INTERVAL, backoff=POLL_BACKOFF, on_result=None, prepare=None,
+                 on_started=None):
+        self.agent = agent
+        self.prepare = prepare
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.on_result = on_result
+        self.on_started = on_started
+        self._jobs = []
+        self._lock = threading.Lock()
+        # Shared by uploads and status checks; both are short blocking HTTP calls
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="extract-job")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Stop the worker threads (in-flight jobs keep running on LlamaCloud)"""
+        self._executor.shutdown(wait=False)
+
+    def in_flight(self):
+        """Number of jobs submitted but not yet handed back"""
+        with self._lock:
+            return len(self._jobs)
+
+    def submit(self, name, file_bytes, context=None, filename=None):
+        """Queue a file for extraction without waiting for its upload"""
+        job = _Job(name, context)
+        job.interval = self.min_interval
+        job.upload = self._executor.submit(self._queue_job, job, file_bytes, filename or name)
+        with self._lock:
+            self._jobs.append(job)
+        return job
+
+    def _queue_job(self, job, file_bytes, filename):
+        # Time spent waiting for a free upload thread
+        telemetry.record('queue_wait', time.monotonic() - job.submitted_at)
+        if self.prepare is not None:
+            with telemetry.timer('preprocess'):
+                file_bytes, filename = self.prepare(file_bytes, filename)
+        with telemetry.timer('upload'):
+            with extract_input(file_bytes, filename) as file_input:
+                queued = _run(self.agent.queue_extraction(file_input))
+        job.job_id = queued.id
+        job.queued_at = time.monotonic()
+        job.next_check = job.queued_at + self.min_interval
+
+    def _check(self, job):
+        """Return (done, data, error) for a single job"""
+        try:
+            remote = _get_job(self.agent, job.job_id)
+            status = _status_name(remote.status)
+            if status in SUCCESS_STATUSES:
+                run = _get_run(self.agent, job.job_id)
+                return True, run.data, None
+            job.check_errors = 0
+            if status in FAILURE_STATUSES:
+                error = getattr(remote, 'error', None) or status.lower()
+                return True, None, ExtractionJobError(f"Job {job.job_id} failed: {error}")
+            return False, None, None
+        except Exception as e:
+            # The job itself is still running remotely; only give up on it
+            # after repeated failures to ask about it
+            job.check_errors += 1
+            if job.check_errors >= MAX_CHECK_ERRORS:
+                return True, None, e
+            return False, None, None
+
+    def poll(self):
+        """Check every job that is due and return the ones that finished"""
+        now = time.monotonic()
+        finished, due, started = [], [], []
+        with self._lock:
+            jobs = list(self._jobs)
+
+        for job in jobs:
+            if job.upload is not None:
+                if not job.upload.done():
+                    continue
+                error = job.upload.exception()
+                job.upload = None
+                if error is not None:
+                    finished.append((job, None, error))
+                    continue
+                started.append(job)
+            if job.next_check <= now:
+                due.append(job)
+
+        if self.on_started is not None:
+            for job in started:
+                self.on_started(job.name, job.context, job.job_id)
+
+        for job, (done, data, error) in zip(due, self._executor.map(self._check, due)):
+            if done:
+                finished.append((job, data, error))
+            else:
+                job.interval = min(job.interval * self.backoff, self.max_interval)
+                job.next_check = time.monotonic() + job.interval
+
+        results = []
+        with self._lock:
+            for job, data, error in finished:
+                self._jobs.remove(job)
+                if job.queued_at is not None:
+                    telemetry.record('remote_extraction', time.monotonic() - job.queued_at)
+                    if error is not None:
+                        telemetry.record_error('remote_extraction', error)
+                results.append(JobResult(
+                    job.name, data, error, job.context, job.job_id,
+                    time.monotonic() - job.submitted_at
+                ))
+        if self.on_result is not None:
+            for result in results:
+                self.on_result(result)
+        return results
+
+    def next_due(self):
+        """Seconds until the next job needs checking"""
+        now = time.monotonic()
+        with self._lock:
+            if any(job.upload is not None for job in self._jobs):
+                # Uploads finish on their own schedule; look again soon
+                return min(self.min_interval, 0.1)
+            waits = [job.next_check - now for job in self._jobs]
+        return max(0.0, min(waits)) if waits else 0.0
+
+    def wait(self):
+        """Block until at least one job finishes and return every finished job"""
+        while self.in_flight():
+            results = self.poll()
+            if results:
+                return results
+            time.sleep(self.next_due())
+        return []
+
+    def results(self):
+        """Yield JobResults in completion order until no jobs are left"""
+        while self.in_flight():
+            yield from self.wait()
+
+    async def aresults(self):
+        """Async iterator over JobResults in completion order"""
+        while self.in_flight():
+            results = await asyncio.to_thread(self.poll)
+            for result in results:
+                yield result
+            if not results:
+                await asyncio.sleep(self.next_due())
@@ -0,0 +1,196 @@
+"""
+Typed normalization of extracted invoices.
+
+LlamaExtract returns amounts, dates and VAT rates as whatever the invoice
+printed: "1,234.56", "1.234,56 EUR", "03/15/2024", " 23 %". normalize_invoice()
+parses them once, right after extraction, into compact typed values:
+
+- amounts as integer cents (exact, so they sum and compare without drift);
+- quantities as floats;
+- issue dates as datetime.date;
+- VAT rates as Decimal percentages, plus a label for exempt or unreadable
+  rates ("zw", "np").
+
+Validation, duplicate detection, the invoice store, analytics and export all
+work on the NormalizedInvoice; the raw JSON is only kept for display and
+re-processing. Formatting for display is the last step (format_cents).
+"""
+
+import json
+import re
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+# Issue date formats tried in order; the schema asks for MM/DD/YYYY
+DATE_FORMATS = ("%m/%d/%Y", "%Y-%m-%d", "%m/%d/%y", "%d.%m.%Y")
+
+AMOUNT_FIELDS = ('net_price', 'net_worth', 'gross_worth')
+VAT_AMOUNT_FIELDS = ('net_worth', 'vat', 'gross_worth')
+TOTAL_FIELDS = ('total_net_worth', 'total_vat', 'total_gross_worth')
+PARTY_FIELDS = {'seller': ('name', 'address', 'tax_id', 'iban'), 'client': ('name', 'address', 'tax_id')}
+
+_NOT_NUMERIC = re.compile(r"[^\d,.\-]")
+_CENT = Decimal("0.01")
+
+
+class NormalizedInvoice(dict):
+    """An invoice whose values have been parsed by normalize_invoice()"""
+
+
+def parse_decimal(value):
+    """Parse a printed number ("1,234.56", "1.234,56", "€ 12") into a Decimal, or None"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, Decimal)):
+        return Decimal(value)
+    if isinstance(value, float):
+        return Decimal(repr(value)) if value == value else None
+    text = _NOT_NUMERIC.sub("", str(value))
+    if not text:
+        return None
+    if ',' in text and '.' in text:
+        # Whichever separator comes last is the decimal point
+        thousands = ',' if text.rfind(',') < text.rfind('.') else '.'
+        text = text.replace(thousands, "").replace(',', '.')
+    elif ',' in text:
+        head, _, tail = text.rpartition(',')
+        # "1,234" and "1,234,567" group thousands; "12,5" and "12,50" are decimal commas
+        text = text.replace(',', "") if len(tail) == 3 and text.count(',') >= 1 and head else text.replace(',', '.')
+    elif text.count('.') > 1:
+        text = text.replace('.', "")
+    try:
+        return Decimal(text)
+    except InvalidOperation:
+        return None
+
+
+def parse_cents(value):
+    """Parse an amount into integer cents, rounding half up, or None"""
+    number = parse_decimal(value)
+    if number is None:
+        return None
+    return int((number / _CENT).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def parse_quantity(value):
+    number = parse_decimal(value)
+    return float(number) if number is not None else None
+
+
+def parse_date(value):
+    """Parse an issue date into a datetime.date, or None"""
+    if isinstance(value, date):
+        return value
+    if not value:
+        return None
+    text = str(value).strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+def rate_label(value):
+    """Normalize a printed VAT percentage like ' 23 %' or '23.00' to '23' for grouping and display"""
+    if value is None:
+        return ""
+    text = str(value).strip().rstrip('%').strip().replace(',', '.').lower()
+    try:
+        number = Decimal(text)
+    except InvalidOperation:
+        # Exempt and unreadable rates ("zw", "np") keep their printed label
+        return text
+    return format(number.normalize(), "f") if number.is_finite() else text
+
+
+def parse_rate(value):
+    """Parse a VAT percentage into a Decimal (23 for 23%), or None for exempt/unreadable rates"""
+    try:
+        return Decimal(rate_label(value))
+    except InvalidOperation:
+        return None
+
+
+def _text(value):
+    if value is None:
+        return None
+    text = str(value).strip()
+    return text or None
+
+
+def _vat(entry):
+    return {'vat_rate': parse_rate(entry.get('vat_percentage')), 'vat_label': rate_label(entry.get('vat_percentage'))}
+
+
+def normalize_invoice(data):
+    """Parse a raw extracted invoice dict into a NormalizedInvoice"""
+    data = data or {}
+    summary = data.get('summary') or {}
+    normalized = NormalizedInvoice(
+        invoice_number=_text(data.get('invoice_number')),
+        issue_date=parse_date(data.get('issue_date')),
+    )
+    for party, fields in PARTY_FIELDS.items():
+        values = data.get(party) or {}
+        normalized[party] = {field: _text(values.get(field)) for field in fields}
+    normalized['items'] = [
+        {
+            'item_number': _text(item.get('item_number')),
+            'description': _text(item.get('description')),
+            'quantity': parse_quantity(item.get('quantity')),
+            'unit_of_measure': _text(item.get('unit_of_measure')),
+            **{field: parse_cents(item.get(field)) for field in AMOUNT_FIELDS},
+            **_vat(item),
+        }
+        for item in data.get('items') or []
+    ]
+    normalized['vat_summary'] = [
+        {**{field: parse_cents(entry.get(field)) for field in VAT_AMOUNT_FIELDS}, **_vat(entry)}
+        for entry in summary.get('vat_summary') or []
+    ]
+    for field in TOTAL_FIELDS:
+        normalized[field] = parse_cents(summary.get(field))
+    return normalized
+
+
+def ensure_normalized(data):
+    """Return data as a NormalizedInvoice, parsing it only if it is still raw"""
+    return data if isinstance(data, NormalizedInvoice) else normalize_invoice(data)
+
+
+def _encode(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def dumps(normalized):
+    """Serialize a NormalizedInvoice to compact JSON (dates as ISO, rates as strings)"""
+    return json.dumps(normalized, default=_encode, separators=(",", ":"))
+
+
+def loads(text):
+    """Inverse of dumps(); None (a payload not normalized yet) loads as None"""
+    if text is None:
+        return None
+    normalized = NormalizedInvoice(json.loads(text))
+    normalized['issue_date'] = date.fromisoformat(normalized['issue_date']) if normalized['issue_date'] else None
+    for entry in normalized['items'] + normalized['vat_summary']:
+        if entry['vat_rate'] is not None:
+            entry['vat_rate'] = Decimal(entry['vat_rate'])
+        # Payloads stored before labels were canonical may still hold "23.00"
+        entry['vat_label'] = rate_label(entry['vat_label'])
+    return normalized
+
+
+def cents_to_float(cents):
+    return cents / 100 if cents is not None else None
+
+
+def format_cents(cents):
+    """Format integer cents as currency for display"""
+    return f"${cents / 100:,.2f}" if cents is not None else "N/A"
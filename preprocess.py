@@ -0,0 +1,168 @@
+"""
+Optional client-side image preprocessing before extraction.
+
+Full-resolution scans are much larger than the extraction agent needs. This
+stage downscales images to a target DPI, converts them to grayscale,
+straightens slightly rotated scans, re-encodes them compactly and splits
+multi-page TIFFs into per-page images. The CPU-heavy work runs in a process
+pool so it does not hold the GIL of the Streamlit server.
+
+Requires Pillow; without it, images are passed through unchanged.
+"""
+
+import io
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pydantic import BaseModel
+
+try:
+    from PIL import Image, ImageOps, ImageSequence
+except ImportError:
+    Image = None
+
+
+class PreprocessOptions(BaseModel):
+    """Settings for the preprocessing stage."""
+    target_dpi: int = 200
+    assumed_dpi: int = 300  # used when the image carries no DPI metadata
+    max_long_side: int = 2400
+    grayscale: bool = True
+    deskew: bool = True
+    max_skew_degrees: float = 5.0
+    output_format: str = "JPEG"
+    jpeg_quality: int = 80
+    keep_original_if_smaller: bool = True
+
+
+EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp"}
+
+# Dimension (pixels) the skew search works on; small enough to be fast
+DESKEW_SAMPLE_SIZE = 800
+DESKEW_STEP = 0.5
+
+
+def is_available():
+    """Return True if Pillow is installed"""
+    return Image is not None
+
+
+def _estimate_skew(image, max_degrees):
+    """Estimate the rotation that makes text lines horizontal.
+
+    Rotating a page so its text lines are level gives the sharpest horizontal
+    projection profile (alternating dark text rows and light gaps), so the
+    angle with the highest row-mean variance wins.
+    """
+    sample = ImageOps.invert(image.convert("L"))
+    sample.thumbnail((DESKEW_SAMPLE_SIZE, DESKEW_SAMPLE_SIZE))
+    best_angle, best_score = 0.0, -1.0
+    steps = int(max_degrees / DESKEW_STEP)
+    for step in range(-steps, steps + 1):
+        angle = step * DESKEW_STEP
+        rotated = sample.rotate(angle, resample=Image.BILINEAR, fillcolor=0)
+        rows = list(rotated.resize((1, rotated.height), Image.BOX).getdata())
+        mean = sum(rows) / len(rows)
+        score = sum((value - mean) ** 2 for value in rows)
+        if score > best_score:
+            best_angle, best_score = angle, score
+    return best_angle
+
+
+def _process_page(page, options):
+    """Apply the pipeline to a single PIL image and return the encoded bytes"""
+    page = ImageOps.exif_transpose(page)
+
+    dpi = page.info.get("dpi", (options.assumed_dpi,))[0] or options.assumed_dpi
+    scale = min(1.0, options.target_dpi / float(dpi), options.max_long_side / float(max(page.size)))
+    if scale < 1.0:
+        size = (max(1, round(page.width * scale)), max(1, round(page.height * scale)))
+        page = page.resize(size, Image.LANCZOS)
+
+    if options.grayscale:
+        page = page.convert("L")
+    elif page.mode not in ("RGB", "L"):
+        page = page.convert("RGB")
+
+    if options.deskew:
+        angle = _estimate_skew(page, options.max_skew_degrees)
+        if angle:
+            fill = 255 if page.mode == "L" else (255, 255, 255)
+            page = page.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=fill)
+
+    out = io.BytesIO()
+    save_args = {"optimize": True}
+    if options.output_format == "JPEG":
+        save_args["quality"] = options.jpeg_quality
+    page.save(out, format=options.output_format, dpi=(options.target_dpi, options.target_dpi), **save_args)
+    return out.getvalue()
+
+
+def preprocess_image(file_bytes, filename, options=None):
+    """Preprocess an image, returning a list of (filename, bytes) pages.
+
+    Multi-page TIFFs produce one entry per page. Single-page images fall back
+    to the original bytes when preprocessing would not make them smaller.
+    """
+    options = options or PreprocessOptions()
+    if Image is None:
+        return [(filename, file_bytes)]
+
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    extension = EXTENSIONS.get(options.output_format, ".img")
+    with Image.open(io.BytesIO(file_bytes)) as image:
+        page_count = getattr(image, "n_frames", 1)
+        if page_count == 1:
+            processed = _process_page(image, options)
+            if options.keep_original_if_smaller and len(processed) >= len(file_bytes):
+                return [(filename, file_bytes)]
+            return [(f"{stem}{extension}", processed)]
+
+        pages = []
+        for number, frame in enumerate(ImageSequence.Iterator(image), start=1):
+            pages.append((f"{stem}-p{number}{extension}", _process_page(frame.copy(), options)))
+        return pages
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the shared preprocessing process pool"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=max(1, (os.cpu_count() or 2) - 1))
+        return _pool
+
+
+def preprocess_in_pool(file_bytes, filename, options=None):
+    """Run preprocess_image in the process pool and wait for the result"""
+    return get_pool().submit(preprocess_image, file_bytes, filename, options).result()
+
+
+def _frame_count(file_bytes):
+    """Return the number of frames from the image headers, without decoding pixels, or None"""
+    try:
+        with Image.open(io.BytesIO(file_bytes)) as image:
+            return getattr(image, "n_frames", 1)
+    except Exception:
+        return None
+
+
+def preprocess_for_upload(file_bytes, filename, options=None):
+    """Return (bytes, filename) to upload for a single extraction.
+
+    Multi-page documents and PDFs are uploaded as-is so the agent sees every page.
+    """
+    if Image is None or os.path.splitext(filename)[1].lower() == ".pdf":
+        return file_bytes, filename
+    # Checked here, so multi-page TIFFs are not decoded in the pool only to be discarded
+    if _frame_count(file_bytes) != 1:
+        return file_bytes, filename
+    pages = preprocess_in_pool(file_bytes, filename, options)
+    if len(pages) != 1:
+        return file_bytes, filename
+    processed_name, processed = pages[0]
+    return processed, processed_name
@@ -0,0 +1,46 @@
+"""
+Post-extraction steps shared by the Streamlit app and the background worker.
+
+Every extracted invoice is normalized once, then validated, checked against
+the duplicate index and written to the invoice store the same way, whichever
+process extracted it.
+"""
+
+import dedup
+from invoice_store import get_default_store
+from normalize import normalize_invoice
+from validation import validate_batch, validate_invoice
+
+
+def store_invoice(invoice_data, filename, status=None, image_hash=None, normalized=None):
+    """Validate and store an extracted invoice, returning its summary row.
+
+    Invoices matching an earlier one by extracted data are stored with
+    duplicate_of pointing at the original. The image is only compared when
+    the extraction has no usable data key, since same-template invoices look
+    alike.
+    """
+    if normalized is None:
+        normalized = normalize_invoice(invoice_data)
+    if status is None:
+        status = validate_invoice(normalized).status
+    index = dedup.get_default_index()
+    if dedup.data_key(normalized) is not None:
+        duplicate_of = index.find_data(normalized)
+    else:
+        duplicate_of = (index.find_image(image_hash) or (None,))[0]
+    record = get_default_store().add_invoice(
+        invoice_data, filename, status=status, duplicate_of=duplicate_of, normalized=normalized
+    )
+    index.add(record['id'], image_hash, normalized)
+    return record
+
+
+def store_invoices(results):
+    """Validate (invoice_data, filename, image_hash) tuples in one vectorized pass and store them"""
+    normalized = [normalize_invoice(invoice_data) for invoice_data, _, _ in results]
+    validations = validate_batch(normalized)
+    return [
+        store_invoice(invoice_data, filename, status=validation.status, image_hash=image_hash, normalized=parsed)
+        for (invoice_data, filename, image_hash), parsed, validation in zip(results, normalized, validations)
+    ]
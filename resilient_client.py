@@ -0,0 +1,260 @@
+"""
+Retries, rate limiting and a circuit breaker around LlamaExtract calls.
+
+ResilientAgent wraps an extraction agent so that:
+
+- transient failures (429, 5xx, timeouts, connection errors) are retried with
+  jittered exponential backoff, honouring Retry-After when the API sends it;
+- every API call takes a token from a process-wide token bucket, so all
+  sessions together stay under the configured request rate. Uploads and
+  status polls have separate buckets: with one shared bucket, the polls of
+  many in-flight jobs used up the budget and new uploads queued behind them,
+  so raising concurrency made throughput worse;
+- repeated failures open a circuit breaker. Each call counts once, after its
+  retries are used up, so one unlucky upload cannot open it alone. While it
+  is open, interactive calls fail fast with CircuitOpenError and batch work
+  waits in the queue until the breaker lets a probe request through.
+
+Uploads are retried on their own. Creating the extraction job is only
+retried when the request cannot have started a job (it was rate limited or
+never connected), since a retried job that did start is billed twice.
+"""
+
+import os
+import random
+import threading
+import time
+from job_queue import _can_upload, _create_job, _get_job, _get_run, _run, _upload
+import telemetry
+
+# Process-wide request budget for uploads (requests per second, and burst size)
+RATE_LIMIT = float(os.getenv("LLAMA_EXTRACT_RATE_LIMIT", "10"))
+RATE_BURST = int(os.getenv("LLAMA_EXTRACT_RATE_BURST", "20"))
+
+# Separate budget for job status polls and result fetches
+POLL_RATE_LIMIT = float(os.getenv("LLAMA_EXTRACT_POLL_RATE_LIMIT", "50"))
+POLL_RATE_BURST = int(os.getenv("LLAMA_EXTRACT_POLL_RATE_BURST", "50"))
+
+MAX_RETRIES = 4
+BASE_DELAY = 0.5
+MAX_DELAY = 30.0
+
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 30.0
+
+RETRYABLE_STATUS_CODES = (408, 425, 429, 500, 502, 503, 504)
+
+
+class CircuitOpenError(Exception):
+    """Raised when the circuit breaker is open and the call should not be attempted"""
+
+    def __init__(self, retry_in):
+        super().__init__(f"LlamaCloud is currently degraded; try again in {retry_in:.0f}s")
+        self.retry_in = retry_in
+
+
+def is_retryable(error):
+    """Return True for errors worth retrying (rate limits, server errors, network trouble)"""
+    # Imported here so loading this module does not load the SDK; by now it is loaded anyway
+    from llama_cloud.core.api_error import ApiError
+    if isinstance(error, ApiError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    response = getattr(error, 'response', None)
+    if response is not None and getattr(response, 'status_code', None) is not None:
+        return response.status_code in RETRYABLE_STATUS_CODES
+    # httpx transport errors carry a request but no response
+    return type(error).__module__.startswith('httpx')
+
+
+def never_sent(error):
+    """Return True for errors showing the request was not acted on: rate limited, or never connected"""
+    response = getattr(error, 'response', None)
+    status = getattr(error, 'status_code', None) or getattr(response, 'status_code', None)
+    if status is not None:
+        return status == 429
+    if isinstance(error, ConnectionRefusedError):
+        return True
+    # httpx raises these before any of the request is sent
+    return type(error).__module__.startswith('httpx') and type(error).__name__ in ('ConnectError', 'ConnectTimeout')
+
+
+def retry_after(error):
+    """Return the server's requested wait in seconds, if it sent one"""
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or getattr(error, 'headers', None)
+    value = headers.get('Retry-After') if headers else None
+    if value is None and isinstance(getattr(error, 'body', None), dict):
+        value = error.body.get('retry_after')
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Thread-safe token bucket rate limiter"""
+
+    def __init__(self, rate=RATE_LIMIT, capacity=RATE_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and take it"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures, then lets a single probe through after a timeout"""
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """One of 'closed', 'open' or 'half_open'"""
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return 'half_open'
+            return 'open'
+
+    def retry_in(self):
+        """Seconds until the breaker will allow a probe request"""
+        with self._lock:
+            if self._opened_at is None:
+                return 0.0
+            return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self):
+        """Return True if a call may proceed now"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    telemetry.increment('circuit_opened')
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+_limiter = TokenBucket()
+_poll_limiter = TokenBucket(POLL_RATE_LIMIT, POLL_RATE_BURST)
+_breaker = CircuitBreaker()
+
+
+def get_rate_limiter():
+    """Return the process-wide token bucket for uploads"""
+    return _limiter
+
+
+def get_poll_rate_limiter():
+    """Return the process-wide token bucket for status polls"""
+    return _poll_limiter
+
+
+def get_circuit_breaker():
+    """Return the process-wide circuit breaker"""
+    return _breaker
+
+
+def call(fn, *args, retries=MAX_RETRIES, wait_if_open=False, use_breaker=True, limiter=None, retry_if=None,
+         **kwargs):
+    """Call fn with rate limiting (the upload bucket unless limiter is given), retries and the circuit breaker.
+
+    retry_if narrows which retryable errors are actually retried, for calls
+    that are not safe to repeat.
+    """
+    limiter = limiter or _limiter
+    attempt = 0
+    while True:
+        # Retries of a call already let through do not ask the breaker again
+        if use_breaker and attempt == 0 and not _breaker.allow():
+            if not wait_if_open:
+                raise CircuitOpenError(_breaker.retry_in())
+            time.sleep(max(_breaker.retry_in(), BASE_DELAY))
+            continue
+
+        limiter.acquire()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if not is_retryable(e):
+                # The request reached a healthy backend and was rejected; do not trip the breaker
+                if use_breaker:
+                    _breaker.record_success()
+                raise
+            if attempt >= retries or (retry_if is not None and not retry_if(e)):
+                # One failure per call; calls that bypass the breaker must not trip it either
+                if use_breaker:
+                    _breaker.record_failure()
+                raise
+            attempt += 1
+            telemetry.increment('api_retries')
+            delay = retry_after(e)
+            if delay is None:
+                delay = random.uniform(0, min(MAX_DELAY, BASE_DELAY * 2 ** attempt))
+            time.sleep(delay)
+            continue
+        if use_breaker:
+            _breaker.record_success()
+        return result
+
+
+class ResilientAgent:
+    """Extraction agent wrapper that routes every API call through call()"""
+
+    def __init__(self, agent, wait_if_open=False):
+        self.agent = agent
+        self.wait_if_open = wait_if_open
+
+    @property
+    def name(self):
+        return self.agent.name
+
+    def queue_extraction(self, file_input):
+        if not _can_upload(self.agent):
+            # Upload and job creation happen in one call, so it is only retried if nothing was started
+            return call(lambda: _run(self.agent.queue_extraction(file_input)), wait_if_open=self.wait_if_open,
+                        retry_if=never_sent)
+        uploaded = call(_upload, self.agent, file_input, wait_if_open=self.wait_if_open)
+        return call(_create_job, self.agent, uploaded, wait_if_open=self.wait_if_open, retry_if=never_sent)
+
+    def get_extraction_job(self, job_id):
+        # Jobs already running remotely keep being polled while the breaker is open
+        return call(_get_job, self.agent, job_id, retries=1, use_breaker=False, limiter=_poll_limiter)
+
+    def get_extraction_run_for_job(self, job_id):
+        return call(_get_run, self.agent, job_id, use_breaker=False, limiter=_poll_limiter)
@@ -0,0 +1,150 @@
+"""
+Content-addressed cache of extraction results.
+
+Results are stored in a local SQLite database keyed by the SHA-256 of the
+uploaded file, the fingerprint of the Invoice schema and the agent name, so a
+re-uploaded invoice is answered from disk instead of a billed remote call.
+Entries expire after a maximum age and the oldest are evicted once the cache
+grows past its size limit.
+
+Set INVOICE_CACHE_DISABLED=1 to bypass the cache entirely.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from fingerprints import content_hash, schema_fingerprint
+import telemetry
+
+DEFAULT_PATH = os.getenv("INVOICE_CACHE_PATH", ".cache/extractions.sqlite3")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_MAX_AGE = 30 * 24 * 60 * 60  # seconds
+
+
+class ResultCache:
+    """SQLite-backed extraction result cache with size and age eviction"""
+
+    def __init__(self, path=DEFAULT_PATH, max_bytes=DEFAULT_MAX_BYTES,
+                 max_age=DEFAULT_MAX_AGE, enabled=True):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.enabled = enabled and os.getenv("INVOICE_CACHE_DISABLED", "") not in ("1", "true", "yes")
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._schema = schema_fingerprint()
+        if self.enabled:
+            self._init_db()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _init_db(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed_at)")
+
+    def make_key(self, file_bytes, agent_name):
+        """Build the cache key for an upload extracted by a given agent"""
+        return f"{content_hash(file_bytes)}:{self._schema}:{agent_name}"
+
+    def get(self, key):
+        """Return cached invoice data for a key, or None on a miss"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT data, created_at FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and now - row[1] <= self.max_age:
+                conn.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+            else:
+                row = None
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        telemetry.increment('cache_misses' if row is None else 'cache_hits')
+        return json.loads(row[0]) if row is not None else None
+
+    def put(self, key, data):
+        """Store invoice data under a key and evict stale or excess entries"""
+        if not self.enabled:
+            return
+        payload = json.dumps(data, separators=(",", ":"))
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, data, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload), now, now)
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM results WHERE created_at < ?", (now - self.max_age,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop least recently used entries until the cache fits again
+        excess = total - self.max_bytes
+        doomed = []
+        for key, size in conn.execute("SELECT key, size FROM results ORDER BY accessed_at"):
+            doomed.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        conn.executemany("DELETE FROM results WHERE key = ?", doomed)
+
+    def clear(self):
+        """Remove every cached result"""
+        if self.enabled:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM results")
+
+    def stats(self):
+        """Return hit/miss counters and current cache size"""
+        entries, size = 0, 0
+        if self.enabled:
+            with self._connect() as conn:
+                entries, size = conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results"
+                ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': entries,
+            'bytes': size,
+        }
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_default_cache():
+    """Return the process-wide result cache"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ResultCache()
+        return _default_cache
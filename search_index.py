@@ -0,0 +1,312 @@
+"""
+Full-text and faceted search over stored invoices.
+
+Each invoice's invoice number, tax IDs, seller and client names and
+addresses, and line item descriptions are indexed in an SQLite FTS5 table
+inside the invoice store's database, keyed by the invoice's rowid. VAT rates
+are kept in a small table of their own so they can be filtered and counted.
+Both are written in the same transaction that stores each invoice, from its
+normalized form, so the index never lags the store.
+
+search() combines a text query with the vendor, issue date, amount and VAT
+rate filters and returns one page of matches, best first, together with
+facet counts for each filter. Every facet is counted with the other filters
+applied but not its own, so picking a vendor still shows how many matches
+the other vendors have. SQLite builds without FTS5 fall back to a plain
+table searched with LIKE.
+
+Stores created before search existed are indexed the first time they are
+opened.
+"""
+
+import re
+import sqlite3
+import time
+from collections import namedtuple
+import normalize
+
+# Bump to rebuild every store's index on next open
+SCHEMA_VERSION = 2
+
+# Invoices indexed per step when backfilling an existing store
+REBUILD_BATCH_SIZE = 5000
+
+# Distinct values returned per facet (the month facet covers every month)
+FACET_LIMIT = 20
+
+# Issue months listed by the UI and CLI, most recent last
+RECENT_MONTHS = 12
+
+# Gross amount buckets for the amount facet: (label, min, max), max exclusive
+AMOUNT_RANGES = (
+    ("Under $100", None, 100),
+    ("$100 - $500", 100, 500),
+    ("$500 - $1,000", 500, 1000),
+    ("$1,000 - $5,000", 1000, 5000),
+    ("$5,000 and over", 5000, None),
+)
+
+TEXT_COLUMNS = ('invoice_number', 'tax_ids', 'parties', 'items')
+
+SearchResults = namedtuple('SearchResults', ['total', 'invoices', 'snippets', 'facets', 'seconds'])
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def _has_fts5(conn):
+    try:
+        conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS temp.fts5_probe USING fts5(text)")
+        conn.execute("DROP TABLE temp.fts5_probe")
+    except sqlite3.OperationalError:
+        return False
+    return True
+
+
+def _uses_fts5(store):
+    rows = store.query("SELECT sql FROM sqlite_master WHERE name = 'invoice_search'")
+    return bool(rows) and 'fts5' in rows[0]['sql'].lower()
+
+
+def document(normalized):
+    """Return the indexed text columns for a normalized invoice"""
+    seller, client = normalized['seller'], normalized['client']
+    parties = [seller['name'], seller['address'], client['name'], client['address']]
+    return {
+        'invoice_number': normalized['invoice_number'] or "",
+        'tax_ids': " ".join(value for value in (seller['tax_id'], client['tax_id'], seller['iban']) if value),
+        'parties': "\n".join(value for value in parties if value),
+        'items': "\n".join(item['description'] for item in normalized['items'] if item['description']),
+    }
+
+
+def vat_rates(normalized):
+    """Return the distinct VAT rate labels on an invoice, from its VAT summary and its items"""
+    entries = normalized['vat_summary'] + normalized['items']
+    return sorted({entry['vat_label'] for entry in entries if entry['vat_label']})
+
+
+def apply(conn, rowid, normalized):
+    """Index one stored invoice (by its invoices rowid) on an open connection"""
+    normalized = normalize.ensure_normalized(normalized)
+    fields = document(normalized)
+    conn.execute(
+        f"INSERT INTO invoice_search (rowid, {', '.join(TEXT_COLUMNS)}) "
+        f"VALUES (?, {', '.join('?' for _ in TEXT_COLUMNS)})",
+        [rowid] + [fields[column] for column in TEXT_COLUMNS]
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO invoice_vat_rates (invoice_rowid, rate) VALUES (?, ?)",
+        [(rowid, rate) for rate in vat_rates(normalized)]
+    )
+
+
+def rebuild(conn, batch_size=REBUILD_BATCH_SIZE):
+    """Re-index every stored invoice"""
+    conn.execute("DELETE FROM invoice_search")
+    conn.execute("DELETE FROM invoice_vat_rates")
+    last = 0
+    while True:
+        rows = conn.execute(
+            "SELECT i.rowid, p.normalized FROM invoices i JOIN invoice_payloads p ON p.id = i.id "
+            "WHERE i.rowid > ? ORDER BY i.rowid LIMIT ?",
+            (last, batch_size)
+        ).fetchall()
+        if not rows:
+            break
+        for rowid, normalized in rows:
+            apply(conn, rowid, normalize.loads(normalized))
+        last = rows[-1][0]
+    conn.execute(
+        "INSERT OR REPLACE INTO search_meta (key, value) VALUES ('schema_version', ?)", (str(SCHEMA_VERSION),)
+    )
+
+
+def ensure_schema(conn):
+    """Create the search tables, rebuilding the index if it is new or outdated"""
+    conn.execute("CREATE TABLE IF NOT EXISTS search_meta (key TEXT PRIMARY KEY, value TEXT)")
+    row = conn.execute("SELECT value FROM search_meta WHERE key = 'schema_version'").fetchone()
+    if row is not None and row[0] != str(SCHEMA_VERSION):
+        conn.execute("DROP TABLE IF EXISTS invoice_search")
+        conn.execute("DROP TABLE IF EXISTS invoice_vat_rates")
+    columns = ', '.join(TEXT_COLUMNS)
+    if _has_fts5(conn):
+        conn.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS invoice_search USING fts5("
+            f"{columns}, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+    else:
+        conn.execute(f"CREATE TABLE IF NOT EXISTS invoice_search ({columns})")
+    # Keyed by invoice for the facet join; the rate index serves the filter
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS invoice_vat_rates (
+            invoice_rowid INTEGER NOT NULL, rate TEXT NOT NULL, PRIMARY KEY (invoice_rowid, rate)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS invoice_vat_rates_rate ON invoice_vat_rates (rate);
+    """)
+    if row is None or row[0] != str(SCHEMA_VERSION):
+        rebuild(conn)
+
+
+def match_expression(text):
+    """Turn free text into an FTS5 query: every word must match, as a prefix"""
+    return " ".join(f'"{token}"*' for token in _TOKEN.findall(text or ""))
+
+
+def _text_clause(text, fts5=True):
+    """Return (join, where clauses, params) restricting invoices i to those matching text"""
+    tokens = _TOKEN.findall(text or "")
+    if not tokens:
+        return "", [], []
+    if fts5:
+        return "JOIN invoice_search s ON s.rowid = i.rowid", ["invoice_search MATCH ?"], [match_expression(text)]
+    # Without FTS5 every word has to appear somewhere in the invoice's text
+    haystack = " || ' ' || ".join(f"s.{column}" for column in TEXT_COLUMNS)
+    return (
+        "JOIN invoice_search s ON s.rowid = i.rowid",
+        [f"({haystack}) LIKE ?" for _ in tokens],
+        [f"%{token}%" for token in tokens],
+    )
+
+
+def _filter_clauses(vendor=None, date_from=None, date_to=None, min_amount=None, max_amount=None, vat_rate=None):
+    """Return {filter name: (clause, params)} for the filters that are set"""
+    clauses = {}
+    if vendor:
+        clauses['vendor'] = ("i.vendor = ?", [vendor])
+    if date_from or date_to:
+        parts, params = [], []
+        if date_from:
+            parts.append("i.issue_date >= ?")
+            params.append(date_from)
+        if date_to:
+            parts.append("i.issue_date <= ?")
+            params.append(date_to)
+        clauses['month'] = (" AND ".join(parts), params)
+    if min_amount is not None or max_amount is not None:
+        parts, params = [], []
+        if min_amount is not None:
+            parts.append("i.amount >= ?")
+            params.append(min_amount)
+        if max_amount is not None:
+            parts.append("i.amount <= ?")
+            params.append(max_amount)
+        clauses['amount'] = (" AND ".join(parts), params)
+    if vat_rate:
+        clauses['vat_rate'] = (
+            "i.rowid IN (SELECT invoice_rowid FROM invoice_vat_rates WHERE rate = ?)", [normalize.rate_label(vat_rate)]
+        )
+    return clauses
+
+
+def _from(text, clauses, skip=None, join="", where=()):
+    """Build the FROM/WHERE part of a query over the matches, leaving out one filter"""
+    text_join, text_where, params = text
+    conditions = list(text_where) + list(where)
+    params = list(params)
+    for name, (clause, clause_params) in clauses.items():
+        if name != skip:
+            conditions.append(clause)
+            params.extend(clause_params)
+    source = f"FROM invoices i {text_join} {join}".rstrip()
+    return source + (f" WHERE {' AND '.join(conditions)}" if conditions else ""), params
+
+
+def _amount_bucket():
+    """SQL expression numbering the AMOUNT_RANGES bucket of i.amount"""
+    cases = []
+    for position, (_, low, high) in enumerate(AMOUNT_RANGES):
+        bounds = [f"i.amount >= {low}" if low is not None else "i.amount IS NOT NULL"]
+        if high is not None:
+            bounds.append(f"i.amount < {high}")
+        cases.append(f"WHEN {' AND '.join(bounds)} THEN {position}")
+    return f"CASE {' '.join(cases)} END"
+
+
+def _facets(store, text, clauses):
+    """Count matches per vendor, VAT rate, issue month and amount range"""
+    source, params = _from(text, clauses, skip='vendor')
+    vendors = store.query(
+        f"SELECT i.vendor AS value, COUNT(*) AS n {source} GROUP BY i.vendor ORDER BY n DESC, i.vendor LIMIT ?",
+        params + [FACET_LIMIT]
+    )
+    source, params = _from(
+        text, clauses, skip='vat_rate', join="JOIN invoice_vat_rates v ON v.invoice_rowid = i.rowid"
+    )
+    rates = store.query(
+        f"SELECT v.rate AS value, COUNT(*) AS n {source} GROUP BY v.rate ORDER BY n DESC, v.rate LIMIT ?",
+        params + [FACET_LIMIT]
+    )
+    source, params = _from(text, clauses, skip='month', where=["i.issue_date IS NOT NULL"])
+    months = store.query(
+        f"SELECT substr(i.issue_date, 1, 7) AS value, COUNT(*) AS n {source} GROUP BY value ORDER BY value", params
+    )
+    source, params = _from(text, clauses, skip='amount')
+    buckets = {
+        row['value']: row['n']
+        for row in store.query(f"SELECT {_amount_bucket()} AS value, COUNT(*) AS n {source} GROUP BY value", params)
+    }
+    return {
+        'vendor': [(row['value'], row['n']) for row in vendors],
+        'vat_rate': [(row['value'], row['n']) for row in rates],
+        'month': [(row['value'], row['n']) for row in months],
+        'amount': [
+            (label, buckets[position]) for position, (label, _, _) in enumerate(AMOUNT_RANGES) if buckets.get(position)
+        ],
+    }
+
+
+def search(store, text=None, sort_by=None, descending=True, limit=50, offset=0, facets=True, **filters):
+    """Search stored invoices and return SearchResults.
+
+    text is matched word by word, as prefixes, against invoice numbers, tax
+    IDs, party names and addresses and line item descriptions. filters are
+    vendor, date_from and date_to (ISO dates), min_amount and max_amount (gross,
+    inclusive) and vat_rate (a label such as '23'). Without sort_by, matches
+    are ordered by relevance when there is text and newest first otherwise.
+    Facets map 'vendor', 'vat_rate', 'month' and 'amount' (AMOUNT_RANGES
+    labels) to [(value, count)].
+    """
+    # invoice_store imports this module, so import it on first use
+    from invoice_store import InvoiceSummary, SORTABLE_COLUMNS, SUMMARY_COLUMNS
+
+    start = time.perf_counter()
+    fts5 = _uses_fts5(store)
+    text_clause = _text_clause(text, fts5)
+    clauses = _filter_clauses(**filters)
+    source, params = _from(text_clause, clauses)
+
+    ranked = sort_by is None and fts5 and bool(text_clause[1])
+    if ranked:
+        order = "s.rank"
+    else:
+        sort_by = sort_by or 'processed_at'
+        if sort_by not in SORTABLE_COLUMNS:
+            raise ValueError(f"Cannot sort by {sort_by!r}")
+        direction = "DESC" if descending else "ASC"
+        order = f"i.{sort_by} {direction}, i.rowid {direction}"
+
+    total = store.query(f"SELECT COUNT(*) AS n {source}", params)[0]['n']
+    columns = ', '.join(f"i.{column}" for column in SUMMARY_COLUMNS)
+    # Where in the items or party text the words matched
+    snippet = "snippet(invoice_search, -1, '**', '**', '…', 10)" if ranked else "NULL"
+    rows = store.query(
+        f"SELECT {columns}, {snippet} AS snippet {source} ORDER BY {order} LIMIT ? OFFSET ?",
+        params + [limit, offset]
+    )
+    return SearchResults(
+        total,
+        [InvoiceSummary(**row) for row in rows],
+        [row['snippet'] for row in rows],
+        _facets(store, text_clause, clauses) if facets else {},
+        time.perf_counter() - start,
+    )
+
+
+def list_vat_rates(store):
+    """Return the distinct VAT rate labels in the index, for filter dropdowns"""
+    # Numeric rates in numeric order, then labels such as "zw" (as analytics.vat_by_rate)
+    rows = store.query(
+        "SELECT DISTINCT rate FROM invoice_vat_rates "
+        "ORDER BY CAST(rate AS REAL) = 0 AND rate NOT GLOB '*[0-9]*', CAST(rate AS REAL), rate"
+    )
+    return [row['rate'] for row in rows]
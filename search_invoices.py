@@ -0,0 +1,88 @@
+"""
+Search processed invoices from the command line.
+
+Words are matched as prefixes against invoice numbers, tax IDs, seller and
+client names and addresses and line item descriptions; filters narrow the
+matches down by vendor, issue date, gross amount and VAT rate. Facet counts
+for each filter are printed under the matches.
+
+Usage:
+    python search_invoices.py "copy paper"
+    python search_invoices.py acme --from 2024-01-01 --to 2024-03-31 --vat 23
+    python search_invoices.py --min 1000 --sort amount --json
+"""
+
+import argparse
+import json
+import sys
+# Loads .env before the modules below read their settings from the environment
+import config  # noqa: F401
+import search_index
+from invoice_store import SORTABLE_COLUMNS, get_default_store
+
+
+def print_results(results):
+    print(f"🔎 {results.total} matching invoices ({results.seconds * 1000:.1f} ms)")
+    for invoice, snippet in zip(results.invoices, results.snippets):
+        amount = f"${invoice['amount']:,.2f}" if invoice['amount'] is not None else "N/A"
+        print(f"  {invoice['id']}  {invoice['invoice_number'] or 'N/A':<14} {invoice['issue_date'] or 'N/A':<10} "
+              f"{amount:>12}  {invoice['vendor'] or 'Unknown'}")
+        if snippet:
+            print(f"      {' '.join(snippet.split())}")
+    for name, title in (('vendor', 'Vendors'), ('vat_rate', 'VAT rates'), ('month', 'Months'), ('amount', 'Amounts')):
+        values = results.facets.get(name)
+        if name == 'month' and values and len(values) > search_index.RECENT_MONTHS:
+            title = f"Latest {search_index.RECENT_MONTHS} of {len(values)} months"
+            values = values[-search_index.RECENT_MONTHS:]
+        if values:
+            print(f"\n📊 {title}: " + ", ".join(f"{value or 'Unknown'} ({count})" for value, count in values))
+
+
+def main():
+    """Parse arguments and run the search."""
+    parser = argparse.ArgumentParser(description="Full-text and faceted search over processed invoices.")
+    parser.add_argument("text", nargs="*", help="Words to search for")
+    parser.add_argument("--vendor", help="Only invoices from this seller")
+    parser.add_argument("--from", dest="date_from", help="Issued on or after this date (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", help="Issued on or before this date (YYYY-MM-DD)")
+    parser.add_argument("--min", type=float, dest="min_amount", help="Minimum gross amount")
+    parser.add_argument("--max", type=float, dest="max_amount", help="Maximum gross amount")
+    parser.add_argument("--vat", dest="vat_rate", help="Only invoices with this VAT rate, e.g. 23")
+    parser.add_argument("--sort", choices=SORTABLE_COLUMNS, help="Sort column (default: relevance, then newest)")
+    parser.add_argument("--ascending", action="store_true", help="Sort ascending")
+    parser.add_argument("--limit", type=int, default=20, help="Matches to show")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    try:
+        results = search_index.search(
+            get_default_store(),
+            " ".join(args.text),
+            sort_by=args.sort,
+            descending=not args.ascending,
+            limit=args.limit,
+            vendor=args.vendor,
+            date_from=args.date_from,
+            date_to=args.date_to,
+            min_amount=args.min_amount,
+            max_amount=args.max_amount,
+            vat_rate=args.vat_rate,
+        )
+    except Exception as e:
+        print(f"❌ Search failed: {e}")
+        sys.exit(1)
+
+    if args.json:
+        print(json.dumps({
+            'total': results.total,
+            'seconds': results.seconds,
+            'invoices': [dict(invoice.as_dict(), snippet=snippet)
+                         for invoice, snippet in zip(results.invoices, results.snippets)],
+            'facets': results.facets,
+        }, indent=2))
+    else:
+        print_results(results)
+
+
+if __name__ == "__main__":
+    main()
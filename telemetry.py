@@ -0,0 +1,183 @@
+"""
+In-process extraction telemetry.
+
+Records per-stage timings (agent init, queue wait, upload, remote extraction,
+render, ...), counters such as cache hits, and errors by exception type.
+Latency percentiles are computed over a sliding window of recent samples.
+
+Everything is process-wide, so the sidebar shows numbers for all sessions on
+this server. The data can be exported as JSON or Prometheus text, and
+start_http_server() serves both for dashboards to scrape.
+"""
+
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Number of recent samples kept per stage for percentile calculations
+WINDOW_SIZE = 2048
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+_lock = threading.Lock()
+_samples = defaultdict(lambda: deque(maxlen=WINDOW_SIZE))
+_totals = defaultdict(lambda: [0, 0.0])  # stage -> [count, sum of seconds]
+_counters = defaultdict(int)
+_errors = defaultdict(int)  # (stage, exception type) -> count
+_started_at = time.time()
+
+
+def record(stage, seconds):
+    """Record one duration for a stage"""
+    with _lock:
+        _samples[stage].append(seconds)
+        totals = _totals[stage]
+        totals[0] += 1
+        totals[1] += seconds
+
+
+@contextmanager
+def timer(stage):
+    """Time the enclosed block and record it under stage; errors are counted too"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        record_error(stage, e)
+        raise
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def increment(counter, amount=1):
+    """Increase a named counter"""
+    with _lock:
+        _counters[counter] += amount
+
+
+def record_error(stage, error):
+    """Count an error for a stage by its exception type"""
+    with _lock:
+        _errors[(stage, type(error).__name__)] += 1
+
+
+def _percentile(sorted_values, quantile):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(quantile * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def stage_stats(stage):
+    """Return count, mean and p50/p95/p99 (seconds) for a stage"""
+    with _lock:
+        values = sorted(_samples[stage]) if stage in _samples else []
+        count, total = _totals[stage] if stage in _totals else (0, 0.0)
+    stats = {'count': count, 'mean': total / count if count else None}
+    for quantile in QUANTILES:
+        stats[f"p{int(quantile * 100)}"] = _percentile(values, quantile)
+    return stats
+
+
+def counter(name):
+    """Return the current value of a counter"""
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def reset():
+    """Discard all recorded timings, counters and errors"""
+    with _lock:
+        _samples.clear()
+        _totals.clear()
+        _counters.clear()
+        _errors.clear()
+
+
+def snapshot():
+    """Return all telemetry as a JSON-serializable dict"""
+    with _lock:
+        stages = list(_samples)
+        counters = dict(_counters)
+        errors = [
+            {'stage': stage, 'type': error_type, 'count': count}
+            for (stage, error_type), count in sorted(_errors.items())
+        ]
+    return {
+        'uptime_seconds': time.time() - _started_at,
+        'stages': {stage: stage_stats(stage) for stage in sorted(stages)},
+        'counters': counters,
+        'errors': errors,
+    }
+
+
+def to_json():
+    """Return the telemetry snapshot as a JSON string"""
+    return json.dumps(snapshot(), indent=2)
+
+
+def to_prometheus():
+    """Return the telemetry in the Prometheus text exposition format"""
+    data = snapshot()
+    lines = [
+        "# HELP invoice_stage_seconds Duration of extraction pipeline stages.",
+        "# TYPE invoice_stage_seconds summary",
+    ]
+    for stage, stats in data['stages'].items():
+        for quantile in QUANTILES:
+            value = stats[f"p{int(quantile * 100)}"]
+            if value is not None:
+                lines.append(f'invoice_stage_seconds{{stage="{stage}",quantile="{quantile}"}} {value:.6f}')
+        with _lock:
+            count, total = _totals[stage]
+        lines.append(f'invoice_stage_seconds_sum{{stage="{stage}"}} {total:.6f}')
+        lines.append(f'invoice_stage_seconds_count{{stage="{stage}"}} {count}')
+
+    lines.append("# HELP invoice_events_total Pipeline event counters.")
+    lines.append("# TYPE invoice_events_total counter")
+    for name, value in sorted(data['counters'].items()):
+        lines.append(f'invoice_events_total{{event="{name}"}} {value}')
+
+    lines.append("# HELP invoice_errors_total Errors by stage and exception type.")
+    lines.append("# TYPE invoice_errors_total counter")
+    for error in data['errors']:
+        lines.append(
+            f'invoice_errors_total{{stage="{error["stage"]}",type="{error["type"]}"}} {error["count"]}'
+        )
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = to_prometheus(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body, content_type = to_json(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        payload = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+
+
+def start_http_server(port, host="127.0.0.1"):
+    """Serve /metrics and /metrics.json on a background thread (once per process)"""
+    global _server
+    with _lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+    return _server
@@ -0,0 +1,93 @@
+"""
+Hand uploaded file contents to LlamaExtract without a temp-file round trip.
+
+When the installed SDK supports it, uploads are passed as in-memory SourceText
+inputs with their original filename. Otherwise they are written to a managed
+spool directory under their real extension and always removed afterwards;
+files orphaned by a crashed process are purged the next time the spool is used.
+The SDK is only imported when the first upload is prepared.
+"""
+
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+SPOOL_DIR = os.getenv("INVOICE_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "invoice-spool"))
+
+# Spooled files older than this (seconds) can only be leftovers from a crash
+STALE_SPOOL_AGE = 60 * 60
+
+_purge_lock = threading.Lock()
+_purged = False
+
+# SourceText class, or False on SDKs without it; resolved on first use
+_source_text = None
+
+
+def source_text_class():
+    """Return the SDK's SourceText class, or None if the installed SDK has none"""
+    global _source_text
+    if _source_text is None:
+        try:
+            from llama_cloud_services.extract import SourceText
+        except ImportError:
+            SourceText = False
+        _source_text = SourceText
+    return _source_text or None
+
+
+def upload_name(name, default="upload.jpg"):
+    """Return a safe upload filename that keeps the original extension"""
+    filename = os.path.basename(name or "")
+    return filename if os.path.splitext(filename)[1] else default
+
+
+def purge_spool(max_age=STALE_SPOOL_AGE):
+    """Delete spooled files left behind by processes that died mid-upload"""
+    if not os.path.isdir(SPOOL_DIR):
+        return
+    cutoff = time.time() - max_age
+    for entry in os.scandir(SPOOL_DIR):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.unlink(entry.path)
+        except OSError:
+            pass
+
+
+@contextmanager
+def spooled_file(file_bytes, filename):
+    """Write bytes to the spool directory and yield the path, removing it on exit"""
+    global _purged
+    with _purge_lock:
+        if not _purged:
+            purge_spool()
+            _purged = True
+
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    extension = os.path.splitext(filename)[1]
+    path = os.path.join(SPOOL_DIR, f"{uuid.uuid4().hex}{extension}")
+    try:
+        with open(path, 'wb') as f:
+            f.write(file_bytes)
+        yield path
+    finally:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+@contextmanager
+def extract_input(file_bytes, filename):
+    """Yield something agent.extract()/queue_extraction() accepts for these bytes"""
+    filename = upload_name(filename)
+    SourceText = source_text_class()
+    if SourceText is not None:
+        yield SourceText(file=file_bytes, filename=filename)
+    else:
+        with spooled_file(file_bytes, filename) as path:
+            yield path
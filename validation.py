@@ -0,0 +1,161 @@
+"""
+Arithmetic validation of extracted invoices.
+
+Checks that the numbers LlamaExtract returned add up:
+
+- each line item's quantity x net price matches its net worth, and its net
+  worth plus VAT matches its gross worth;
+- the items in each VAT rate sum to that rate's vat_summary entry, and each
+  entry's net worth plus VAT matches its gross worth;
+- the vat_summary entries (and the line items) sum to the invoice totals.
+
+validate_batch() flattens a whole batch into NumPy arrays and runs every
+check as a handful of vectorized operations, so validating thousands of
+invoices takes milliseconds. Amounts are compared within an absolute or
+relative tolerance to allow for rounding on the invoice itself.
+
+Invoices are checked in their normalized form (see normalize.py); raw
+extracted dicts are normalized on the way in.
+"""
+
+from collections import namedtuple
+import numpy as np
+from normalize import ensure_normalized
+
+ABS_TOLERANCE = 0.05
+REL_TOLERANCE = 0.0001
+
+STATUS_COMPLETED = "Completed"
+STATUS_NEEDS_REVIEW = "Needs Review"
+STATUS_FAILED = "Failed"
+
+ValidationResult = namedtuple('ValidationResult', ['status', 'issues'])
+
+
+def _amount(cents):
+    return cents / 100 if cents is not None else np.nan
+
+
+def _rate(rate):
+    """Return a VAT percentage as a fraction, or NaN for exempt/unknown rates"""
+    return float(rate) / 100 if rate is not None else np.nan
+
+
+def _mismatch(actual, expected, abs_tol, rel_tol):
+    """Elementwise: both values present and further apart than the tolerance"""
+    limit = np.maximum(abs_tol, rel_tol * np.abs(expected))
+    with np.errstate(invalid='ignore'):
+        return np.abs(actual - expected) > limit
+
+
+def validate_batch(invoices, abs_tol=ABS_TOLERANCE, rel_tol=REL_TOLERANCE):
+    """Validate many invoices (raw or normalized) at once and return a ValidationResult for each"""
+    count = len(invoices)
+    issues = [[] for _ in range(count)]
+    codes = {}
+
+    # Flatten line items, VAT summary entries and totals into columns
+    item_rows, vat_rows, totals = [], [], []
+    for index, data in enumerate(invoices):
+        data = ensure_normalized(data)
+        for position, item in enumerate(data['items'], start=1):
+            item_rows.append((
+                index, position, codes.setdefault(item['vat_label'], len(codes)), _rate(item['vat_rate']),
+                item['quantity'] if item['quantity'] is not None else np.nan, _amount(item['net_price']),
+                _amount(item['net_worth']), _amount(item['gross_worth']),
+            ))
+        for entry in data['vat_summary']:
+            vat_rows.append((
+                index, codes.setdefault(entry['vat_label'], len(codes)),
+                _amount(entry['net_worth']), _amount(entry['vat']), _amount(entry['gross_worth']),
+            ))
+        totals.append((
+            _amount(data['total_net_worth']), _amount(data['total_vat']), _amount(data['total_gross_worth']),
+        ))
+
+    items = np.array(item_rows, dtype=float).reshape(-1, 8)
+    vat = np.array(vat_rows, dtype=float).reshape(-1, 5)
+    totals = np.array(totals, dtype=float).reshape(-1, 3)
+    labels = {code: key for key, code in codes.items()}
+
+    item_invoice = items[:, 0].astype(int)
+    item_code = items[:, 2].astype(int)
+    rate, quantity, net_price, net_worth, gross_worth = items[:, 3:].T
+    vat_invoice = vat[:, 0].astype(int)
+    vat_code = vat[:, 1].astype(int)
+    vat_net, vat_vat, vat_gross = vat[:, 2:].T
+    total_net, total_vat, total_gross = totals.T
+
+    def flag(mask, rows, message):
+        for row in np.flatnonzero(mask):
+            issues[rows[row]].append(message(row))
+
+    # Line items
+    flag(np.isnan(items[:, 4:]).any(axis=1), item_invoice,
+         lambda row: f"Item {int(items[row, 1])}: unreadable amounts")
+    expected_net = quantity * net_price
+    flag(_mismatch(net_worth, expected_net, abs_tol, rel_tol), item_invoice,
+         lambda row: f"Item {int(items[row, 1])}: quantity x net price is {expected_net[row]:.2f}, "
+                     f"net worth says {net_worth[row]:.2f}")
+    expected_gross = net_worth * (1 + rate)
+    flag(_mismatch(gross_worth, expected_gross, abs_tol, rel_tol), item_invoice,
+         lambda row: f"Item {int(items[row, 1])}: net worth plus {labels[item_code[row]]}% VAT is "
+                     f"{expected_gross[row]:.2f}, gross worth says {gross_worth[row]:.2f}")
+
+    # VAT buckets: sum the items of each (invoice, rate) and compare to the summary entry
+    buckets = max(len(codes), 1)
+    item_bucket = item_invoice * buckets + item_code
+    vat_bucket = vat_invoice * buckets + vat_code
+    size = count * buckets
+    bucket_net = np.bincount(item_bucket, weights=net_worth, minlength=size)
+    bucket_gross = np.bincount(item_bucket, weights=gross_worth, minlength=size)
+    flag(_mismatch(vat_net + vat_vat, vat_gross, abs_tol, rel_tol), vat_invoice,
+         lambda row: f"VAT {labels[vat_code[row]]}%: net worth plus VAT is {vat_net[row] + vat_vat[row]:.2f}, "
+                     f"gross worth says {vat_gross[row]:.2f}")
+    flag(_mismatch(bucket_net[vat_bucket], vat_net, abs_tol, rel_tol), vat_invoice,
+         lambda row: f"VAT {labels[vat_code[row]]}%: items sum to {bucket_net[vat_bucket[row]]:.2f} net, "
+                     f"summary says {vat_net[row]:.2f}")
+    flag(_mismatch(bucket_gross[vat_bucket], vat_gross, abs_tol, rel_tol), vat_invoice,
+         lambda row: f"VAT {labels[vat_code[row]]}%: items sum to {bucket_gross[vat_bucket[row]]:.2f} gross, "
+                     f"summary says {vat_gross[row]:.2f}")
+    has_invoice_summary = np.bincount(vat_invoice, minlength=count) > 0
+    missing_bucket = (np.bincount(item_bucket, minlength=size) > 0) & (np.bincount(vat_bucket, minlength=size) == 0)
+    missing_bucket &= np.repeat(has_invoice_summary, buckets)
+    for bucket in np.flatnonzero(missing_bucket):
+        issues[bucket // buckets].append(f"VAT {labels[bucket % buckets]}%: missing from the VAT summary")
+
+    # Invoice totals
+    sums = (
+        ("net worth", np.bincount(vat_invoice, weights=vat_net, minlength=count), total_net),
+        ("VAT", np.bincount(vat_invoice, weights=vat_vat, minlength=count), total_vat),
+        ("gross worth", np.bincount(vat_invoice, weights=vat_gross, minlength=count), total_gross),
+    )
+    invoice_rows = np.arange(count)
+    for label, summed, total in sums:
+        flag(has_invoice_summary & _mismatch(summed, total, abs_tol, rel_tol), invoice_rows,
+             lambda row: f"Total {label}: VAT summary sums to {summed[row]:.2f}, total says {total[row]:.2f}")
+    item_total = np.bincount(item_invoice, weights=gross_worth, minlength=count)
+    flag(_mismatch(item_total, total_gross, abs_tol, rel_tol), invoice_rows,
+         lambda row: f"Total gross worth: items sum to {item_total[row]:.2f}, total says {total_gross[row]:.2f}")
+    flag(_mismatch(total_net + total_vat, total_gross, abs_tol, rel_tol), invoice_rows,
+         lambda row: f"Totals: net worth plus VAT is {total_net[row] + total_vat[row]:.2f}, "
+                     f"gross worth says {total_gross[row]:.2f}")
+
+    # Invoices without items or readable totals cannot be checked at all
+    item_count = np.bincount(item_invoice, minlength=count)
+    unusable = (item_count == 0) | np.isnan(totals).any(axis=1)
+    results = []
+    for index in range(count):
+        if unusable[index]:
+            problem = "No line items extracted" if item_count[index] == 0 else "Invoice totals are unreadable"
+            results.append(ValidationResult(STATUS_FAILED, [problem] + issues[index]))
+        elif issues[index]:
+            results.append(ValidationResult(STATUS_NEEDS_REVIEW, issues[index]))
+        else:
+            results.append(ValidationResult(STATUS_COMPLETED, []))
+    return results
+
+
+def validate_invoice(data, **tolerances):
+    """Validate a single invoice, raw or normalized"""
+    return validate_batch([data], **tolerances)[0]
@@ -0,0 +1,244 @@
+"""
+Durable queue of extraction tasks shared by the app and worker processes.
+
+The Streamlit app enqueues uploads here and returns immediately; worker.py
+claims tasks, extracts them and records the outcome. Tasks live in a local
+SQLite database, so they survive browser refreshes, reruns and restarts of
+either process.
+
+A claimed task holds a lease that its worker renews while it runs. If a
+worker dies, the lease runs out and the task is handed to another worker.
+
+Task statuses: Queued -> Processing -> Completed | Failed
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+DEFAULT_PATH = os.getenv("INVOICE_QUEUE_PATH", ".cache/work_queue.sqlite3")
+
+# Seconds a claimed task stays assigned to a worker without a renewal
+LEASE_SECONDS = 120
+
+# A worker whose heartbeat is older than this (seconds) is considered gone
+WORKER_TIMEOUT = 30
+
+MAX_ATTEMPTS = 3
+
+STATUS_QUEUED = "Queued"
+STATUS_PROCESSING = "Processing"
+STATUS_COMPLETED = "Completed"
+STATUS_FAILED = "Failed"
+
+TASK_COLUMNS = (
+    'id', 'filename', 'status', 'agent_name', 'project_id', 'organization_id', 'options',
+    'error', 'invoice_id', 'attempts', 'created_at', 'updated_at'
+)
+
+
+class WorkQueue:
+    """SQLite-backed task queue with leases for crash recovery"""
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._conn() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id TEXT PRIMARY KEY,
+                    filename TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    agent_name TEXT NOT NULL,
+                    project_id TEXT,
+                    organization_id TEXT,
+                    options TEXT NOT NULL,
+                    image_hash BLOB,
+                    error TEXT,
+                    invoice_id TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    lease_until REAL,
+                    not_before REAL NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS task_files (
+                    id TEXT PRIMARY KEY REFERENCES tasks (id) ON DELETE CASCADE,
+                    data BLOB NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS workers (
+                    id TEXT PRIMARY KEY,
+                    concurrency INTEGER NOT NULL,
+                    heartbeat_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, created_at);
+                CREATE INDEX IF NOT EXISTS tasks_updated ON tasks (updated_at);
+            """)
+
+    def _conn(self):
+        # One connection per thread; sqlite3 connections are not thread-safe
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, filename, file_bytes, agent_name, project_id=None, organization_id=None,
+                options=None, image_hash=None):
+        """Queue a file for extraction and return its task ID"""
+        task_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO tasks (id, filename, status, agent_name, project_id, organization_id, options, "
+                "image_hash, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (task_id, filename, STATUS_QUEUED, agent_name, project_id, organization_id,
+                 json.dumps(options or {}), image_hash, now, now)
+            )
+            conn.execute("INSERT INTO task_files (id, data) VALUES (?, ?)", (task_id, file_bytes))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return task_id
+
+    def claim(self, limit=1, lease=LEASE_SECONDS):
+        """Atomically take up to limit runnable tasks, including ones whose worker's lease ran out"""
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Tasks that keep outliving their workers are given up on instead of crashing the next one
+            conn.execute(
+                "UPDATE tasks SET status = ?, error = ?, lease_until = NULL, updated_at = ? "
+                "WHERE status = ? AND lease_until < ? AND attempts >= ?",
+                (STATUS_FAILED, "Worker stopped while processing this task", now, STATUS_PROCESSING, now, MAX_ATTEMPTS)
+            )
+            rows = conn.execute(
+                "SELECT id FROM tasks WHERE not_before <= ? AND "
+                "(status = ? OR (status = ? AND lease_until < ?)) ORDER BY created_at LIMIT ?",
+                (now, STATUS_QUEUED, STATUS_PROCESSING, now, limit)
+            ).fetchall()
+            ids = [row['id'] for row in rows]
+            conn.executemany(
+                "UPDATE tasks SET status = ?, lease_until = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                [(STATUS_PROCESSING, now + lease, now, task_id) for task_id in ids]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [self.get_task(task_id, with_payload=True) for task_id in ids]
+
+    def renew(self, task_ids, lease=LEASE_SECONDS):
+        """Extend the lease on tasks a worker is still running"""
+        now = time.time()
+        self._conn().executemany(
+            "UPDATE tasks SET lease_until = ? WHERE id = ? AND status = ?",
+            [(now + lease, task_id, STATUS_PROCESSING) for task_id in task_ids]
+        )
+
+    def _finish(self, task_id, status, error=None, invoice_id=None):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE tasks SET status = ?, error = ?, invoice_id = ?, lease_until = NULL, updated_at = ? "
+                "WHERE id = ?",
+                (status, error, invoice_id, time.time(), task_id)
+            )
+            conn.execute("DELETE FROM task_files WHERE id = ?", (task_id,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def complete(self, task_id, invoice_id):
+        """Mark a task done and drop its file"""
+        self._finish(task_id, STATUS_COMPLETED, invoice_id=invoice_id)
+
+    def fail(self, task_id, error):
+        """Mark a task failed and drop its file"""
+        self._finish(task_id, STATUS_FAILED, error=str(error))
+
+    def retry_later(self, task_id, delay, error=None):
+        """Put a task back in the queue for another try after delay seconds.
+
+        Used when the task could not be attempted at all (e.g. LlamaCloud is
+        degraded), so the claim does not count against MAX_ATTEMPTS.
+        """
+        now = time.time()
+        self._conn().execute(
+            "UPDATE tasks SET status = ?, error = ?, lease_until = NULL, not_before = ?, "
+            "attempts = MAX(attempts - 1, 0), updated_at = ? WHERE id = ?",
+            (STATUS_QUEUED, str(error) if error else None, now + delay, now, task_id)
+        )
+
+    def get_task(self, task_id, with_payload=False):
+        """Return a task as a dict (with 'file_bytes' and 'image_hash' if requested), or None"""
+        row = self._conn().execute(
+            f"SELECT {', '.join(TASK_COLUMNS)}, image_hash FROM tasks WHERE id = ?", (task_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        task = {column: row[column] for column in TASK_COLUMNS}
+        task['options'] = json.loads(task['options'])
+        if with_payload:
+            task['image_hash'] = row['image_hash']
+            payload = self._conn().execute("SELECT data FROM task_files WHERE id = ?", (task_id,)).fetchone()
+            task['file_bytes'] = payload['data'] if payload is not None else None
+        return task
+
+    def recent(self, limit=20):
+        """Return the most recently updated tasks, without their files"""
+        rows = self._conn().execute(
+            f"SELECT {', '.join(TASK_COLUMNS)} FROM tasks ORDER BY updated_at DESC LIMIT ?", (limit,)
+        )
+        return [dict(row) for row in rows]
+
+    def counts(self):
+        """Return the number of tasks in each status"""
+        rows = self._conn().execute("SELECT status, COUNT(*) FROM tasks GROUP BY status")
+        return {row[0]: row[1] for row in rows}
+
+    def heartbeat(self, worker_id, concurrency):
+        """Record that a worker is alive"""
+        self._conn().execute(
+            "INSERT OR REPLACE INTO workers (id, concurrency, heartbeat_at) VALUES (?, ?, ?)",
+            (worker_id, concurrency, time.time())
+        )
+
+    def remove_worker(self, worker_id):
+        self._conn().execute("DELETE FROM workers WHERE id = ?", (worker_id,))
+
+    def live_workers(self, timeout=WORKER_TIMEOUT):
+        """Return (worker ID, concurrency) for workers with a recent heartbeat"""
+        rows = self._conn().execute(
+            "SELECT id, concurrency FROM workers WHERE heartbeat_at >= ?", (time.time() - timeout,)
+        )
+        return [(row[0], row[1]) for row in rows]
+
+
+_default_queue = None
+_default_lock = threading.Lock()
+
+
+def get_default_queue():
+    """Return the process-wide work queue"""
+    global _default_queue
+    with _default_lock:
+        if _default_queue is None:
+            _default_queue = WorkQueue()
+        return _default_queue
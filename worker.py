@@ -0,0 +1,125 @@
+"""
+Background extraction worker.
+
+Claims tasks the Streamlit app put on the work queue, extracts them with
+bounded concurrency and stores the results in the invoice store, so
+extractions keep going while the browser is closed and never block a
+Streamlit rerun. Run as many workers as you like; each claims its own tasks.
+
+Usage:
+    python worker.py
+    python worker.py --concurrency 16
+"""
+
+import argparse
+import os
+import socket
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+# Loads .env before the modules below read their settings from the environment
+import config
+import agent_registry
+import telemetry
+from extraction import extract_bytes, DEFAULT_MAX_WORKERS
+from preprocess import PreprocessOptions
+from processing import store_invoice
+from resilient_client import CircuitOpenError
+from work_queue import get_default_queue, WORKER_TIMEOUT
+
+# Seconds to wait before polling an empty queue again
+POLL_INTERVAL = 1.0
+
+# Seconds between heartbeats and lease renewals
+HEARTBEAT_INTERVAL = WORKER_TIMEOUT / 3
+
+
+def run_task(queue, task):
+    """Extract one claimed task and record its outcome on the queue"""
+    if task['file_bytes'] is None:
+        queue.fail(task['id'], "Uploaded file is missing")
+        return
+    options = task['options']
+    preprocess = PreprocessOptions(**options['preprocess']) if options.get('preprocess') else None
+    try:
+        agent = agent_registry.get_agent(task['agent_name'], task['project_id'], task['organization_id'])
+        data = extract_bytes(
+            agent, task['file_bytes'], task['filename'],
+            use_cache=options.get('use_cache', True), preprocess=preprocess
+        )
+    except CircuitOpenError as e:
+        # Not the file's fault; put it back until LlamaCloud recovers
+        queue.retry_later(task['id'], e.retry_in, e)
+        return
+    except Exception as e:
+        queue.fail(task['id'], e)
+        print(f"❌ {task['filename']}: {e}")
+        return
+
+    if not data:
+        queue.fail(task['id'], "No data returned")
+        print(f"❌ {task['filename']}: no data returned")
+        return
+    record = store_invoice(data, task['filename'], image_hash=task['image_hash'])
+    queue.complete(task['id'], record['id'])
+    print(f"✅ {task['filename']} -> {record['id']}")
+
+
+def run(concurrency, poll_interval=POLL_INTERVAL, once=False):
+    """Process queued tasks until interrupted (or until the queue is empty with once)"""
+    queue = get_default_queue()
+    worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    running = {}
+    last_heartbeat = 0.0
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="worker") as pool:
+        try:
+            while True:
+                now = time.monotonic()
+                if now - last_heartbeat >= HEARTBEAT_INTERVAL:
+                    queue.heartbeat(worker_id, concurrency)
+                    queue.renew(list(running))
+                    last_heartbeat = now
+
+                for task_id in [task_id for task_id, future in running.items() if future.done()]:
+                    future = running.pop(task_id)
+                    if future.exception() is not None:
+                        # Storing the result failed; the task is left to be retried once its lease runs out
+                        print(f"❌ Task {task_id}: {future.exception()}")
+
+                claimed = queue.claim(concurrency - len(running)) if len(running) < concurrency else []
+                for task in claimed:
+                    running[task['id']] = pool.submit(run_task, queue, task)
+
+                if once and not running and not claimed:
+                    break
+                if not claimed:
+                    time.sleep(poll_interval if not running else min(poll_interval, 0.1))
+        finally:
+            queue.remove_worker(worker_id)
+
+
+def main():
+    """Parse arguments and run the worker."""
+    parser = argparse.ArgumentParser(description="Process invoices queued by the Streamlit app.")
+    parser.add_argument("--concurrency", "-c", type=int, default=DEFAULT_MAX_WORKERS,
+                        help="Maximum extractions in flight")
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL,
+                        help="Seconds between polls of an empty queue")
+    parser.add_argument("--once", action="store_true", help="Exit once the queue is empty")
+    args = parser.parse_args()
+
+    if config.METRICS_PORT:
+        telemetry.start_http_server(config.METRICS_PORT)
+
+    print(f"👷 Worker started with concurrency {args.concurrency}")
+    try:
+        run(args.concurrency, args.poll_interval, args.once)
+    except KeyboardInterrupt:
+        print("\n⏸️  Stopped. Queued tasks will be picked up by the next worker.")
+        sys.exit(130)
+
+
+if __name__ == "__main__":
+    main()